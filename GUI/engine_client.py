@@ -1,39 +1,171 @@
+import os
 import subprocess
 import sys
 import json
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from pathlib import Path
 
 
 ENGINE_PATH = Path(__file__).resolve().parents[1] / "engine" / "engine_main.py"
+ENGINE_HOST = "127.0.0.1"
+ENGINE_PORT = int(os.getenv("PHIRAG_ENGINE_PORT", "8765"))
+DEFAULT_TIMEOUT = 120.0
+STARTUP_TIMEOUT = 90.0  # first start pays for langchain/torch imports
 
 
-def run_engine_query(query: str) -> dict:
+class EngineClient:
     """
-    Runs the engine as a subprocess and returns parsed JSON.
+    Talks to the resident engine (`engine_main.py --serve`) over one local
+    socket, starting it on demand. Safe to call from several threads; replies
+    are matched to callers by request id.
     """
-    cmd = [
-        sys.executable,
-        str(ENGINE_PATH),
-        "--query",
-        query
-    ]
-
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True
-    )
-
-    if result.returncode != 0:
-        return {
-            "error": "Engine process failed",
-            "stderr": result.stderr
-        }
 
+    def __init__(self, host=ENGINE_HOST, port=ENGINE_PORT):
+        self.host = host
+        self.port = port
+        self._sock = None
+        self._wfile = None
+        self._lock = threading.Lock()        # socket + waiters; only held to register and write
+        self._start_lock = threading.Lock()  # one thread connects / starts the engine, others wait on it
+        self._waiters = {}  # request id -> Future
+        self._process = None
+
+    # ---- connection ----
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=2)
+        sock.settimeout(None)
+        with self._lock:
+            self._sock = sock
+            self._wfile = sock.makefile("wb")
+        threading.Thread(target=self._reader, args=(sock,), daemon=True).start()
+
+    def _start_engine(self):
+        cmd = [sys.executable, str(ENGINE_PATH), "--serve", "--host", self.host, "--port", str(self.port)]
+        self._process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=str(ENGINE_PATH.parent),
+        )
+
+    def _ensure_connected(self):
+        if self._sock is not None:
+            return
+        # A cold start can take STARTUP_TIMEOUT; it must not hold up replies, cancels
+        # or close() that only need `_lock`
+        with self._start_lock:
+            if self._sock is not None:
+                return  # another thread got there first
+            try:
+                self._connect()
+                return
+            except OSError:
+                self._start_engine()
+
+            deadline = time.time() + STARTUP_TIMEOUT
+            while True:
+                if self._process.poll() is not None:
+                    raise RuntimeError(f"Engine exited during startup (code {self._process.returncode})")
+                try:
+                    self._connect()
+                    return
+                except OSError:
+                    if time.time() > deadline:
+                        raise RuntimeError("Engine did not start in time")
+                    time.sleep(0.25)
+
+    def _reader(self, sock):
+        try:
+            for raw in sock.makefile("rb"):
+                try:
+                    msg = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                future = self._waiters.pop(msg.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(msg)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+                    self._wfile = None
+                waiters, self._waiters = self._waiters, {}
+            for future in waiters.values():
+                if not future.done():
+                    future.set_result({"error": "Engine connection lost", "code": "failed"})
+
+    def _send(self, payload: dict) -> Future:
+        future = Future()
+        for _ in range(2):  # the connection may drop between connecting and writing
+            self._ensure_connected()
+            with self._lock:
+                if self._wfile is None:
+                    continue
+                self._waiters[payload["id"]] = future
+                try:
+                    self._wfile.write((json.dumps(payload) + "\n").encode("utf-8"))
+                    self._wfile.flush()
+                except OSError:
+                    self._waiters.pop(payload["id"], None)
+                    raise
+                return future
+        raise ConnectionError("Engine connection lost")
+
+    # ---- requests ----
+    def query(self, query: str, timeout: float = DEFAULT_TIMEOUT) -> dict:
+        req_id = uuid.uuid4().hex
+        future = self._send({"id": req_id, "op": "query", "query": query, "timeout": timeout})
+        try:
+            # The engine enforces the timeout itself; the margin covers transport.
+            msg = future.result(timeout=timeout + 5)
+        except FutureTimeout:
+            self.cancel(req_id)
+            return {"error": f"Query timed out after {timeout}s", "code": "timeout"}
+        msg.pop("id", None)
+        return msg
+
+    def cancel(self, request_id: str) -> bool:
+        self._waiters.pop(request_id, None)
+        try:
+            future = self._send({"id": uuid.uuid4().hex, "op": "cancel", "target": request_id})
+            return bool(future.result(timeout=5).get("ok"))
+        except Exception:
+            return False
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+                self._wfile = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_engine_client() -> EngineClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EngineClient()
+        return _client
+
+
+def run_engine_query(query: str, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """
+    Sends the query to the resident engine and returns its parsed JSON reply.
+    """
     try:
-        return json.loads(result.stdout)
-    except json.JSONDecodeError:
+        return get_engine_client().query(query, timeout=timeout)
+    except Exception as e:
         return {
-            "error": "Invalid JSON from engine",
-            "raw_output": result.stdout
+            "error": "Engine process failed",
+            "stderr": str(e)
         }
@@ -35,12 +35,20 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from ingestion import (
     load_documents_from_files,
     load_documents_from_urls,
+    get_embedder,
     get_vectorstore,
-    sync_to_backend_faiss  # 🔁 Incremental FAISS sync
+    enqueue_backend_sync,  # 🔁 Incremental FAISS sync (background job)
+    get_sync_queue
 )
+from utils.index_registry import get_shard_coordinator, get_shared_index  # 🧠 Warm, process-wide index + embedder
+from utils.shard_coordinator import SHARD_NODES  # 🧩 remote shard nodes, if any
+from utils.index_utils import hybrid_search  # 🔀 BM25 + vector, fused by rank
+from utils.answer_cache import context_fingerprint, get_answer_cache  # 💬 reuse answers to paraphrased questions
+from utils.query_cache import get_query_cache  # ⚡ hot queries skip embedding and search
+from utils.context_packer import CANDIDATES, answer_tokens, count_tokens, pack_context  # 📦 token-budgeted context
 from logger import log_query
-from llm_wrapper import get_llm_response  # ⬅️ use get_llm_response from wrapper
-from rag_pipeline import run_pipeline  # fallback LLM pipeline
+from llm_wrapper import MODEL, stream_llm_response  # ⬅️ streams tokens as Ollama generates them
+from rag_pipeline import stream_pipeline  # fallback LLM pipeline
 
 # Define paths
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -54,7 +62,7 @@ LOG_PATH = os.path.join(LOG_DIR, "query_logs.csv")
 if "vectorstore_ready" not in st.session_state:
     if os.path.exists(INDEX_PATH):
         try:
-            db = get_vectorstore([], rebuild=False, load_path=INDEX_PATH)
+            db = get_shared_index(INDEX_PATH, get_embedder)
             st.session_state["vectorstore_ready"] = True
             st.success("✅ FAISS index auto-loaded.")
         except Exception as e:
@@ -155,7 +163,7 @@ if process:
             st.session_state["vectorstore_ready"] = True
     else:
         if os.path.exists(INDEX_PATH):
-            db = get_vectorstore([], rebuild=False, load_path=INDEX_PATH)
+            db = get_shared_index(INDEX_PATH, get_embedder)
             st.success("✅ Loaded existing FAISS index.")
             st.session_state["vectorstore_ready"] = True
         else:
@@ -190,33 +198,82 @@ def get_word_limit(answer_type):
         "deep_dive": 600
     }.get(answer_type, 150)
 
+# OPTIONAL: Restrict the search (applied inside FAISS, not by over-fetching)
+SEARCH_SCOPES = {
+    "All sources": None,
+    "Files only": {"source_type": "file"},
+    "Web pages only": {"source_type": "web"},
+    "Uploaded documents only": {"source_type": "frontend"},
+}
+scope = st.selectbox("🎯 Search in:", list(SEARCH_SCOPES))
+only_source = st.text_input("📄 Only this source (file name or URL, optional):").strip()
+where = dict(SEARCH_SCOPES[scope] or {})
+if only_source:
+    where["source"] = only_source
+
 run_query = st.button("🔍 Run Query")
 
 if run_query and query:
-    if os.path.exists(INDEX_PATH) and st.session_state.get("vectorstore_ready", False):
-        db = get_vectorstore([], rebuild=False, load_path=INDEX_PATH)
-        retriever = db.as_retriever(search_kwargs={"k": 5})
-        docs = retriever.get_relevant_documents(query)
-        context = "\n\n".join(doc.page_content for doc in docs[:5])
-
+    if SHARD_NODES:
+        db = get_shard_coordinator(SHARD_NODES, get_embedder)  # scatter-gather over shard servers
+    elif os.path.exists(INDEX_PATH) and st.session_state.get("vectorstore_ready", False):
+        db = get_shared_index(INDEX_PATH, get_embedder)  # reloads only if the index changed on disk
+    else:
+        db = None
+    if db is not None:
+        signals = {}  # per-hit dense/BM25 scores and stored vectors, for the packer
+        hits = hybrid_search(db, query, k=CANDIDATES, where=where or None, signals=signals)
         word_limit = get_word_limit(answer_type)
-        prompt = f"Context:\n{context}\n\nQuestion: {query}\n\nStrictly answer in exactly {word_limit} words. Count your words."
-
-        # ⏱️ Start timing
-        start_time = time.time()
-        answer = get_llm_response(prompt, word_limit)
-        end_time = time.time()
-        response_time = round(end_time - start_time, 2)
+        instructions = f"Question: {query}\n\nStrictly answer in exactly {word_limit} words. Count your words."
+
+        # 📦 Merge overlapping chunks, drop near-duplicates and fit what's left into the token budget
+        # (the window also has to hold the question, the system prompt (~64 tokens) and the answer)
+        context, docs, packing = pack_context(
+            hits, signals, reserve=count_tokens(instructions) + answer_tokens(word_limit) + 64)
+        prompt = f"Context:\n{context}\n\n{instructions}"
+
+        # 💬 A similar question over the same chunks may already have an answer
+        answer_cache = get_answer_cache()
+        query_vector = get_query_cache().embed(db.embedding_function, query)  # already embedded by the search
+        fingerprint = context_fingerprint([doc.id or doc.page_content for doc in docs], word_limit, MODEL)
+        current_version = getattr(db, "index_version", None)  # unknown for remote shard nodes
+        cached = answer_cache.get(query_vector, fingerprint, current_version)
+
+        # ⏱️ Tokens render as they arrive; timings are filled in by the stream
+        st.subheader("💬 Answer")
+        llm_stats = {}
+        if cached:
+            answer = cached["answer"]
+            st.write(answer)
+            st.caption(f"⚡ From the answer cache (question similarity {cached['similarity']}), "
+                       f"saved ~{round(cached['cost'], 1)}s of generation")
+            llm_stats["response_time"] = 0.0
+        else:
+            answer = st.write_stream(stream_llm_response(prompt, word_limit, stats=llm_stats))
+            if not llm_stats.get("error"):  # a failed or cut-off generation is not an answer
+                answer_cache.put(query_vector, fingerprint, answer, llm_stats.get("response_time"), current_version)
+        response_time = llm_stats.get("response_time")
 
         total_file_size_bytes = sum(len(doc.page_content.encode('utf-8')) for doc in docs)
         total_file_size_mb = round(total_file_size_bytes / (1024 * 1024), 2)
         response_size_mb = round(len(answer.encode('utf-8')) / (1024 * 1024), 4)
 
-        st.subheader("💬 Answer")
-        st.write(answer)
-
         with st.expander("📊 Response Metrics"):
             st.markdown(f"**LLM Response Time:** `{response_time}` seconds")
+            st.markdown(f"**Queue Time:** `{llm_stats.get('queue_time')}` seconds")
+            st.markdown(f"**Time to First Token:** `{llm_stats.get('ttft')}` seconds")
+            st.markdown(f"**Generation Speed:** `{llm_stats.get('tokens_per_sec')}` tokens/sec ({llm_stats.get('tokens', 0)} tokens)")
+            st.markdown(f"**Prompt Evaluation:** `{llm_stats.get('prompt_eval_time')}` seconds "
+                        f"({llm_stats.get('prompt_tokens')} tokens counted by Ollama)")
+            st.markdown(f"**Context:** `{packing['tokens']}`/{packing['budget']} tokens from {packing['passages']} passages "
+                        f"({packing['selected']} of {packing['candidates']} hits kept, {packing['merged']} merged, "
+                        f"{packing['redundant']} redundant) — `{packing['tokens_saved']}` tokens saved")
+            cache_report = answer_cache.report()
+            st.markdown(f"**Answer Cache:** hit rate `{cache_report['hit_rate']}`, "
+                        f"`{cache_report['saved_seconds']}` s of generation saved")
+            query_report = get_query_cache().report()
+            st.markdown(f"**Query Cache:** embedding hit rate `{query_report['embed_hit_rate']}`, "
+                        f"search hit rate `{query_report['result_hit_rate']}`")
             st.markdown(f"**Total Size of Retrieved Documents:** `{total_file_size_mb}` MB")
             st.markdown(f"**Size of Generated Response:** `{response_size_mb}` MB")
 
@@ -228,23 +285,26 @@ if run_query and query:
         log_query(query, answer)
 
         if st.session_state.get("frontend_docs"):
-            sync_to_backend_faiss(st.session_state["frontend_docs"], backend_path="faiss_backend")
+            # Runs on the background worker so the answer isn't held up by re-indexing
+            st.session_state["sync_job"] = enqueue_backend_sync(
+                st.session_state["frontend_docs"], backend_path="faiss_backend"
+            )
             st.session_state["frontend_docs"] = []
 
     else:
         st.warning("⚠️ No FAISS index found. Using LLM-only mode.")
         try:
-            start_time = time.time()
-            result = run_pipeline(prompt=query)
-            end_time = time.time()
-            response_time = round(end_time - start_time, 2)
-            response_size_mb = round(len(result.encode("utf-8")) / (1024 * 1024), 4)
-
             st.subheader("💬 Answer (LLM Only)")
-            st.write(result)
+            llm_stats = {}
+            result = st.write_stream(stream_pipeline(prompt=query, stats=llm_stats))
+            response_time = llm_stats.get("response_time")
+            response_size_mb = round(len(result.encode("utf-8")) / (1024 * 1024), 4)
 
             with st.expander("📊 Response Metrics"):
                 st.markdown(f"**LLM Response Time:** `{response_time}` seconds")
+                st.markdown(f"**Queue Time:** `{llm_stats.get('queue_time')}` seconds")
+                st.markdown(f"**Time to First Token:** `{llm_stats.get('ttft')}` seconds")
+                st.markdown(f"**Generation Speed:** `{llm_stats.get('tokens_per_sec')}` tokens/sec ({llm_stats.get('tokens', 0)} tokens)")
                 st.markdown(f"**Size of Generated Response:** `{response_size_mb}` MB")
 
             log_query(query, result)
@@ -252,6 +312,11 @@ if run_query and query:
         except Exception as e:
             st.error(f"Error: {e}")
 
+if st.session_state.get("sync_job"):
+    job = get_sync_queue().status(st.session_state["sync_job"])
+    if job:
+        st.caption(f"🔁 Backend sync: {job['status']}" + (f" ({job['error']})" if job.get("error") else ""))
+
 # ─────────────────────────────────────────────────────────────
 # LOGGING UI
 # ─────────────────────────────────────────────────────────────
@@ -1,10 +1,47 @@
 # llm_wrapper.py
 
-from langchain_community.chat_models import ChatOllama
-from langchain_core.messages import HumanMessage, SystemMessage
+from typing import Iterator
+
+from ollama_client import OLLAMA_MODEL, get_client, stream_chat_sync
+
+# Phi-3.8b via Ollama, through the process-wide pooled client (bounded
+# concurrency, FIFO queue, keep-alive connections)
+MODEL = OLLAMA_MODEL
+
+
+def _system_instruction(word_limit: int = None) -> str:
+    # Stronger guidance through system prompt
+    if word_limit:
+        return (
+            f"You are a helpful assistant. Provide a detailed answer of around {word_limit} words. "
+            f"If the question is complex, explain all relevant aspects thoroughly to meet the word count."
+        )
+    return "You are a helpful assistant. Answer the question clearly and concisely."
+
+
+def stream_llm_response(prompt: str, word_limit: int = None, stats: dict = None,
+                        system_instruction: str = None, deadline: float = None) -> Iterator[str]:
+    """
+    Yield the answer from Phi-3 piece by piece as Ollama generates it.
+
+    Pass a dict as `stats` to have it filled in as the stream runs:
+    queue_time (seconds waiting for a free generation slot), ttft (seconds
+    from the slot to the first token), tokens, tokens_per_sec,
+    prompt_tokens, prompt_eval_time and response_time. Token counts come
+    from Ollama's eval_count / prompt_eval_count. If generation fails,
+    even after some text was streamed, stats["error"] holds the reason.
+    """
+    stats = stats if stats is not None else {}
+    messages = [
+        {"role": "system", "content": system_instruction or _system_instruction(word_limit)},
+        {"role": "user", "content": prompt},
+    ]
+    try:
+        yield from stream_chat_sync(messages, model=MODEL, stats=stats, deadline=deadline)
+    except Exception as e:
+        stats["error"] = str(e)
+        yield f"⚠️ Error generating response: {e}"
 
-# Initialize the Phi-3.8b model from Ollama
-llm = ChatOllama(model="phi3:3.8b")
 
 def get_llm_response(prompt: str, word_limit: int = None) -> str:
     """
@@ -17,22 +54,9 @@ def get_llm_response(prompt: str, word_limit: int = None) -> str:
     Returns:
         str: Response generated by the model.
     """
-    try:
-        # Stronger guidance through system prompt
-        if word_limit:
-            system_instruction = (
-                f"You are a helpful assistant. Provide a detailed answer of around {word_limit} words. "
-                f"If the question is complex, explain all relevant aspects thoroughly to meet the word count."
-            )
-        else:
-            system_instruction = "You are a helpful assistant. Answer the question clearly and concisely."
-
-        # Send chat-style prompt
-        response = llm.invoke([
-            SystemMessage(content=system_instruction),
-            HumanMessage(content=prompt)
-        ])
-        return response.content
+    return "".join(stream_llm_response(prompt, word_limit))
 
-    except Exception as e:
-        return f"⚠️ Error generating response: {e}"
+
+def llm_metrics() -> dict:
+    """Queue depth, active generations and queue-time percentiles of the shared client."""
+    return get_client().snapshot()
@@ -0,0 +1,245 @@
+# ollama_client.py
+
+import os
+import json
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import AsyncIterator, Iterator, List
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# ⚙️ Settings
+# ========================
+OLLAMA_URL = os.getenv("PHIRAG_OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("PHIRAG_OLLAMA_MODEL", "phi3:3.8b")
+MAX_CONCURRENCY = int(os.getenv("PHIRAG_LLM_CONCURRENCY", "2"))    # generations Ollama runs at once
+MAX_QUEUE = int(os.getenv("PHIRAG_LLM_MAX_QUEUE", "64"))            # waiting requests before new ones are refused
+DEADLINE = float(os.getenv("PHIRAG_LLM_DEADLINE", "300"))           # seconds from submit to last token
+CONNECT_TIMEOUT = 5.0
+
+
+class LLMBusy(RuntimeError):
+    """The request queue is full."""
+
+
+class LLMTimeout(TimeoutError):
+    """The request's deadline passed while queued or generating."""
+
+
+# ========================
+# 🚦 Fair admission
+# ========================
+class FifoLimiter:
+    """
+    At most `limit` holders at a time; waiters are admitted strictly in
+    arrival order, and a waiter whose deadline passes leaves the queue.
+    """
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float = None):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise LLMBusy(f"LLM queue is full ({self.max_queue} waiting)")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # admitted just as we gave up: pass the slot on
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot moves straight to the next in line
+                return
+        self.active -= 1
+
+
+# ========================
+# 🦙 Pooled async client
+# ========================
+class AsyncOllamaClient:
+    """
+    One keep-alive HTTP connection pool to Ollama shared by every caller,
+    with a FIFO queue in front of at most `concurrency` generations so a
+    burst of users queues up instead of thrashing the model server.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, model: str = OLLAMA_MODEL,
+                 concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE, deadline: float = DEADLINE):
+        self.base_url = base_url
+        self.model = model
+        self.deadline = deadline
+        self.limiter = FifoLimiter(concurrency, max_queue)
+        self._http = None
+        self.metrics = {"requests": 0, "completed": 0, "failed": 0, "timeouts": 0, "rejected": 0, "cancelled": 0}
+        self._queue_waits = deque(maxlen=1000)
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=self.limiter.limit, max_keepalive_connections=self.limiter.limit),
+                timeout=httpx.Timeout(None, connect=CONNECT_TIMEOUT),
+            )
+        return self._http
+
+    def snapshot(self) -> dict:
+        """Counters plus current queue depth and recent queue-time percentiles (seconds)."""
+        waits = sorted(self._queue_waits)
+        pick = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))], 3) if waits else None
+        return {**self.metrics, "active": self.limiter.active, "queued": self.limiter.queued,
+                "queue_wait_p50": pick(0.5), "queue_wait_p95": pick(0.95)}
+
+    async def stream_chat(self, messages: List[dict], model: str = None, options: dict = None,
+                          deadline: float = None, stats: dict = None) -> AsyncIterator[str]:
+        """
+        Yield the reply to `messages` ([{"role": ..., "content": ...}]) as it
+        is generated. `deadline` (seconds, default DEADLINE) covers queueing
+        and generation together. `stats` gets queue_time, ttft, tokens,
+        tokens_per_sec, prompt_tokens, prompt_eval_time and response_time
+        (and error, which callers set when the stream fails).
+        """
+        stats = stats if stats is not None else {}
+        stats.update(queue_time=None, ttft=None, tokens=0, tokens_per_sec=None, response_time=None,
+                     prompt_tokens=None, prompt_eval_time=None, error=None)
+        self.metrics["requests"] += 1
+        submitted = time.perf_counter()
+        expires = submitted + (deadline or self.deadline)
+        try:
+            await self.limiter.acquire(timeout=max(0.0, expires - submitted))
+        except LLMBusy:
+            self.metrics["rejected"] += 1
+            raise
+        except asyncio.TimeoutError:
+            self.metrics["timeouts"] += 1
+            raise LLMTimeout(f"Waited {round(time.perf_counter() - submitted, 2)}s in the LLM queue")
+
+        started = time.perf_counter()
+        stats["queue_time"] = round(started - submitted, 3)
+        self._queue_waits.append(started - submitted)
+        body = {"model": model or self.model, "messages": messages, "stream": True}
+        if options:
+            body["options"] = options
+        try:
+            async with asyncio.timeout_at(asyncio.get_running_loop().time() + (expires - started)):
+                async with self._client().stream("POST", "/api/chat", json=body) as response:
+                    if response.status_code != 200:
+                        detail = (await response.aread()).decode("utf-8", "replace")[:200]
+                        raise RuntimeError(f"Ollama returned {response.status_code}: {detail}")
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        if event.get("error"):
+                            raise RuntimeError(f"Ollama error: {event['error']}")
+                        text = (event.get("message") or {}).get("content", "")
+                        if text:
+                            if stats["ttft"] is None:
+                                stats["ttft"] = round(time.perf_counter() - started, 3)
+                            stats["tokens"] += 1
+                            yield text
+                        if event.get("done") and event.get("eval_count"):
+                            # Read on to the end of the body so the connection goes back to the pool
+                            stats["tokens"] = event["eval_count"]
+                            if event.get("eval_duration"):
+                                stats["tokens_per_sec"] = round(event["eval_count"] / (event["eval_duration"] / 1e9), 1)
+                            stats["prompt_tokens"] = event.get("prompt_eval_count")
+                            if event.get("prompt_eval_duration"):
+                                stats["prompt_eval_time"] = round(event["prompt_eval_duration"] / 1e9, 3)
+            self.metrics["completed"] += 1
+        except TimeoutError:
+            self.metrics["timeouts"] += 1
+            raise LLMTimeout(f"LLM request passed its {round(expires - submitted, 1)}s deadline")
+        except (asyncio.CancelledError, GeneratorExit):
+            self.metrics["cancelled"] += 1
+            raise
+        except BaseException:
+            self.metrics["failed"] += 1
+            raise
+        finally:
+            self.limiter.release()
+            end = time.perf_counter()
+            stats["response_time"] = round(end - started, 2)
+            if stats["tokens_per_sec"] is None and stats["ttft"] is not None and stats["tokens"] > 1:
+                stats["tokens_per_sec"] = round((stats["tokens"] - 1) / max(1e-6, end - started - stats["ttft"]), 1)
+
+    async def chat(self, messages: List[dict], **kwargs) -> str:
+        return "".join([text async for text in self.stream_chat(messages, **kwargs)])
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+# ========================
+# 🔁 Sync bridge
+# ========================
+# Streamlit runs each session's script in its own thread; they all share one
+# event loop thread (and so one connection pool and one queue) per process.
+_loop = None
+_client = None
+_lock = threading.Lock()
+
+
+def get_client() -> AsyncOllamaClient:
+    global _loop, _client
+    with _lock:
+        if _client is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True, name="ollama-client").start()
+            _client = AsyncOllamaClient()
+        return _client
+
+
+def stream_chat_sync(messages: List[dict], **kwargs) -> Iterator[str]:
+    """Blocking iterator over AsyncOllamaClient.stream_chat for synchronous callers."""
+    client = get_client()
+    chunks = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for text in client.stream_chat(messages, **kwargs):
+                chunks.put(text)
+        except BaseException as e:
+            chunks.put(e)
+        finally:
+            chunks.put(done)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _loop)
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        future.cancel()  # caller stopped early: free the slot and the connection
@@ -1,12 +1,16 @@
-from langchain_community.llms import Ollama
+from llm_wrapper import stream_llm_response
 
-def run_pipeline(prompt=None, max_words=150):
-    llm = Ollama(model="phi3:3.8b")
 
+def stream_pipeline(prompt=None, max_words=150, stats: dict = None):
+    """LLM-only answer, yielded token by token (see llm_wrapper.stream_llm_response for `stats`)."""
     # Default fallback prompt
     prompt = prompt or "What is AI?"
 
     # Add a guiding system message for output length
     system_prompt = f"You are a helpful assistant. Answer in about {max_words} words."
 
-    # Wrap prompt in a conversation style for
+    return stream_llm_response(prompt, stats=stats, system_instruction=system_prompt)
+
+
+def run_pipeline(prompt=None, max_words=150):
+    return "".join(stream_pipeline(prompt, max_words))
@@ -1,11 +1,169 @@
 import argparse
 import json
+import sys
+import threading
+import socketserver
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+logger = logging.getLogger("engine")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TIMEOUT = 120.0
+
+
+# ========================
+# 🧠 Resident engine
+# ========================
+class EngineServer:
+    """
+    Answers JSON-lines requests while keeping models and indexes warm.
+
+    Requests:  {"id": "...", "op": "query", "query": "...", "timeout": 30}
+               {"id": "...", "op": "cancel", "target": "<request id>"}
+               {"id": "...", "op": "ping"}
+    Responses: {"id": "...", "query": "...", "answer": {...}}
+               {"id": "...", "error": "...", "code": "timeout|cancelled|bad_request|failed"}
+
+    A running query can't be interrupted from outside its thread, so timeouts
+    and cancellation answer the caller right away and the late result is dropped.
+    """
+
+    def __init__(self, workers=4, default_timeout=DEFAULT_TIMEOUT):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="engine")
+        self.default_timeout = default_timeout
+        self._lock = threading.Lock()
+        self._inflight = {}  # request id -> (future, send, timer)
+
+        from app.retriever import query_rag  # heavy imports happen once, here
+        self.query_rag = query_rag
+
+    def handle_line(self, line: str, send):
+        try:
+            req = json.loads(line)
+        except json.JSONDecodeError:
+            send({"id": None, "error": "Invalid JSON request", "code": "bad_request"})
+            return
+
+        req_id = req.get("id")
+        op = req.get("op", "query")
+
+        if op == "ping":
+            send({"id": req_id, "ok": True})
+        elif op == "cancel":
+            cancelled = self._finish(req.get("target"), {"error": "Request cancelled", "code": "cancelled"})
+            send({"id": req_id, "ok": cancelled})
+        elif op == "query" and req_id is not None and isinstance(req.get("query"), str):
+            self._submit(req_id, req["query"], req.get("timeout") or self.default_timeout, send)
+        else:
+            send({"id": req_id, "error": f"Unsupported request: {op}", "code": "bad_request"})
+
+    def _submit(self, req_id, query, timeout, send):
+        timer = threading.Timer(
+            float(timeout), self._finish,
+            args=(req_id, {"error": f"Query timed out after {timeout}s", "code": "timeout"})
+        )
+        timer.daemon = True
+        with self._lock:
+            future = self.executor.submit(self._run, req_id, query)
+            self._inflight[req_id] = (future, send, timer)
+        timer.start()
+
+    def _run(self, req_id, query):
+        try:
+            payload = {"query": query, "answer": self.query_rag(query)}
+        except Exception as e:
+            logger.exception(f"Query {req_id} failed")
+            payload = {"error": str(e), "code": "failed"}
+        self._finish(req_id, payload)
+
+    def _finish(self, req_id, payload) -> bool:
+        """Send the first outcome for a request; later ones are dropped."""
+        with self._lock:
+            entry = self._inflight.pop(req_id, None)
+        if entry is None:
+            return False
+        future, send, timer = entry
+        timer.cancel()
+        future.cancel()  # no-op if it already started
+        send({"id": req_id, **payload})
+        return True
+
+    def shutdown(self, drain=False):
+        self.executor.shutdown(wait=drain, cancel_futures=not drain)
+
+
+def _line_writer(stream, binary=False):
+    lock = threading.Lock()
+
+    def send(obj):
+        data = json.dumps(obj) + "\n"
+        with lock:
+            try:
+                stream.write(data.encode("utf-8") if binary else data)
+                stream.flush()
+            except (OSError, ValueError):
+                pass  # client went away
+    return send
+
+
+# ========================
+# 🔌 Transports
+# ========================
+def serve_socket(engine: EngineServer, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            send = _line_writer(self.wfile, binary=True)
+            for raw in self.rfile:
+                line = raw.decode("utf-8").strip()
+                if line:
+                    engine.handle_line(line, send)
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    with Server((host, port), Handler) as server:
+        print(json.dumps({"event": "ready", "host": host, "port": server.server_address[1]}), flush=True)
+        logger.info(f"Engine listening on {host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        finally:
+            engine.shutdown()
+
+
+def serve_stdio(engine: EngineServer):
+    send = _line_writer(sys.stdout)
+    send({"event": "ready"})
+    for line in sys.stdin:
+        line = line.strip()
+        if line:
+            engine.handle_line(line, send)
+    engine.shutdown(drain=True)
+
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--query", type=str, required=True)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--query", type=str)
+    mode.add_argument("--serve", action="store_true", help="Stay resident and serve JSON-lines over a local socket")
+    mode.add_argument("--stdio", action="store_true", help="Stay resident and serve JSON-lines over stdin/stdout")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Default per-request timeout (s)")
     args = parser.parse_args()
 
+    if args.serve or args.stdio:
+        engine = EngineServer(workers=args.workers, default_timeout=args.timeout)
+        if args.serve:
+            serve_socket(engine, args.host, args.port)
+        else:
+            serve_stdio(engine)
+        return
+
     from app.retriever import query_rag
 
     result = query_rag(args.query)
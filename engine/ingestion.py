@@ -1,10 +1,9 @@
-import torch
 import os
+import uuid
+import threading
 from typing import List, Optional
 import numpy as np
 
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.document_loaders import (
     PyPDFLoader,
     UnstructuredFileLoader,
@@ -12,34 +11,58 @@ from langchain_community.document_loaders import (
 )
 from langchain_core.documents import Document
 
+from utils.index_utils import add_vectors, build_index, load_index, save_index
+from utils.index_registry import get_shared_embedder
+from utils.embed_executor import get_ingest_embedder
+from utils.embedder import DEFAULT_MODEL, EMBED_BACKEND, get_embedder as build_embedder
+from utils.hashing import hash_content
+from utils.text_hash_index import TextHashIndex
+from utils.job_queue import JobQueue
+from utils.parallel_loader import iter_load_files, LOAD_WORKERS
+
 SUPPORTED_EXTENSIONS = [".pdf", ".txt", ".md", ".csv", ".docx"]
 
-# 🔧 Embedder config
-def get_embedder():
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={"device": device}
-    )
+# 🔧 Embedder config — same model as the backend index so both stay queryable
+EMBED_MODEL = DEFAULT_MODEL
+EMBED_BATCH_SIZE = 256
 
-def load_documents_from_files(file_paths: List[str]):
-    documents = []
+def get_embedder():
+    return build_embedder(EMBED_MODEL, EMBED_BACKEND)
+
+def _ingest_embedder():
+    # Cache first, then the multi-process pool for large batches (in-process for small ones)
+    return get_ingest_embedder(EMBED_MODEL, EMBED_BACKEND, local_embedder=get_shared_embedder(get_embedder))
+
+def _embed(embedder, texts: List[str]) -> List[List[float]]:
+    # Batches, so the embedding cache is saved as it grows rather than only once everything succeeded
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(embedder.embed_documents(texts[i:i + EMBED_BATCH_SIZE]))
+    return vectors
+
+def _load_file(path: str) -> List[Document]:
+    ext = os.path.splitext(path)[1].lower()
+    loader = PyPDFLoader(path) if ext == ".pdf" else UnstructuredFileLoader(path)
+    docs = loader.load()
+    for doc in docs:
+        doc.metadata["source_type"] = "frontend"
+    return docs
+
+def load_documents_from_files(file_paths: List[str], workers: int = LOAD_WORKERS):
+    supported = []
     for path in file_paths:
         ext = os.path.splitext(path)[1].lower()
-        try:
-            if ext == ".pdf":
-                loader = PyPDFLoader(path)
-            elif ext in SUPPORTED_EXTENSIONS:
-                loader = UnstructuredFileLoader(path)
-            else:
-                print(f"⚠️ Unsupported file extension: {ext}, skipping {path}")
-                continue
-            docs = loader.load()
-            for doc in docs:
-                doc.metadata["source_type"] = "frontend"
-            documents.extend(docs)
-        except Exception as e:
-            print(f"❌ Error loading {path}: {e}")
+        if ext in SUPPORTED_EXTENSIONS:
+            supported.append(path)
+        else:
+            print(f"⚠️ Unsupported file extension: {ext}, skipping {path}")
+
+    documents = []
+    for path, docs, error in iter_load_files(supported, _load_file, workers=workers):
+        if error is not None:
+            print(f"❌ Error loading {path}: {error}")
+            continue
+        documents.extend(docs)
     return documents
 
 def load_documents_from_urls(urls: List[str]):
@@ -59,61 +82,109 @@ def get_vectorstore(
     documents: List[Document] = [],
     rebuild: bool = False,
     save_path: Optional[str] = "faiss_index",
-    load_path: Optional[str] = "faiss_index"
+    load_path: Optional[str] = "faiss_index",
+    factory: Optional[str] = None
 ):
-    embedder = get_embedder()
+    embedder = _ingest_embedder()
 
     def apply_boost(vectors, docs):
         # Apply small boost to frontend docs to bias them
         for i, doc in enumerate(docs):
             if doc.metadata.get("source_type") == "frontend":
-                vectors[i] = vectors[i] * 1.05  # 5% boost
+                vectors[i] = [x * 1.05 for x in vectors[i]]  # 5% boost
         return vectors
 
     if rebuild:
         if not documents:
             raise ValueError("No documents provided to build new FAISS index.")
         texts = [doc.page_content for doc in documents]
-        vectors = embedder.embed_documents(texts)
+        vectors = _embed(embedder, texts)
         vectors = apply_boost(vectors, documents)
-        db = FAISS.from_embeddings(texts, vectors, documents)
+        db = build_index(zip(texts, vectors), embedder, metadatas=[doc.metadata for doc in documents], factory=factory)
+        embedder.cache.save()
         if save_path:
-            db.save_local(save_path)
+            save_index(db, save_path)
             print(f"✅ FAISS index built and saved at '{save_path}'")
         return db
 
     if load_path and os.path.exists(load_path):
-        db = FAISS.load_local(load_path, embedder, allow_dangerous_deserialization=True)
+        db = load_index(embedder, load_path)
         print(f"📦 Loaded FAISS index from '{load_path}'")
         return db
 
     raise ValueError("No saved FAISS index found and no documents provided to rebuild.")
 
 def sync_to_backend_faiss(new_docs: List[Document], backend_path: str = "faiss_backend"):
-    embedder = get_embedder()
-
-    if os.path.exists(backend_path):
-        db_backend = FAISS.load_local(backend_path, embedder, allow_dangerous_deserialization=True)
-    else:
-        db_backend = FAISS.from_documents([], embedder)
-
-    existing_texts = {doc.page_content for doc in db_backend.similarity_search("", k=1000)}
-    unique_new_docs = [doc for doc in new_docs if doc.page_content not in existing_texts]
+    embedder = _ingest_embedder()
+
+    db_backend = None
+    if os.path.exists(os.path.join(backend_path, "index.faiss")):
+        db_backend = load_index(embedder, backend_path, mmap=False)
+
+    # O(new docs): hash lookups, independent of the backend index size
+    text_index = TextHashIndex.load(backend_path, db_backend)
+    unique_new_docs, new_hashes, seen = [], [], set()
+    for doc in new_docs:
+        h = hash_content(doc.page_content)
+        if h not in text_index and h not in seen:
+            seen.add(h)
+            unique_new_docs.append(doc)
+            new_hashes.append(h)
 
     if unique_new_docs:
         texts = [doc.page_content for doc in unique_new_docs]
-        vectors = embedder.embed_documents(texts)
+        vectors = _embed(embedder, texts)
 
         for i, doc in enumerate(unique_new_docs):
             if doc.metadata.get("source_type") == "frontend":
-                vectors[i] = vectors[i] * 1.05
-
-        db_backend.add_embeddings(texts, vectors, unique_new_docs)
-        db_backend.save_local(backend_path)
+                vectors[i] = [x * 1.05 for x in vectors[i]]
+
+        ids = [str(uuid.uuid4()) for _ in unique_new_docs]
+        metadatas = [doc.metadata for doc in unique_new_docs]
+        if db_backend is None:
+            db_backend = build_index(zip(texts, vectors), embedder, metadatas=metadatas, ids=ids)
+        else:
+            add_vectors(db_backend, zip(texts, vectors), metadatas=metadatas, ids=ids)
+        save_index(db_backend, backend_path)
+        text_index.update(zip(new_hashes, ids))
+        text_index.save()
+        embedder.cache.save()
         print(f"✅ Synced {len(unique_new_docs)} docs to backend FAISS index at '{backend_path}'")
     else:
         print("ℹ️ No new documents to sync to backend.")
 
+# ========================
+# 🧵 Background sync queue
+# ========================
+SYNC_JOBS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sync_jobs.json")
+_sync_queue = None
+_sync_queue_lock = threading.Lock()
+
+def _run_sync_job(payload: dict):
+    docs = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in payload["docs"]]
+    sync_to_backend_faiss(docs, backend_path=payload["backend_path"])
+
+def _merge_sync_jobs(old: dict, new: dict) -> dict:
+    seen = {hash_content(d["page_content"]) for d in old["docs"]}
+    extra = [d for d in new["docs"] if hash_content(d["page_content"]) not in seen]
+    return {"backend_path": old["backend_path"], "docs": old["docs"] + extra}
+
+def get_sync_queue() -> JobQueue:
+    global _sync_queue
+    with _sync_queue_lock:
+        if _sync_queue is None:
+            _sync_queue = JobQueue(SYNC_JOBS_PATH, _run_sync_job, merge=_merge_sync_jobs, name="backend-sync")
+        return _sync_queue
+
+def enqueue_backend_sync(new_docs: List[Document], backend_path: str = "faiss_backend") -> str:
+    """Queue a backend sync and return its job id; pending syncs to the same index are merged."""
+    backend_path = os.path.abspath(backend_path)
+    payload = {
+        "backend_path": backend_path,
+        "docs": [{"page_content": d.page_content, "metadata": d.metadata} for d in new_docs],
+    }
+    return get_sync_queue().submit(payload, key=backend_path)
+
 # Optional CLI usage
 if __name__ == "__main__":
     import argparse
@@ -123,6 +194,7 @@ if __name__ == "__main__":
     parser.add_argument("--rebuild", action="store_true", help="Force rebuild FAISS index")
     parser.add_argument("--save_path", type=str, default="faiss_index", help="Where to save the FAISS index")
     parser.add_argument("--load_path", type=str, default="faiss_index", help="Where to load the FAISS index from")
+    parser.add_argument("--index_factory", type=str, default=None, help='FAISS index type, e.g. "IVF4096,Flat" or "HNSW32"')
     args = parser.parse_args()
 
     file_paths = []
@@ -136,7 +208,7 @@ if __name__ == "__main__":
     if args.rebuild and not documents:
         print("❌ No documents provided for rebuilding.")
     elif documents:
-        get_vectorstore(documents, rebuild=args.rebuild, save_path=args.save_path)
+        get_vectorstore(documents, rebuild=args.rebuild, save_path=args.save_path, factory=args.index_factory)
     else:
         get_vectorstore([], rebuild=False, load_path=args.load_path)
 
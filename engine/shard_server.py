@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import sys
+import socketserver
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from engine_main import DEFAULT_HOST, _line_writer
+from utils.index_registry import get_shared_index
+from utils.index_utils import index_version, lexical_search, search_by_vector
+from utils.sharding import shard_path
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+logger = logging.getLogger("shard")
+
+DEFAULT_PORT = 8770
+
+
+# ========================
+# 🧩 Resident shard
+# ========================
+class ShardServer:
+    """
+    Serves vector searches against one index shard over JSON-lines.
+
+    Requests:  {"id": "...", "op": "search", "vector": [...], "k": 5, "nprobe": 16, "ef_search": 64,
+                "where": {"source_type": "web"}, "vectors": true}
+               {"id": "...", "op": "lexical", "query": "ERR-4012", "k": 5, "where": {...}}
+               {"id": "...", "op": "ping"}
+    Responses: {"id": "...", "hits": [{"id": "...", "text": "...", "metadata": {...}, "score": 0.12,
+                                       "vector": [...]}]}   (vector only if asked for and stored)
+               {"id": "...", "ok": true, "shard": "...", "ntotal": 123, "version": 4}
+               {"id": "...", "error": "...", "code": "bad_request|failed"}
+
+    Queries arrive already embedded, so a node holds no model. The shard is
+    memory-mapped and hot-reloads when its ingestion writer saves a new version.
+    """
+
+    def __init__(self, index_path, workers=4):
+        self.index_path = os.path.abspath(str(index_path))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+        self.store()  # fail fast on a missing or broken shard
+
+    def store(self):
+        return get_shared_index(self.index_path, lambda: None, embedder_key="none")
+
+    def handle_line(self, line: str, send):
+        try:
+            req = json.loads(line)
+        except json.JSONDecodeError:
+            send({"id": None, "error": "Invalid JSON request", "code": "bad_request"})
+            return
+
+        req_id = req.get("id")
+        op = req.get("op", "search")
+        if op == "ping":
+            send({"id": req_id, "ok": True, "shard": self.index_path,
+                  "ntotal": self.store().index.ntotal, "version": index_version(self.index_path)})
+        elif op == "search" and isinstance(req.get("vector"), list):
+            self.executor.submit(self._search, req, send)
+        elif op == "lexical" and isinstance(req.get("query"), str):
+            self.executor.submit(self._search, req, send)
+        else:
+            send({"id": req_id, "error": f"Unsupported request: {op}", "code": "bad_request"})
+
+    def _search(self, req, send):
+        try:
+            vectors = {} if req.get("vectors") else None
+            if req.get("op") == "lexical":
+                hits = lexical_search(self.store(), req["query"], int(req.get("k", 5)), where=req.get("where"))
+            else:
+                hits = search_by_vector(self.store(), req["vector"], int(req.get("k", 5)), nprobe=req.get("nprobe"),
+                                        ef_search=req.get("ef_search"), where=req.get("where"), vectors=vectors)
+            payload = {"hits": [{"id": doc.id, "text": doc.page_content, "metadata": doc.metadata, "score": score}
+                                for doc, score in hits]}
+            for hit in payload["hits"]:
+                if vectors and hit["id"] in vectors:
+                    hit["vector"] = [float(x) for x in vectors[hit["id"]]]
+        except Exception as e:
+            logger.exception(f"Search {req.get('id')} failed")
+            payload = {"error": str(e), "code": "failed"}
+        send({"id": req.get("id"), **payload})
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ========================
+# 🔌 Transport
+# ========================
+def serve(shard: ShardServer, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            send = _line_writer(self.wfile, binary=True)
+            for raw in self.rfile:
+                line = raw.decode("utf-8").strip()
+                if line:
+                    shard.handle_line(line, send)
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    with Server((host, port), Handler) as server:
+        print(json.dumps({"event": "ready", "host": host, "port": server.server_address[1]}), flush=True)
+        logger.info(f"🧩 Shard {shard.index_path} listening on {host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        finally:
+            shard.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one index shard for a scatter-gather coordinator")
+    parser.add_argument("--index", type=str, required=True, help="Shard directory, or a sharded index with --shard")
+    parser.add_argument("--shard", type=int, default=None, help="Shard number inside a sharded index")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port (reported on stdout)")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    index_path = shard_path(args.index, args.shard) if args.shard is not None else args.index
+    serve(ShardServer(index_path, workers=args.workers), args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
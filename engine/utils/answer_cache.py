@@ -0,0 +1,183 @@
+import os
+import time
+import atexit
+import pickle
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# 🔧 Paths & limits
+# ========================
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+ANSWER_CACHE_PATH = PROJECT_ROOT / "data" / "answers.pkl"
+MAX_ANSWERS = int(os.getenv("PHIRAG_ANSWER_CACHE_SIZE", "2000"))
+ANSWER_TTL = float(os.getenv("PHIRAG_ANSWER_CACHE_TTL", str(24 * 3600)))     # seconds
+SIMILARITY = float(os.getenv("PHIRAG_ANSWER_CACHE_SIMILARITY", "0.95"))      # query cosine needed for a hit
+SAVE_DELAY = float(os.getenv("PHIRAG_ANSWER_CACHE_SAVE_DELAY", "30"))        # seconds new answers wait before a write
+
+
+def context_fingerprint(chunk_ids: Iterable[str], word_limit=None, model: str = "") -> str:
+    """Identity of what the LLM was shown: the retrieved chunks (in order), the length asked for and the model."""
+    key = "\x1f".join([model, str(word_limit), *map(str, chunk_ids)])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype="float32").ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# ========================
+# 💬 Semantic answer cache
+# ========================
+class AnswerCache:
+    """
+    Generated answers reused for paraphrased questions. A lookup hits when
+    an entry has the same context fingerprint and its query embedding is
+    within `similarity` cosine of the new one, so a reworded question that
+    retrieves the same chunks skips generation. Entries expire after
+    `ttl` seconds, are evicted least-recently-used first, and all are
+    dropped when the index version they were answered against changes.
+    New answers are written to disk in one batch `save_delay` seconds
+    after the first of them (and at exit), not on every put.
+    """
+
+    def __init__(self, path=ANSWER_CACHE_PATH, max_entries=MAX_ANSWERS, ttl=ANSWER_TTL, similarity=SIMILARITY,
+                 save_delay=SAVE_DELAY):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.save_delay = save_delay
+        self._dirty = False
+        self._save_timer = None
+        self._entries = OrderedDict()  # key -> {"fingerprint", "vector", "answer", "created", "cost"}
+        self._by_fingerprint = {}      # fingerprint -> set of keys
+        self._lock = threading.Lock()
+        self.index_version = None
+        self.stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            self.index_version = data.get("index_version")
+            self.stats.update(data.get("stats", {}))
+            for key, entry in data.get("entries", {}).items():
+                self._insert(key, entry)
+            logger.info(f"💾 Loaded {len(self._entries)} cached answers from {self.path}")
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable answer cache {self.path}: {e}")
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._by_fingerprint.setdefault(entry["fingerprint"], set()).add(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        keys = self._by_fingerprint.get(entry["fingerprint"])
+        keys.discard(key)
+        if not keys:
+            del self._by_fingerprint[entry["fingerprint"]]
+
+    def _check_version(self, index_version):
+        if index_version is not None and index_version != self.index_version:
+            if self._entries:
+                logger.info(f"🔄 Index version {self.index_version} → {index_version}: dropping {len(self._entries)} cached answers")
+            self._entries.clear()
+            self._by_fingerprint.clear()
+            self.index_version = index_version
+
+    def get(self, query_vector, fingerprint: str, index_version=None) -> Optional[dict]:
+        """Best matching entry ({"answer", "similarity", "cost", ...}) or None."""
+        query = _unit(query_vector)
+        now = time.time()
+        with self._lock:
+            self._check_version(index_version)
+            best, best_score = None, self.similarity
+            for key in list(self._by_fingerprint.get(fingerprint, ())):
+                entry = self._entries[key]
+                if now - entry["created"] > self.ttl:
+                    self._remove(key)
+                    continue
+                score = float(np.dot(entry["vector"], query))
+                if score >= best_score:
+                    best, best_score = key, score
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best)
+            entry = self._entries[best]
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += entry["cost"]
+            return {**entry, "similarity": round(best_score, 4)}
+
+    def put(self, query_vector, fingerprint: str, answer: str, cost: float = 0.0, index_version=None):
+        """Store an answer; `cost` is the seconds it took to generate (reported as saved on hits)."""
+        entry = {"fingerprint": fingerprint, "vector": _unit(query_vector), "answer": answer,
+                 "created": time.time(), "cost": float(cost or 0.0)}
+        key = hashlib.sha1(entry["vector"].tobytes() + fingerprint.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._check_version(index_version)
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, entry)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def report(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": len(self._entries), "saved_seconds": round(self.stats["saved_seconds"], 2),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None}
+
+    def save(self):
+        """Write pending answers (no-op when nothing changed since the last save)."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = {"version": 1, "index_version": self.index_version, "stats": dict(self.stats),
+                    "entries": OrderedDict(self._entries)}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """One answer cache per process, shared by every session."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = AnswerCache()
+            atexit.register(_shared_cache.save)
+        return _shared_cache
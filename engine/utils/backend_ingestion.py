@@ -1,20 +1,31 @@
 import os
+import sys
 import time
-import hashlib
+import uuid
 import pickle
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Tuple
 from langchain.schema import Document
 from langchain_community.document_loaders import PyMuPDFLoader, UnstructuredFileLoader
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pptx import Presentation  # type: ignore
 from bs4 import BeautifulSoup
 import requests
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
+# Make `utils.*` importable when run as a script (monitoring.py does this)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.index_utils import (add_source_texts, add_vectors, build_index, bump_index_version, delete_vectors,
+                               index_params_of, load_index, reembed_index, save_index, update_metadata)
+from utils.sharding import NUM_SHARDS, shard_count, shard_of, shard_path, write_shard_layout
+from utils.hashing import hash_content, hash_file
+from utils.source_manifest import SourceManifest
+from utils.dedup import NearDuplicateIndex, ShadowedChunks, drop_duplicates
+from utils.parallel_loader import iter_load_files, LOAD_WORKERS
+from utils.embed_executor import get_ingest_embedder
+from utils.embedder import DEFAULT_MODEL
 
 # ========================
 # 🔧 Logging setup
@@ -32,6 +43,8 @@ PROJECT_ROOT = BASE_DIR.parent.parent
 
 # Important folders (auto-adjust when repo is cloned anywhere)
 HASH_STORE_PATH = BASE_DIR / "indexed_hashes.pkl"
+MINHASH_STORE_PATH = BASE_DIR / "minhash_signatures.pkl"
+SHADOW_STORE_PATH = BASE_DIR / "shadowed_chunks.pkl"
 INDEX_PATH = PROJECT_ROOT / "combined_faiss_index"
 DEFAULT_DOC_FOLDER = PROJECT_ROOT / "Raggers" / "backend_rag_data"
 
@@ -42,25 +55,31 @@ SUPPORTED_EXTENSIONS = [".pdf", ".txt", ".md", ".csv", ".docx", ".ppt", ".pptx"]
 MIN_TOKENS = 20
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
+ANCHOR_MOD = 8                 # ~1 in 8 lines can end a segment
+MAX_SEGMENT = CHUNK_SIZE * 8   # hard cap when no anchor shows up
+EMBED_MODEL = DEFAULT_MODEL
+EMBED_BATCH_SIZE = 256         # chunks embedded and appended together
+CHECKPOINT_EVERY = 4096        # chunks between index/manifest checkpoints
 
 
 # ========================
 # 🔑 Load or initialize hash store
 # ========================
+# Exact chunk hashes and MinHash signatures of everything in the index
 if HASH_STORE_PATH.exists():
     with open(HASH_STORE_PATH, "rb") as f:
         indexed_hashes = pickle.load(f)
 else:
     indexed_hashes = set()
 
+near_duplicates = NearDuplicateIndex.load(MINHASH_STORE_PATH)
+# Chunks dropped as duplicates, waiting to replace the chunk they duplicate if it leaves
+shadowed = ShadowedChunks.load(SHADOW_STORE_PATH)
+
 
 # ========================
 # 🔍 Helper Functions
 # ========================
-def hash_content(text: str) -> str:
-    return hashlib.md5(text.encode()).hexdigest()
-
-
 def load_ppt_file(path: str) -> List[Document]:
     prs = Presentation(path)
     text = ""
@@ -68,35 +87,43 @@ def load_ppt_file(path: str) -> List[Document]:
         for shape in slide.shapes:
             if hasattr(shape, "text"):
                 text += shape.text + "\n"
-    return [Document(page_content=text, metadata={"source": Path(path).name, "ingested_by": "backend"})]
+    return [Document(page_content=text, metadata={"source": Path(path).name, "ingested_by": "backend", "source_type": "file"})]
 
 
-def load_new_files(folder: Path, processed: set) -> List[Document]:
-    docs = []
-    for file in folder.glob("*"):
-        ext = file.suffix.lower()
-        if ext in SUPPORTED_EXTENSIONS and file.name not in processed:
-            try:
-                if ext == ".pdf":
-                    loader = PyMuPDFLoader(str(file))
-                    pages = loader.load()
-                elif ext in [".ppt", ".pptx"]:
-                    pages = load_ppt_file(str(file))
-                else:
-                    loader = UnstructuredFileLoader(str(file))
-                    pages = loader.load()
-
-                for i, doc in enumerate(pages):
-                    doc.metadata["source"] = file.name
-                    doc.metadata["page"] = i + 1
-                    doc.metadata["ingested_by"] = "backend"
-
-                docs.extend(pages)
-                processed.add(file.name)
-                logger.info(f"📄 Loaded {len(pages)} pages from {file.name}")
-            except Exception as e:
-                logger.error(f"❌ Failed to load {file.name}: {e}")
-    return docs
+def scan_folder(folder: Path) -> Dict[str, Path]:
+    return {f.name: f for f in folder.glob("*") if f.suffix.lower() in SUPPORTED_EXTENSIONS}
+
+
+def load_file(file: Path) -> List[Document]:
+    ext = file.suffix.lower()
+    if ext == ".pdf":
+        loader = PyMuPDFLoader(str(file))
+        pages = loader.load()
+    elif ext in [".ppt", ".pptx"]:
+        pages = load_ppt_file(str(file))
+    else:
+        loader = UnstructuredFileLoader(str(file))
+        pages = loader.load()
+
+    for i, doc in enumerate(pages):
+        doc.metadata["source"] = file.name
+        doc.metadata["page"] = i + 1
+        doc.metadata["ingested_by"] = "backend"
+        doc.metadata.setdefault("source_type", "file")
+    return pages
+
+
+def load_new_files(files: List[Path], workers: int = LOAD_WORKERS) -> Iterator[Tuple[str, List[Document]]]:
+    """
+    Parse files in parallel and yield (source name, pages) as each finishes.
+    Files that fail or time out are skipped so their old vectors survive.
+    """
+    for file, pages, error in iter_load_files(files, load_file, workers=workers):
+        if error is not None:
+            logger.error(f"❌ Failed to load {file.name}: {error}")
+            continue
+        logger.info(f"📄 Loaded {len(pages)} pages from {file.name}")
+        yield file.name, pages
 
 
 def load_web(urls: List[str], url_cache: dict) -> List[Document]:
@@ -114,54 +141,324 @@ def load_web(urls: List[str], url_cache: dict) -> List[Document]:
                 logger.info(f"🔄 No change in {url}, skipping...")
                 continue
             url_cache[url] = hash_val
-            doc = Document(page_content=cleaned, metadata={"source": url, "ingested_by": "backend"})
+            doc = Document(page_content=cleaned, metadata={"source": url, "ingested_by": "backend", "source_type": "web"})
             docs.append(doc)
         except Exception as e:
             logger.error(f"❌ Failed to scrape {url}: {e}")
     return docs
 
 
+def _stable_segments(text: str) -> List[str]:
+    """
+    Cut text into segments at content-defined anchors: a line whose hash hits
+    ANCHOR_MOD once the segment is at least CHUNK_SIZE long. Boundaries depend
+    only on nearby lines, so an edit re-chunks its own segment and the split
+    re-synchronises right after it instead of shifting every later chunk.
+    """
+    segments, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        current.append(line)
+        size += len(line)
+        at_anchor = int(hash_content(line.strip())[:8], 16) % ANCHOR_MOD == 0
+        if (size >= CHUNK_SIZE and at_anchor) or size >= MAX_SEGMENT:
+            segments.append("".join(current))
+            current, size = [], 0
+    if current:
+        segments.append("".join(current))
+    return segments
+
+
 def chunk_documents(docs: List[Document]) -> List[Document]:
+    """
+    Split pages into chunks. Each chunk records where it sits in its page
+    (text_id = page hash, char_start, char_len), so the docstore can keep
+    one copy of the page instead of a copy of every chunk.
+    """
     splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    chunks = splitter.split_documents(docs)
     filtered_chunks = []
-    for i, chunk in enumerate(chunks):
-        if len(chunk.page_content.strip().split()) >= MIN_TOKENS:
-            chunk.metadata["chunk_index"] = i
-            chunk.metadata["rag_snippet"] = chunk.page_content
-            filtered_chunks.append(chunk)
+    i = 0
+    for doc in docs:
+        text_id = hash_content(doc.page_content)
+        seg_start = 0
+        for segment in _stable_segments(doc.page_content):
+            cursor = 0
+            for text in splitter.split_text(segment):
+                offset = segment.find(text, cursor)
+                if offset == -1:
+                    offset = segment.find(text)
+                cursor = offset + 1
+                if len(text.strip().split()) >= MIN_TOKENS:
+                    metadata = dict(doc.metadata)
+                    metadata["chunk_index"] = i
+                    metadata["chunk_hash"] = hash_content(text)
+                    if offset != -1:
+                        metadata.update(text_id=text_id, char_start=seg_start + offset, char_len=len(text))
+                    filtered_chunks.append(Document(page_content=text, metadata=metadata))
+                i += 1
+            seg_start += len(segment)
     return filtered_chunks
 
 
-def deduplicate_chunks(chunks: List[Document]) -> List[Document]:
-    logger.warning("⚠️ Deduplication temporarily disabled — all chunks will be indexed.")
-    return chunks
-
-
-def update_index(chunks: List[Document], index_path=INDEX_PATH):
-    logger.info(f"🗂️ Updating FAISS index at: {index_path}")
-    embedder = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en")
-
-    if Path(index_path).exists():
-        index = FAISS.load_local(index_path, embedder, allow_dangerous_deserialization=True)
-        index.add_documents(chunks)
-    else:
-        os.makedirs(index_path, exist_ok=True)
-        index = FAISS.from_documents(chunks, embedder)
-
-    index.save_local(index_path)
-    logger.info(f"✅ Index updated and saved to '{index_path}'")
-    logger.info(f"📊 FAISS now contains {len(index.docstore._dict)} documents")
-
+def source_texts(docs: List[Document]) -> Dict[str, str]:
+    """Page texts keyed by the text_id their chunks point into."""
+    return {hash_content(doc.page_content): doc.page_content for doc in docs}
+
+
+def fingerprint_chunks(chunks: List[Document]) -> List[str]:
+    """Stable per-source chunk keys; repeated text gets an occurrence suffix."""
+    seen = {}
+    fingerprints = []
+    for chunk in chunks:
+        h = chunk.metadata["chunk_hash"]
+        seen[h] = seen.get(h, 0) + 1
+        fingerprints.append(h if seen[h] == 1 else f"{h}:{seen[h]}")
+    return fingerprints
+
+
+def deduplicate_chunks(chunks: List[Document], origins: List[tuple] = None) -> List[Document]:
+    """
+    Drop exact and near-duplicate chunks before they cost an embedding.
+    With `origins` ((source, fingerprint) per chunk) the dropped ones are
+    kept aside in `shadowed` under the chunk they duplicate.
+    """
+    texts = [chunk.page_content for chunk in chunks]
+    keys = [chunk.metadata.get("chunk_hash") or hash_content(text) for chunk, text in zip(chunks, texts)]
+    dropped = []
+    kept, exact, near = drop_duplicates(texts, keys, indexed_hashes, near_duplicates, dropped)
+    if origins is not None:
+        for pos, original in dropped:
+            shadowed.add(original, *origins[pos], texts[pos], chunks[pos].metadata)
+    if exact or near:
+        logger.info(f"🧬 Dropped {exact} exact and {near} near-duplicate chunks")
+    return [chunks[i] for i in kept]
+
+
+def forget_chunk_hashes(hashes) -> List[tuple]:
+    """
+    Let chunks that are leaving the index be indexed again elsewhere, and
+    return the (source, fingerprint, text, metadata) of duplicates they were
+    shadowing, which must now be indexed in their place.
+    """
+    for h in hashes:
+        indexed_hashes.discard(h)
+        near_duplicates.remove(h)
+    return shadowed.release(hashes)
+
+
+def save_dedup_state():
     with open(HASH_STORE_PATH, "wb") as f:
         pickle.dump(indexed_hashes, f)
+    near_duplicates.save(MINHASH_STORE_PATH)
+    shadowed.save(SHADOW_STORE_PATH)
+
+
+class IndexWriter:
+    """
+    Keeps one FAISS index open for an ingestion run. Chunks are embedded and
+    appended in whatever batches the caller hands over; nothing touches disk
+    until `save()`.
+    """
+
+    def __init__(self, index_path=INDEX_PATH, factory: str = None):
+        self.index_path = Path(index_path)
+        self.factory = factory
+        self.embedder = get_ingest_embedder(EMBED_MODEL)
+        self.index = None
+        if (self.index_path / "index.faiss").exists():
+            self.index = load_index(self.embedder, str(self.index_path), mmap=False)
+        self._present = set(self.index.index_to_docstore_id.values()) if self.index is not None else set()
+        self._pending_deletes = set()
+        self._source_texts = {}
+        self.dirty = False
+
+    def ids_by_source(self) -> Dict[str, List[str]]:
+        by_source = {}
+        if self.index is not None:
+            for doc_id, doc in self.index.docstore._dict.items():
+                by_source.setdefault(doc.metadata.get("source"), []).append(doc_id)
+        return by_source
+
+    def delete(self, ids) -> int:
+        """Queue ids for removal; FAISS deletes are O(index), so they're applied once per save."""
+        stale = [i for i in set(ids) if i in self._present]
+        self._present.difference_update(stale)
+        self._pending_deletes.update(stale)
+        return len(stale)
+
+    def update_metadata(self, doc_id: str, metadata: dict):
+        if self.index is not None and update_metadata(self.index, doc_id, metadata):
+            self.dirty = True
+
+    def is_empty(self) -> bool:
+        return self.index is None
+
+    def mark_retype(self):
+        """Force a save (and so a rebuild) if the index isn't of the requested factory yet."""
+        if self.factory and self.index is not None and index_params_of(self.index).get("requested") != self.factory:
+            self.dirty = True
+
+    def add_source_texts(self, texts: Dict[str, str], source: str = None):
+        """Page texts that chunk spans point into; written (once per distinct text) on save."""
+        self._source_texts.update(texts)
+
+    def add(self, chunks: List[Document], vectors: List[List[float]] = None) -> List[str]:
+        ids = [str(uuid.uuid4()) for _ in chunks]
+        if not chunks:
+            return ids
+        texts = [chunk.page_content for chunk in chunks]
+        if vectors is None:
+            vectors = self.embedder.embed_documents(texts)
+        text_embeddings = zip(texts, vectors)
+        metadatas = [chunk.metadata for chunk in chunks]
+        if self.index is None:
+            self.index = build_index(text_embeddings, self.embedder, metadatas, ids, factory=self.factory)
+        else:
+            add_vectors(self.index, text_embeddings, metadatas=metadatas, ids=ids)
+        self._present.update(ids)
+        self.dirty = True
+        return ids
+
+    def save(self, save_cache: bool = True):
+        if self._pending_deletes:
+            delete_vectors(self.index, self._pending_deletes)
+            self._pending_deletes.clear()
+            self.dirty = True
+        if self.index is not None and self.dirty:
+            add_source_texts(self.index, self._source_texts)
+            self._source_texts = {}
+            os.makedirs(self.index_path, exist_ok=True)
+            save_index(self.index, str(self.index_path), factory=self.factory)
+            logger.info(f"💾 Checkpoint: FAISS holds {len(self.index.docstore._dict)} documents")
+        if save_cache:
+            self.embedder.cache.save()
+        self.dirty = False
+
+
+class ShardedIndexWriter:
+    """
+    IndexWriter over N shards, routed by source so a source's chunks (and its
+    deletes) always land in the same shard. Each batch is embedded once for
+    all shards; shards are trained and saved in parallel threads (FAISS
+    releases the GIL for both).
+    """
+
+    def __init__(self, index_path=INDEX_PATH, num_shards: int = NUM_SHARDS, factory: str = None):
+        self.index_path = Path(index_path)
+        self.num_shards = shard_count(index_path) or num_shards
+        if self.num_shards != num_shards:
+            logger.warning(f"⚠️ {index_path} already has {self.num_shards} shards; rebuild it to change the count")
+        self.factory = factory
+        self.embedder = get_ingest_embedder(EMBED_MODEL)
+        with ThreadPoolExecutor(max_workers=self.num_shards) as pool:
+            self.shards = list(pool.map(lambda i: IndexWriter(shard_path(index_path, i), factory=factory),
+                                        range(self.num_shards)))
+
+    def _shard_for(self, source) -> IndexWriter:
+        return self.shards[shard_of(source, self.num_shards)]
+
+    def _shard_holding(self, doc_id):
+        return next((shard for shard in self.shards if doc_id in shard._present), None)
+
+    @property
+    def dirty(self) -> bool:
+        return any(shard.dirty for shard in self.shards)
+
+    def is_empty(self) -> bool:
+        return all(shard.is_empty() for shard in self.shards)
+
+    def mark_retype(self):
+        for shard in self.shards:
+            shard.mark_retype()
+
+    def ids_by_source(self) -> Dict[str, List[str]]:
+        by_source = {}
+        for shard in self.shards:
+            for source, ids in shard.ids_by_source().items():
+                by_source.setdefault(source, []).extend(ids)
+        return by_source
+
+    def delete(self, ids) -> int:
+        by_shard = {}
+        for doc_id in set(ids):
+            shard = self._shard_holding(doc_id)
+            if shard is not None:
+                by_shard.setdefault(id(shard), (shard, []))[1].append(doc_id)
+        return sum(shard.delete(doc_ids) for shard, doc_ids in by_shard.values())
+
+    def update_metadata(self, doc_id: str, metadata: dict):
+        shard = self._shard_holding(doc_id)
+        if shard is not None:
+            shard.update_metadata(doc_id, metadata)
+
+    def add_source_texts(self, texts: Dict[str, str], source: str = None):
+        self._shard_for(source).add_source_texts(texts)
+
+    def add(self, chunks: List[Document], vectors: List[List[float]] = None) -> List[str]:
+        if not chunks:
+            return []
+        if vectors is None:
+            vectors = self.embedder.embed_documents([chunk.page_content for chunk in chunks])
+        groups = {}
+        for pos, chunk in enumerate(chunks):
+            groups.setdefault(shard_of(chunk.metadata.get("source"), self.num_shards), []).append(pos)
+        ids = [None] * len(chunks)
+        for shard_no, positions in groups.items():
+            shard_ids = self.shards[shard_no].add([chunks[p] for p in positions], [vectors[p] for p in positions])
+            for pos, doc_id in zip(positions, shard_ids):
+                ids[pos] = doc_id
+        return ids
+
+    def save(self):
+        was_dirty = self.dirty
+        with ThreadPoolExecutor(max_workers=self.num_shards) as pool:
+            list(pool.map(lambda shard: shard.save(save_cache=False), self.shards))
+        self.embedder.cache.save()
+        if was_dirty:
+            write_shard_layout(self.index_path, self.num_shards)
+            bump_index_version(str(self.index_path))
+
+
+def open_writer(index_path=INDEX_PATH, num_shards: int = NUM_SHARDS, factory: str = None):
+    """A sharded writer when the index is (or should become) sharded, else a plain one."""
+    monolithic = (Path(index_path) / "index.faiss").exists()
+    if shard_count(index_path) or (num_shards > 1 and not monolithic):
+        return ShardedIndexWriter(index_path, num_shards, factory=factory)
+    if num_shards > 1:
+        logger.warning(f"⚠️ {index_path} is a single index; rebuild it to shard it")
+    return IndexWriter(index_path, factory=factory)
+
+
+def update_index(chunks: List[Document], index_path=INDEX_PATH, stale_ids=None, factory: str = None) -> List[str]:
+    """Remove `stale_ids` from the index, add `chunks` and return the docstore ids given to them."""
+    logger.info(f"🗂️ Updating FAISS index at: {index_path}")
+    writer = open_writer(index_path, factory=factory)
+    removed = writer.delete(stale_ids or [])
+    if removed:
+        logger.info(f"🧹 Removed {removed} stale chunks")
+    ids = []
+    for i in range(0, len(chunks), EMBED_BATCH_SIZE):
+        ids += writer.add(chunks[i:i + EMBED_BATCH_SIZE])
+    writer.save()
+    save_dedup_state()
+    logger.info(f"✅ Index updated and saved to '{index_path}'")
+    return ids
 
 
 # ========================
 # 🚀 Main Ingestion Function
 # ========================
 def run_background_ingestion(pdf_dir: Path = DEFAULT_DOC_FOLDER, urls: List[str] = None,
-                             index_path=INDEX_PATH, benchmark=False):
+                             index_path=INDEX_PATH, benchmark=False, workers: int = LOAD_WORKERS,
+                             factory: str = None, num_shards: int = NUM_SHARDS):
+    """
+    Streaming ingestion: parse → chunk/diff → dedup → embed → append, in
+    EMBED_BATCH_SIZE batches with a checkpoint every CHECKPOINT_EVERY chunks.
+    Memory stays flat however large the folder is, and a crash only loses
+    the work since the last checkpoint. `factory` (e.g. "IVF4096,Flat",
+    "HNSW32") picks the FAISS index type; an existing index of another type
+    is rebuilt as that type. `num_shards` > 1 splits a new index into shards
+    by source.
+    """
     if urls is None:
         urls = []
     start = time.time()
@@ -173,25 +470,152 @@ def run_background_ingestion(pdf_dir: Path = DEFAULT_DOC_FOLDER, urls: List[str]
         logger.error(f"❌ Folder does not exist: {pdf_dir}")
         return
 
-    processed_files = set()
-    url_cache = {}
+    manifest = SourceManifest.load(index_path)
+    legacy_index = not manifest.path.exists()
 
-    new_file_docs = load_new_files(pdf_dir, processed_files)
-    new_web_docs = load_web(urls, url_cache)
+    # Only files whose bytes changed since the last run are reloaded
+    files = scan_folder(pdf_dir)
+    file_hashes = {name: hash_file(path) for name, path in files.items()}
+    changed = [path for name, path in files.items() if manifest.hash_of(name) != file_hashes[name]]
+    removed = [name for name in manifest.file_sources() if name not in files]
 
-    all_docs = new_file_docs + new_web_docs
-    if not all_docs:
-        logger.warning(f"⚠️ No new documents found in {pdf_dir}")
+    if not changed and not removed and not urls and not factory:
+        logger.info(f"✅ Index already up to date with {pdf_dir}")
         return
 
-    chunks = chunk_documents(all_docs)
-    chunks = deduplicate_chunks(chunks)
-
-    if chunks:
-        logger.info(f"✅ {len(chunks)} chunks to index.")
-        update_index(chunks, index_path)
-    else:
-        logger.warning("❌ No valid chunks to index.")
+    url_cache = {url: manifest.hash_of(url) for url in urls}
+
+    def changed_sources():
+        yield from load_new_files(changed, workers=workers)
+        for doc in load_web(urls, url_cache):
+            yield doc.metadata["source"], [doc]
+
+    writer = open_writer(index_path, num_shards, factory=factory)
+    writer.mark_retype()
+    if writer.is_empty():
+        # Fresh index: nothing is indexed yet, whatever the dedup stores remember
+        indexed_hashes.clear()
+        near_duplicates.clear()
+        shadowed.clear()
+    legacy_ids = writer.ids_by_source() if legacy_index else {}
+
+    stats = {"added": 0, "kept": 0, "purged": 0, "sources": 0, "revived": 0}
+    batch = []          # (source, fingerprint, chunk) waiting to be embedded
+    outstanding = {}    # source -> chunks of it still in `batch`
+    final_hashes = {}   # source -> (hash, kind) recorded once its chunks are flushed
+    since_checkpoint = 0
+
+    def finish_source(name):
+        content_hash, kind = final_hashes.pop(name)
+        manifest.record(name, content_hash, manifest.chunks_of(name), kind=kind)
+
+    def checkpoint():
+        # Index first: a manifest never references vectors that aren't on disk
+        writer.save()
+        manifest.save()
+        save_dedup_state()
+
+    def flush():
+        nonlocal since_checkpoint
+        chunks = deduplicate_chunks([chunk for _, _, chunk in batch], [(name, fp) for name, fp, _ in batch])
+        kept = {id(chunk) for chunk in chunks}
+        ids = writer.add(chunks)
+        for (name, fp, _), chunk_id in zip([b for b in batch if id(b[2]) in kept], ids):
+            manifest.add_chunk(name, fp, chunk_id)
+        for name, _, chunk in batch:
+            if id(chunk) in revived:
+                revived.discard(id(chunk))  # not part of its source's pending count
+                continue
+            outstanding[name] -= 1
+            if outstanding[name] == 0:
+                del outstanding[name]
+                finish_source(name)
+        stats["added"] += len(chunks)
+        since_checkpoint += len(batch)
+        batch.clear()
+        if since_checkpoint >= CHECKPOINT_EVERY:
+            checkpoint()
+            since_checkpoint = 0
+
+    revived = set()   # id() of shadowed chunks put back into `batch`
+    pending = set(removed) | {name for name, path in files.items() if path in changed} | set(urls)
+    deferred = []     # released duplicates of sources that may still be re-chunked
+
+    def revive(released):
+        # Duplicates in other sources take the place of the chunk that left
+        for item in released:
+            name, fp, text, metadata = item
+            if name in pending:
+                deferred.append(item)  # re-chunked (and re-deduplicated) later in this run, if it loads
+                continue
+            if name not in manifest.sources:
+                continue
+            chunk = Document(page_content=text, metadata=metadata)
+            revived.add(id(chunk))
+            batch.append((name, fp, chunk))
+            stats["revived"] += 1
+            if len(batch) >= EMBED_BATCH_SIZE:
+                flush()
+
+    # Deleted sources lose every chunk
+    for name in removed:
+        pending.discard(name)
+        shadowed.drop_source(name)
+        revive(forget_chunk_hashes({fp.split(":")[0] for fp in manifest.chunks_of(name)}))
+        stats["purged"] += writer.delete(manifest.forget(name))
+
+    # Edited sources are chunked and diffed as soon as their parser finishes
+    for name, docs in changed_sources():
+        stats["sources"] += 1
+        pending.discard(name)
+        old_map = manifest.chunks_of(name)
+        stale = manifest.ids_of(name) if not old_map else []  # legacy entry without fingerprints
+        stale += legacy_ids.pop(name, [])
+        shadowed.drop_source(name)  # its duplicates come round again in the new chunks
+        chunks = chunk_documents(docs)
+        writer.add_source_texts(source_texts(docs), source=name)
+        new_map, new_chunks = {}, []
+        for fp, chunk in zip(fingerprint_chunks(chunks), chunks):
+            if fp in old_map:
+                new_map[fp] = old_map[fp]
+                writer.update_metadata(old_map[fp], chunk.metadata)
+            else:
+                new_chunks.append((name, fp, chunk))
+        vanished = [fp for fp in old_map if fp not in new_map]
+        stale += [old_map[fp] for fp in vanished]
+        released = forget_chunk_hashes({fp.split(":")[0] for fp in vanished} - {fp.split(":")[0] for fp in new_map})
+        stats["purged"] += writer.delete(stale)
+        stats["kept"] += len(new_map)
+
+        # Until all its new chunks are flushed the source keeps its old hash,
+        # so a crash makes the next run re-diff it against what was saved.
+        kind = "file" if name in file_hashes else "url"
+        new_hash = file_hashes[name] if kind == "file" else url_cache[name]
+        manifest.record(name, manifest.hash_of(name), new_map, kind=kind)
+        final_hashes[name] = (new_hash, kind)
+        outstanding[name] = len(new_chunks)
+        if not new_chunks:
+            del outstanding[name]
+            finish_source(name)
+        revive(released)
+
+        for item in new_chunks:
+            batch.append(item)
+            if len(batch) >= EMBED_BATCH_SIZE:
+                flush()
+
+    # Unchanged URLs and files that failed to parse were never re-chunked,
+    # so nothing else brings back the duplicates they lost
+    left_over = [item for item in deferred if item[0] in pending]
+    pending.clear()
+    revive(left_over)
+
+    if batch:
+        flush()
+    checkpoint()
+
+    logger.info(f"✅ {stats['sources']} changed / {len(removed)} deleted sources: {stats['added']} chunks embedded, "
+                f"{stats['kept']} kept, {stats['purged']} purged, {stats['revived']} duplicates revived.")
 
     if benchmark:
         logger.info(f"⏱️ Ingestion completed in {round(time.time() - start, 2)}s")
@@ -207,12 +631,27 @@ if __name__ == "__main__":
     parser.add_argument("--update", action="store_true", help="Update the existing FAISS index")
     parser.add_argument("--benchmark", action="store_true", help="Measure ingestion time")
     parser.add_argument("--index", type=str, default=str(INDEX_PATH), help="Path to FAISS index directory")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS, help="Parallel file-parsing processes")
+    parser.add_argument("--shards", type=int, default=NUM_SHARDS, help="Number of index shards for a new index")
+    parser.add_argument("--index-factory", type=str, default=None,
+                        help='FAISS index type, e.g. "IVF4096,Flat" or "HNSW32" (default: keep current / PHIRAG_INDEX_FACTORY)')
+    parser.add_argument("--reembed", action="store_true",
+                        help="Re-embed the stored chunks with the current PHIRAG_EMBED_MODEL and exit")
 
     args = parser.parse_args()
 
+    if args.reembed:
+        embedder = get_ingest_embedder(EMBED_MODEL)
+        reembed_index(embedder, args.index)
+        embedder.cache.save()
+        raise SystemExit(0)
+
     run_background_ingestion(
         pdf_dir=args.folder,
         urls=[],
         index_path=args.index,
-        benchmark=args.benchmark
+        benchmark=args.benchmark,
+        workers=args.workers,
+        factory=args.index_factory,
+        num_shards=args.shards
     )
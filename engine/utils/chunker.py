@@ -1,12 +1,21 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from utils.hashing import hash_content
+
 def chunk_documents(docs, chunk_size=500, chunk_overlap=50):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    chunks = splitter.split_documents(docs)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    chunks = []
+
+    for doc in docs:
+        text_id = hash_content(doc.page_content)
+        for chunk in splitter.split_documents([doc]):
+            start = chunk.metadata.pop("start_index", -1)
+            if start != -1:
+                # ✅ Span into the source page instead of a second copy of the text
+                chunk.metadata.update(text_id=text_id, char_start=start, char_len=len(chunk.page_content))
+            chunks.append(chunk)
 
     for i, chunk in enumerate(chunks):
         chunk.metadata["chunk_index"] = i
-        chunk.metadata["rag_snippet"] = chunk.page_content  # ✅ Needed for displaying best match
 
     return chunks
-
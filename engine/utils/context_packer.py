@@ -0,0 +1,205 @@
+import os
+import re
+import math
+import logging
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# 🔧 Budget & selection settings
+# ========================
+CONTEXT_WINDOW = int(os.getenv("PHIRAG_CONTEXT_WINDOW", "4096"))          # phi3:3.8b
+CONTEXT_TOKENS = int(os.getenv("PHIRAG_CONTEXT_TOKENS", "1500"))          # budget for retrieved passages
+CANDIDATES = int(os.getenv("PHIRAG_CONTEXT_CANDIDATES", "12"))            # hits considered before packing
+MIN_PASSAGES = 2
+SCORE_RATIO = float(os.getenv("PHIRAG_CONTEXT_SCORE_RATIO", "0.6"))       # keep hits this close to the best dense/BM25 one
+REDUNDANCY = float(os.getenv("PHIRAG_CONTEXT_REDUNDANCY", "0.92"))        # cosine at which a passage repeats another
+MERGE_GAP = 4                                                             # stripped whitespace between merged chunks
+TOKENS_PER_WORD = 1.3                                                     # answer length → tokens
+CHARS_PER_TOKEN = 4                                                       # long words split into pieces this size
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token estimate for a SentencePiece model such as phi3: one per
+    punctuation mark, one per short word and one per CHARS_PER_TOKEN
+    characters of longer words and identifiers.
+    """
+    return sum(max(1, math.ceil(len(piece) / CHARS_PER_TOKEN)) for piece in _PIECE_RE.findall(text))
+
+
+def answer_tokens(word_limit: int) -> int:
+    return math.ceil((word_limit or 150) * TOKENS_PER_WORD)
+
+
+# ========================
+# 🎯 Adaptive k
+# ========================
+def _key(doc: Document):
+    return doc.id or doc.page_content  # as hybrid_search keys its signals
+
+
+def select_hits(hits: List[Tuple[Document, float]], signals: dict = None, ratio=SCORE_RATIO, min_k=MIN_PASSAGES):
+    """
+    Cut ranked (Document, fused score) hits on the retrievers' own scores
+    (`signals` from hybrid_search): a hit stays if its BM25 score is at
+    least `ratio` of the best one, or its dense distance at most the best
+    distance / `ratio`. The first `min_k` always stay. Rank-fusion scores
+    only encode positions, so without signals every hit is kept and the
+    token budget decides.
+    """
+    if not signals:
+        return list(hits)
+    evidence = [signals.get(_key(doc)) or {} for doc, _ in hits]
+    bm25 = [e["bm25"] for e in evidence if e.get("bm25") is not None]
+    dense = [e["dense"] for e in evidence if e.get("dense") is not None]
+    bm25_floor = max(bm25) * ratio if bm25 else None
+    dense_ceiling = min(dense) / ratio if dense else None
+
+    def relevant(e):
+        return ((bm25_floor is not None and e.get("bm25") is not None and e["bm25"] >= bm25_floor)
+                or (dense_ceiling is not None and e.get("dense") is not None and e["dense"] <= dense_ceiling))
+
+    return [hit for i, (hit, e) in enumerate(zip(hits, evidence)) if i < min_k or relevant(e)]
+
+
+# ========================
+# 🧩 Merging & dedup
+# ========================
+def _span(doc: Document):
+    meta = doc.metadata or {}
+    if meta.get("text_id") is None or meta.get("char_start") is None:
+        return None
+    start = int(meta["char_start"])
+    return meta["text_id"], start, start + int(meta.get("char_len") or len(doc.page_content))
+
+
+def merge_passages(hits: List[Tuple[Document, float]]) -> List[dict]:
+    """
+    Join chunks cut from the same page text whose spans overlap or touch
+    (consecutive chunks share CHUNK_OVERLAP characters), so the overlap is
+    sent once. Passages come back in the order of their best-ranked chunk.
+    """
+    passages, by_text = [], {}
+    for rank, (doc, score) in enumerate(hits):
+        span = _span(doc)
+        passage = {"text": doc.page_content, "score": score, "rank": rank, "docs": [doc], "span": span}
+        if span is None:
+            passages.append(passage)
+        else:
+            by_text.setdefault(span[0], []).append(passage)
+
+    for group in by_text.values():
+        group.sort(key=lambda p: p["span"][1])
+        current = group[0]
+        for nxt in group[1:]:
+            text_id, start, end = current["span"]
+            _, nxt_start, nxt_end = nxt["span"]
+            if nxt_start > end + MERGE_GAP:
+                passages.append(current)
+                current = nxt
+                continue
+            if nxt_end > end:
+                tail = nxt["text"][end - nxt_start:] if nxt_start <= end else "\n" + nxt["text"]
+                current["text"] += tail
+            current["span"] = (text_id, start, max(end, nxt_end))
+            current["docs"] += nxt["docs"]
+            current["score"] = max(current["score"], nxt["score"])
+            current["rank"] = min(current["rank"], nxt["rank"])
+        passages.append(current)
+    return sorted(passages, key=lambda p: p["rank"])
+
+
+def _unit_vector(passage: dict, signals: dict):
+    # Only single chunks have a stored vector; a merged passage is compared by text
+    if not signals or len(passage["docs"]) != 1:
+        return None
+    vector = (signals.get(_key(passage["docs"][0])) or {}).get("vector")
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype="float32")
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def drop_redundant(passages: List[dict], signals: dict = None, threshold=REDUNDANCY) -> Tuple[List[dict], int]:
+    """
+    Drop passages already contained in a better-ranked one (e.g. the same
+    chunk from another upload, or a chunk inside a merged passage) or whose
+    stored vector (from hybrid_search's `signals`) is within `threshold`
+    cosine of one. Nothing is re-embedded.
+    """
+    if len(passages) < 2:
+        return passages, 0
+    vectors = [_unit_vector(p, signals) for p in passages]
+    kept = []
+    for i, passage in enumerate(passages):
+        if any(passage["text"] in passages[j]["text"] for j in kept):
+            continue
+        if vectors[i] is not None and any(vectors[j] is not None and float(vectors[i] @ vectors[j]) >= threshold
+                                          for j in kept):
+            continue
+        kept.append(i)
+    return [passages[i] for i in kept], len(passages) - len(kept)
+
+
+def _truncate(text: str, tokens: int) -> str:
+    pieces = list(re.finditer(r"\S+", text))
+    used = 0
+    for piece in pieces:
+        used += count_tokens(piece.group())
+        if used > tokens:
+            return text[:piece.start()].rstrip() + " …"
+    return text
+
+
+# ========================
+# 📦 Packing
+# ========================
+def pack_context(hits: List[Tuple[Document, float]], signals: dict = None, budget: int = CONTEXT_TOKENS,
+                 reserve: int = 0, window: int = CONTEXT_WINDOW) -> Tuple[str, List[Document], dict]:
+    """
+    Build the prompt context from ranked (Document, score) hits and the
+    `signals` hybrid_search filled in for them: adaptive cut on the dense
+    and BM25 scores, merge overlapping chunks, drop near-duplicate
+    passages, then fill `budget` tokens (never more than the model's
+    `window` minus `reserve` for the question and the answer).
+
+    Returns (context, chunks used, report); the report counts the tokens
+    the naive join of the selected chunks would have cost and how many of
+    those were saved.
+    """
+    selected = select_hits(hits, signals)
+    passages = merge_passages(selected)
+    merged = len(selected) - len(passages)
+    passages, redundant = drop_redundant(passages, signals)
+
+    limit = max(0, min(budget, window - reserve))
+    packed, used, skipped = [], 0, 0
+    for passage in passages:
+        tokens = count_tokens(passage["text"])
+        if used + tokens > limit:
+            if packed:
+                skipped += 1
+                continue
+            passage = {**passage, "text": _truncate(passage["text"], limit - 1)}  # the best passage alone is too long
+            tokens = count_tokens(passage["text"])
+        packed.append(passage)
+        used += tokens
+
+    context = "\n\n".join(p["text"] for p in packed)
+    baseline = count_tokens("\n\n".join(doc.page_content for doc, _ in selected))
+    tokens = count_tokens(context)
+    report = {
+        "candidates": len(hits), "selected": len(selected), "passages": len(packed),
+        "merged": merged, "redundant": redundant, "over_budget": skipped,
+        "tokens": tokens, "budget": limit, "baseline_tokens": baseline, "tokens_saved": max(0, baseline - tokens),
+    }
+    logger.debug(f"📦 Packed {len(selected)} hits into {len(packed)} passages, {tokens}/{limit} tokens "
+                 f"({report['tokens_saved']} saved)")
+    return context, [doc for p in packed for doc in p["docs"]], report
@@ -0,0 +1,195 @@
+import os
+import re
+import pickle
+import random
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# ========================
+# 🔧 MinHash / LSH settings
+# ========================
+NUM_PERM = 64
+BANDS = 8                      # 8 bands x 8 rows → candidates from ~0.77 Jaccard up
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+NEAR_DUP_THRESHOLD = 0.85      # estimated Jaccard needed to call it a duplicate
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)     # fixed seed: signatures must match across runs
+_PERMS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+_WORD_RE = re.compile(r"\w+")
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash_signature(text: str) -> Tuple[int, ...]:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little")
+              for s in _shingles(text)]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMS
+    )
+
+
+def estimated_jaccard(sig_a, sig_b) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of indexed chunks with LSH banding, so a new chunk is
+    only compared against the few chunks that share a band with it.
+    """
+
+    def __init__(self):
+        self.signatures: Dict[str, Tuple[int, ...]] = {}
+        self.buckets: Dict[Tuple[int, int], set] = {}
+
+    @staticmethod
+    def _bands(signature):
+        for band in range(BANDS):
+            yield band, hash(signature[band * ROWS:(band + 1) * ROWS])
+
+    def find_duplicate(self, signature) -> Optional[str]:
+        candidates = set()
+        for key in self._bands(signature):
+            candidates.update(self.buckets.get(key, ()))
+        for key in candidates:
+            if estimated_jaccard(signature, self.signatures[key]) >= NEAR_DUP_THRESHOLD:
+                return key
+        return None
+
+    def add(self, key: str, signature):
+        self.signatures[key] = signature
+        for band_key in self._bands(signature):
+            self.buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str):
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._bands(signature):
+            bucket = self.buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def clear(self):
+        self.signatures.clear()
+        self.buckets.clear()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    @classmethod
+    def load(cls, path) -> "NearDuplicateIndex":
+        index = cls()
+        path = Path(path)
+        if path.exists() and path.stat().st_size > 0:
+            with open(path, "rb") as f:
+                signatures = pickle.load(f)
+            for key, signature in signatures.items():
+                index.add(key, signature)
+        return index
+
+    def save(self, path):
+        # Only signatures are stored; buckets use hash() and are rebuilt on load
+        tmp_path = str(path) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.signatures, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+
+def drop_duplicates(texts: List[str], keys: List[str], seen_hashes: set,
+                    near_index: NearDuplicateIndex, dropped: list = None) -> Tuple[List[int], int, int]:
+    """
+    Return the positions of texts that are neither exact (by key) nor near
+    duplicates of anything indexed or earlier in the batch. Accepted texts are
+    registered in `seen_hashes` / `near_index`. Pass a list as `dropped` to
+    get (position, key of the chunk it duplicates) for every rejected text.
+    """
+    kept, exact, near = [], 0, 0
+    for pos, (text, key) in enumerate(zip(texts, keys)):
+        if key in seen_hashes:
+            exact += 1
+            if dropped is not None:
+                dropped.append((pos, key))
+            continue
+        signature = minhash_signature(text)
+        original = near_index.find_duplicate(signature)
+        if original is not None:
+            near += 1
+            if dropped is not None:
+                dropped.append((pos, original))
+            continue
+        seen_hashes.add(key)
+        near_index.add(key, signature)
+        kept.append(pos)
+    return kept, exact, near
+
+
+class ShadowedChunks:
+    """
+    Chunks dropped as duplicates, filed under the key of the indexed chunk
+    they duplicate. When that chunk leaves the index (its source was edited
+    or deleted), the chunks it shadowed are handed back to be indexed in its
+    place, so text still present in another source never goes missing.
+    """
+
+    def __init__(self):
+        self.by_key: Dict[str, Dict[Tuple[str, str], tuple]] = {}  # key -> (source, fingerprint) -> (text, metadata)
+        self._keys_of: Dict[str, set] = {}                          # source -> keys it shadows chunks under
+
+    def add(self, key: str, source: str, fingerprint: str, text: str, metadata: dict):
+        self.by_key.setdefault(key, {})[(source, fingerprint)] = (text, metadata)
+        self._keys_of.setdefault(source, set()).add(key)
+
+    def drop_source(self, source: str):
+        """Forget a source's shadowed chunks (it is being re-chunked or deleted)."""
+        for key in self._keys_of.pop(source, ()):
+            entries = self.by_key.get(key, {})
+            for entry in [e for e in entries if e[0] == source]:
+                del entries[entry]
+            if not entries:
+                self.by_key.pop(key, None)
+
+    def release(self, keys) -> List[Tuple[str, str, str, dict]]:
+        """Pop everything shadowed under `keys` as (source, fingerprint, text, metadata)."""
+        released = []
+        for key in keys:
+            for (source, fingerprint), (text, metadata) in self.by_key.pop(key, {}).items():
+                self._keys_of.get(source, set()).discard(key)
+                released.append((source, fingerprint, text, metadata))
+        return released
+
+    def clear(self):
+        self.by_key.clear()
+        self._keys_of.clear()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.by_key.values())
+
+    @classmethod
+    def load(cls, path) -> "ShadowedChunks":
+        shadows = cls()
+        path = Path(path)
+        if path.exists() and path.stat().st_size > 0:
+            with open(path, "rb") as f:
+                by_key = pickle.load(f)
+            for key, entries in by_key.items():
+                for (source, fingerprint), (text, metadata) in entries.items():
+                    shadows.add(key, source, fingerprint, text, metadata)
+        return shadows
+
+    def save(self, path):
+        tmp_path = str(path) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.by_key, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
@@ -0,0 +1,388 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping, MutableMapping
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+DOCSTORE_FILE = "docstore.sqlite"
+IDS_FILE = "index_ids.bin"
+
+
+# ========================
+# 📚 SQLite docstore
+# ========================
+SPAN_KEYS = ("text_id", "char_start", "char_len")
+
+# Chunks stored as a span read their text out of the source text they came from
+_DOC_TEXT = ("CASE WHEN d.text = '' AND t.text IS NOT NULL "
+             "THEN substr(t.text, d.char_start + 1, d.char_len) ELSE d.text END")
+_SELECT_DOCS = f"SELECT d.id, {_DOC_TEXT}, d.metadata FROM docs d LEFT JOIN texts t ON t.id = d.text_id"
+
+# ========================
+# 🔎 Lexical (BM25) index
+# ========================
+# Contentless FTS5 keyed by docs.rowid, so chunk text isn't stored a second
+# time (which is also why the docstore must never be VACUUMed: that may
+# renumber rowids). Triggers keep it in step with every insert, replace and delete the
+# ingestion writer makes. '-' and '_' are word characters so identifiers
+# like ERR-4012 or part_no_17 stay one token; words are Porter-stemmed.
+_FTS_TOKENIZE = "porter unicode61 tokenchars '-_'"
+_FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(text, content='', tokenize=\"{_FTS_TOKENIZE}\")",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts_vocab USING fts5vocab(docs_fts, 'row')",
+    "CREATE TRIGGER IF NOT EXISTS docs_fts_insert AFTER INSERT ON docs BEGIN "
+    "INSERT INTO docs_fts (rowid, text) VALUES (new.rowid, new.text); END",
+    # A contentless index is told exactly what it had indexed for the row
+    "CREATE TRIGGER IF NOT EXISTS docs_fts_delete BEFORE DELETE ON docs BEGIN "
+    "INSERT INTO docs_fts (docs_fts, rowid, text) VALUES ('delete', old.rowid, CASE WHEN old.text = '' "
+    "THEN (SELECT substr(t.text, old.char_start + 1, old.char_len) FROM texts t WHERE t.id = old.text_id) "
+    "ELSE old.text END); END",
+)
+_TOKEN = re.compile(r"[\w\-]+")
+MAX_TERM_SHARE = float(os.getenv("PHIRAG_BM25_MAX_TERM_SHARE", "0.25"))  # terms in more chunks than this are skipped
+TERM_CACHE_SIZE = 50000
+
+
+def query_terms(text: str) -> List[str]:
+    return list(dict.fromkeys(token.lower() for token in _TOKEN.findall(text) if token.strip("-_")))
+
+
+# A metadata value as the text MetadataIndex keys it by (Python str()), so filters
+# match the same chunks on the lexical side: page 3 and page "3" are one value
+_METADATA_TEXT = ("CASE json_type(d.metadata, ?) WHEN 'true' THEN 'True' WHEN 'false' THEN 'False' "
+                  "ELSE CAST(json_extract(d.metadata, ?) AS TEXT) END")
+
+
+def _open_stemmer() -> sqlite3.Connection:
+    """Scratch in-memory FTS5 table with the docs_fts tokenizer, so query terms are stemmed like the chunks were."""
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute(f"CREATE VIRTUAL TABLE stems USING fts5(text, tokenize=\"{_FTS_TOKENIZE}\")")
+    conn.execute("CREATE VIRTUAL TABLE stems_vocab USING fts5vocab(stems, 'instance')")
+    return conn
+
+
+def fts_query(terms: List[str]) -> str:
+    """Any-term FTS5 query; every term is quoted so punctuation can't be read as syntax."""
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class SQLiteDocstore(Docstore, AddableMixin, MutableMapping):
+    """
+    Drop-in replacement for langchain's InMemoryDocstore that keeps documents
+    in SQLite and reads them by id on demand. WAL mode lets any number of
+    query processes read while one ingestion process writes; writes become
+    visible to them on `commit()`.
+
+    Source texts are stored once in `texts` (keyed by content hash). A chunk
+    whose metadata carries (text_id, char_start, char_len) and matches that
+    span is stored without its own copy of the text.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()  # replace_all holds it across add/compact
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL, "
+                           "text_id TEXT, char_start INTEGER, char_len INTEGER)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS texts (id TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(docs)")}
+        for column, kind in (("text_id", "TEXT"), ("char_start", "INTEGER"), ("char_len", "INTEGER")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE docs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS docs_text_id ON docs (text_id)")
+        # Source texts whose chunks changed since the last compact(), written in the same
+        # transaction as the change so a crash can't lose track of them
+        self._conn.execute("CREATE TABLE IF NOT EXISTS dirty_texts (id TEXT PRIMARY KEY)")
+        # INSERT OR REPLACE only fires the delete trigger with recursive triggers on
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        has_fts = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'docs_fts'").fetchone()
+        for statement in _FTS_SCHEMA:
+            self._conn.execute(statement)
+        if not has_fts:
+            # Docstore written before the lexical index existed
+            self._conn.execute(f"INSERT INTO docs_fts (rowid, text) SELECT d.rowid, {_DOC_TEXT} "
+                               "FROM docs d LEFT JOIN texts t ON t.id = d.text_id")
+        self._conn.commit()
+        self._doc_count = None
+        self._term_docs = {}  # term -> chunks containing it; counting decodes the whole posting list
+        self._stemmer = None
+
+    # InMemoryDocstore compatibility: callers (and langchain's merge_from) use ._dict
+    @property
+    def _dict(self):
+        return self
+
+    @staticmethod
+    def _row_to_doc(doc_id, text, metadata) -> Document:
+        return Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+
+    # ---- langchain Docstore / AddableMixin ----
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self.get(search)
+        return doc if doc is not None else f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]):
+        rows = []
+        for doc_id, doc in texts.items():
+            # rag_snippet was a second copy of page_content in older indexes
+            metadata = {k: v for k, v in doc.metadata.items() if k != "rag_snippet"}
+            rows.append((doc_id, doc.page_content, json.dumps(metadata, default=str),
+                         *(metadata.get(key) for key in SPAN_KEYS)))
+        with self._lock:
+            self._doc_count, self._term_docs = None, {}
+            self._mark_dirty([(doc_id,) for doc_id in texts])  # a replaced chunk may leave its old text
+            self._conn.executemany("INSERT OR IGNORE INTO dirty_texts (id) VALUES (?)",
+                                   {(row[3],) for row in rows if row[3] is not None})
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO docs (id, text, metadata, text_id, char_start, char_len) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _mark_dirty(self, doc_ids: List[tuple]):
+        self._conn.executemany("INSERT OR IGNORE INTO dirty_texts (id) "
+                               "SELECT text_id FROM docs WHERE id = ? AND text_id IS NOT NULL", doc_ids)
+
+    def add_source_texts(self, texts: Dict[str, str]):
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO texts (id, text) VALUES (?, ?)", list(texts.items()))
+            self._conn.executemany("INSERT OR IGNORE INTO dirty_texts (id) VALUES (?)", [(text_id,) for text_id in texts])
+
+    def compact(self):
+        """
+        Turn chunks that match their source span into span references and
+        drop source texts no chunk points into. Only source texts touched
+        since the last compact are looked at (through the text_id index),
+        so the cost follows the change, not the size of the docstore.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE docs SET text = '' WHERE text_id IN (SELECT id FROM dirty_texts) AND text != '' AND EXISTS ("
+                "SELECT 1 FROM texts t WHERE t.id = docs.text_id "
+                "AND substr(t.text, docs.char_start + 1, docs.char_len) = docs.text)"
+            )
+            self._conn.execute("DELETE FROM texts WHERE id IN (SELECT id FROM dirty_texts) AND NOT EXISTS ("
+                               "SELECT 1 FROM docs d WHERE d.text_id = texts.id AND d.text = '')")
+            self._conn.execute("DELETE FROM dirty_texts")
+
+    def source_span(self, text_id: str, start: int, length: int, context: int = 0) -> str:
+        """Original text of a chunk, optionally with `context` characters either side for highlighting."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT substr(text, ?, ?) FROM texts WHERE id = ?",
+                (max(0, start - context) + 1, length + context + min(start, context), text_id),
+            ).fetchone()
+        return row[0] if row else ""
+
+    def _stems(self, terms: List[str]) -> Dict[str, set]:
+        """term -> the tokens docs_fts indexes it as (usually its one stem)."""
+        if self._stemmer is None:
+            self._stemmer = _open_stemmer()
+        self._stemmer.executemany("INSERT INTO stems (rowid, text) VALUES (?, ?)", enumerate(terms))
+        stems = {term: set() for term in terms}
+        for pos, stem in self._stemmer.execute("SELECT doc, term FROM stems_vocab"):
+            stems[terms[pos]].add(stem)
+        self._stemmer.execute("DELETE FROM stems")
+        self._stemmer.commit()
+        return stems
+
+    def _selective_terms(self, terms: List[str]) -> List[str]:
+        """Drop stopword-like terms (near-zero IDF, but they make every chunk a match); keep the rarest if all are."""
+        if self._doc_count is None:
+            self._doc_count = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        unknown = [term for term in terms if term not in self._term_docs]
+        if unknown:
+            if len(self._term_docs) + len(unknown) > TERM_CACHE_SIZE:
+                self._term_docs.clear()
+            # The vocab holds Porter stems: "running" is indexed as "run"
+            stems = self._stems(unknown)
+            wanted = sorted(set().union(*stems.values()))
+            found = dict(self._conn.execute(
+                f"SELECT term, doc FROM docs_fts_vocab WHERE term IN ({','.join('?' * len(wanted))})", wanted))
+            self._term_docs.update({term: min((found.get(stem, 0) for stem in stems[term]), default=0)
+                                    for term in unknown})
+        counts = self._term_docs
+        limit = max(1, int(self._doc_count * MAX_TERM_SHARE))
+        selective = [term for term in terms if counts.get(term, 0) <= limit]
+        return selective or [min(terms, key=lambda term: counts.get(term, 0))]
+
+    def lexical_search(self, query: str, k: int = 5, where: dict = None) -> List[Tuple[Document, float]]:
+        """BM25 top-k as (Document, score) pairs, higher is better; `where` as in search_index."""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        clauses, params = [], []
+        for field, wanted in (where or {}).items():
+            values = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+            clauses.append(f"{_METADATA_TEXT} IN ({','.join('?' * len(values))})")
+            params += [f"$.{field}", f"$.{field}", *map(str, values)]
+        with self._lock:
+            match = fts_query(self._selective_terms(terms))
+            if clauses:
+                # The filter has to apply before the top-k cut
+                ranked = (f"SELECT docs_fts.rowid, bm25(docs_fts) AS score FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid "
+                          f"WHERE docs_fts MATCH ? AND {' AND '.join(clauses)} ORDER BY score LIMIT ?")
+            else:
+                ranked = "SELECT rowid, bm25(docs_fts) AS score FROM docs_fts WHERE docs_fts MATCH ? ORDER BY score LIMIT ?"
+            rows = self._conn.execute(
+                f"SELECT d.id, {_DOC_TEXT}, d.metadata, r.score FROM ({ranked}) r "
+                "JOIN docs d ON d.rowid = r.rowid LEFT JOIN texts t ON t.id = d.text_id ORDER BY r.score",
+                (match, *params, k),
+            ).fetchall()
+        return [(self._row_to_doc(doc_id, text, metadata), -score) for doc_id, text, metadata, score in rows]
+
+    def delete(self, ids: List):
+        with self._lock:
+            self._doc_count, self._term_docs = None, {}
+            rows = [(doc_id,) for doc_id in ids]
+            self._mark_dirty(rows)
+            self._conn.executemany("DELETE FROM docs WHERE id = ?", rows)
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+            if self._stemmer is not None:
+                self._stemmer.close()
+
+    # ---- mapping interface ----
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Document]:
+        ids = list(ids)
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                for row in self._conn.execute(f"{_SELECT_DOCS} WHERE d.id IN ({marks})", batch):
+                    found[row[0]] = self._row_to_doc(*row)
+        return found
+
+    def __getitem__(self, doc_id):
+        with self._lock:
+            row = self._conn.execute(f"{_SELECT_DOCS} WHERE d.id = ?", (doc_id,)).fetchone()
+        if row is None:
+            raise KeyError(doc_id)
+        return self._row_to_doc(*row)
+
+    def __setitem__(self, doc_id, doc: Document):
+        self.add({doc_id: doc})
+
+    def __delitem__(self, doc_id):
+        self.delete([doc_id])
+
+    def __contains__(self, doc_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM docs WHERE id = ?", (doc_id,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def __iter__(self):
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM docs")]
+        return iter(ids)
+
+    def items(self):
+        with self._lock:
+            rows = self._conn.execute(_SELECT_DOCS).fetchall()
+        return [(row[0], self._row_to_doc(*row)) for row in rows]
+
+    def values(self):
+        return [doc for _, doc in self.items()]
+
+    def metadata_by_id(self) -> Dict[str, dict]:
+        """Metadata of every document, without reading any text."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, metadata FROM docs").fetchall()
+        return {doc_id: json.loads(metadata) for doc_id, metadata in rows}
+
+    def replace_all(self, documents: Dict[str, Document], source_texts: Dict[str, str] = None):
+        """
+        Swap the whole contents for `documents` in one transaction on this
+        connection. Readers with the file open keep their snapshot until the
+        commit, then see the new one; the file itself is never replaced
+        under them (which would orphan their -wal/-shm files).
+        """
+        with self._lock:
+            self._conn.commit()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Clearing the contentless FTS wholesale beats a delete trigger per row;
+                # DDL is transactional, so no reader ever sees the trigger missing
+                self._conn.execute("DROP TRIGGER IF EXISTS docs_fts_delete")
+                self._conn.execute("DELETE FROM docs")
+                self._conn.execute("DELETE FROM texts")
+                self._conn.execute("DELETE FROM dirty_texts")
+                self._conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('delete-all')")
+                self._conn.execute(_FTS_SCHEMA[3])
+                self.add(documents)
+                self.add_source_texts(source_texts or {})
+                self.compact()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    @classmethod
+    def create(cls, path, documents: Dict[str, Document], source_texts: Dict[str, str] = None) -> "SQLiteDocstore":
+        """Write `documents` as the docstore at `path`, in place (used when migrating a pickled docstore)."""
+        store = cls(path)
+        store.replace_all(documents, source_texts)
+        return store
+
+
+# ========================
+# 🗺️ FAISS position → docstore id
+# ========================
+class MappedIds(Mapping):
+    """Read-only index_to_docstore_id backed by a memory-mapped fixed-width id file."""
+
+    def __init__(self, ids: np.ndarray):
+        self._ids = ids
+
+    def __getitem__(self, pos):
+        if not 0 <= pos < len(self._ids):
+            raise KeyError(pos)
+        return self._ids[pos].decode("utf-8")
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(range(len(self._ids)))
+
+
+def write_ids(index_path, index_to_docstore_id: Mapping) -> int:
+    """Write ids in position order as fixed-width bytes; returns the width used."""
+    ids = [index_to_docstore_id[pos].encode("utf-8") for pos in range(len(index_to_docstore_id))]
+    width = max((len(doc_id) for doc_id in ids), default=1)
+    path = Path(index_path) / IDS_FILE
+    tmp_path = str(path) + ".tmp"
+    np.array(ids, dtype=f"S{width}").tofile(tmp_path)
+    os.replace(tmp_path, path)
+    return width
+
+
+def read_ids(index_path, width: int, count: int, mmap=True) -> Union[MappedIds, dict]:
+    path = Path(index_path) / IDS_FILE
+    if path.stat().st_size != width * count:
+        raise ValueError(f"{path} does not hold {count} ids of width {width}")
+    if not count:
+        return {} if not mmap else MappedIds(np.zeros(0, dtype=f"S{width}"))
+    ids = np.memmap(path, dtype=f"S{width}", mode="r", shape=(count,))
+    if mmap:
+        return MappedIds(ids)
+    return {pos: doc_id.decode("utf-8") for pos, doc_id in enumerate(ids)}
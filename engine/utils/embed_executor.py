@@ -0,0 +1,141 @@
+import os
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_cache import CachedEmbeddings
+from utils.embedder import DEFAULT_MODEL, EMBED_BACKEND, backend_of, embedder_id, get_embedder
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# 🔧 Defaults (override per deployment)
+# ========================
+THREADS_PER_WORKER = int(os.getenv("PHIRAG_EMBED_THREADS", "4"))
+EMBED_WORKERS = int(os.getenv("PHIRAG_EMBED_WORKERS", str(max(1, (os.cpu_count() or 1) // THREADS_PER_WORKER))))
+SHARD_SIZE = 64                      # most texts per task handed to a worker
+PARALLEL_MIN_BATCH = 2 * SHARD_SIZE  # smaller batches are embedded in-process
+
+
+# ========================
+# 👷 Worker side
+# ========================
+_worker_model = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    # Pin intra-op threads before torch spins up its pools
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+    # `backend` is what the parent resolved (verified against fp32, or its torch fallback)
+    global _worker_model
+    _worker_model = get_embedder(model_name, backend, device="cpu", verify=False)
+
+
+def _embed_shard(texts: List[str]) -> List[List[float]]:
+    return _worker_model.embed_documents(texts)
+
+
+# ========================
+# 🧠 Parallel embedder
+# ========================
+class ParallelEmbeddings(Embeddings):
+    """
+    Splits document batches into shards and embeds them on a pool of worker
+    processes, each holding its own model copy with a few intra-op threads.
+    Output order always matches input order.
+    """
+
+    def __init__(self, model_name: str, backend: str = EMBED_BACKEND, workers: int = EMBED_WORKERS,
+                 threads_per_worker: int = THREADS_PER_WORKER, local_embedder: Optional[Embeddings] = None):
+        self.model_name = model_name
+        self.backend = backend
+        self.resolved_backend = None  # backend actually loaded, known once the parent's model is up
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self._local = local_embedder
+        self._pool = None
+        self._lock = threading.Lock()
+        self.total_texts = 0
+        self.total_seconds = 0.0
+
+    def _local_embedder(self) -> Embeddings:
+        if self._local is None:
+            self._local = get_embedder(self.model_name, self.backend)
+        if self.resolved_backend is None:
+            self.resolved_backend = backend_of(self._local) or self.backend
+        return self._local
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Load (and verify) the backend in the parent first; workers load whatever it settled on
+        self._local_embedder()
+        with self._lock:
+            if self._pool is None:
+                logger.info(f"👷 Starting {self.workers} embedding workers x {self.threads_per_worker} threads")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.resolved_backend, self.threads_per_worker),
+                )
+            return self._pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        start = time.perf_counter()
+        parallel = self.workers > 1 and len(texts) >= PARALLEL_MIN_BATCH
+        if not parallel:
+            vectors = self._local_embedder().embed_documents(texts)
+        else:
+            # Cache misses of one ingest batch are often fewer than workers x SHARD_SIZE:
+            # shrink the shards so every worker still gets one
+            size = min(SHARD_SIZE, math.ceil(len(texts) / self.workers))
+            shards = [texts[i:i + size] for i in range(0, len(texts), size)]
+            vectors = [vec for shard in self._get_pool().map(_embed_shard, shards) for vec in shard]
+        elapsed = time.perf_counter() - start
+        self.total_texts += len(texts)
+        self.total_seconds += elapsed
+        mode = f"{self.workers} workers" if parallel else "in-process"
+        logger.info(f"⚡ Embedded {len(texts)} chunks on {mode} in {elapsed:.2f}s "
+                    f"({len(texts) / max(elapsed, 1e-9):.1f} chunks/sec, run avg {self.throughput():.1f})")
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._local_embedder().embed_query(text)
+
+    def throughput(self) -> float:
+        return self.total_texts / self.total_seconds if self.total_seconds else 0.0
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_ingest_embedder(model_name: str = DEFAULT_MODEL, backend: str = EMBED_BACKEND,
+                        local_embedder: Optional[Embeddings] = None) -> CachedEmbeddings:
+    """
+    Embedder for every ingestion entry point: cache lookups first, then the
+    multi-process pool for whatever is left. One pool per model/backend per
+    process. Cached vectors are keyed by the backend actually loaded, so a
+    fast backend that fell back to torch shares torch's entries.
+    """
+    with _shared_lock:
+        parallel = _shared.get((model_name, backend))
+        if parallel is None:
+            parallel = _shared[(model_name, backend)] = ParallelEmbeddings(model_name, backend, local_embedder=local_embedder)
+    parallel._local_embedder()
+    return CachedEmbeddings(parallel, model_name=embedder_id(model_name, parallel.resolved_backend))
@@ -1,4 +1,177 @@
-from langchain.embeddings import HuggingFaceEmbeddings
+import os
+import json
+import math
+import logging
+from pathlib import Path
 
-def get_embedder(model_name="BAAI/bge-small-en"):
-    return HuggingFaceEmbeddings(model_name=model_name)
+from langchain_huggingface import HuggingFaceEmbeddings
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# 🔧 Embedder settings (override per deployment)
+# ========================
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+DEFAULT_MODEL = os.getenv("PHIRAG_EMBED_MODEL", "BAAI/bge-small-en")
+EMBED_BACKEND = os.getenv("PHIRAG_EMBED_BACKEND", "torch")      # torch | onnx | int8
+MODEL_DIR = Path(os.getenv("PHIRAG_MODEL_DIR", str(PROJECT_ROOT / "models")))
+QUANT_CONFIG = os.getenv("PHIRAG_QUANT_CONFIG", "avx2")         # avx2 | avx512 | avx512_vnni | arm64
+MIN_AGREEMENT = 0.99  # min cosine vs the fp32 baseline before a fast backend is trusted
+
+BACKENDS = ("torch", "onnx", "int8")
+# Indexes saved before the model was recorded in index_params.json: the
+# Streamlit frontend embedded with MiniLM, backend ingestion with bge-small-en
+LEGACY_FRONTEND_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+LEGACY_BACKEND_MODEL = "BAAI/bge-small-en"
+PROBE_TEXTS = [
+    "What is retrieval-augmented generation?",
+    "Error code E1042: pump pressure sensor out of range on line 3.",
+    "The quarterly report shows revenue growth of 12 percent in the APAC region.",
+    "Install the driver, reboot the machine and run the calibration wizard again.",
+]
+
+
+class EmbedderMismatch(ValueError):
+    """An index is being opened with a different embedding model than it was built with."""
+
+
+_built = {}  # id(embedder) -> (embedder, model name, backend actually loaded)
+
+
+def local_model_dir(model_name: str) -> Path:
+    return MODEL_DIR / model_name.replace("/", "__")
+
+
+def _has_local_copy(model_name: str) -> bool:
+    return (local_model_dir(model_name) / "config.json").exists()
+
+
+def _model_path(model_name: str) -> str:
+    """Prefer a local copy under MODEL_DIR so offline machines never hit the hub."""
+    return str(local_model_dir(model_name)) if _has_local_copy(model_name) else model_name
+
+
+def _ensure_quantized(model_name: str, device: str) -> str:
+    """Export a dynamically quantized int8 ONNX model once and return its file name."""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    file_name = f"onnx/model_qint8_{QUANT_CONFIG}.onnx"
+    target = local_model_dir(model_name)
+    if not (target / file_name).exists():
+        logger.info(f"🧮 Exporting int8 ONNX model for {model_name} ({QUANT_CONFIG})")
+        model = SentenceTransformer(_model_path(model_name), device=device, backend="onnx")
+        if not _has_local_copy(model_name):
+            model.save(str(target))
+        export_dynamic_quantized_onnx_model(model, QUANT_CONFIG, str(target))
+    return file_name
+
+
+def _build(model_name: str, backend: str, device: str) -> HuggingFaceEmbeddings:
+    model_kwargs = {"device": device}
+    if backend == "onnx":
+        model_kwargs["backend"] = "onnx"
+    elif backend == "int8":
+        file_name = _ensure_quantized(model_name, device)
+        model_kwargs["backend"] = "onnx"
+        model_kwargs["model_kwargs"] = {"file_name": file_name}
+    path = str(local_model_dir(model_name)) if backend == "int8" else _model_path(model_name)
+    return HuggingFaceEmbeddings(model_name=path, model_kwargs=model_kwargs)
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _agrees_with_baseline(model_name: str, backend: str, candidate, device: str) -> bool:
+    """Compare probe embeddings with fp32 torch; the verdict is remembered on disk."""
+    marker = local_model_dir(model_name) / f"verified_{backend}_{QUANT_CONFIG}.json"
+    if marker.exists():
+        with open(marker, "r", encoding="utf-8") as f:
+            return json.load(f).get("ok", False)
+
+    baseline = _build(model_name, "torch", device).embed_documents(PROBE_TEXTS)
+    vectors = candidate.embed_documents(PROBE_TEXTS)
+    agreement = min(_cosine(a, b) for a, b in zip(baseline, vectors))
+    ok = agreement >= MIN_AGREEMENT
+    logger.info(f"🔎 {backend} vs fp32 agreement for {model_name}: min cosine {agreement:.4f}")
+
+    marker.parent.mkdir(parents=True, exist_ok=True)
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"ok": ok, "min_cosine": agreement}, f)
+    return ok
+
+
+def get_embedder(model_name: str = DEFAULT_MODEL, backend: str = EMBED_BACKEND,
+                 device: str = None, verify: bool = True) -> HuggingFaceEmbeddings:
+    """
+    The one embedder factory for ingestion, querying and tooling.
+
+    backend="torch" is plain fp32 PyTorch; "onnx" runs the same weights on
+    ONNX Runtime; "int8" runs a dynamically quantized ONNX export. Fast
+    backends are checked against fp32 once and fall back to torch if their
+    vectors drift.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+    if device is None:
+        import torch
+        device = "cuda" if torch.cuda.is_available() and backend == "torch" else "cpu"
+
+    if backend == "torch":
+        return _remember(_build(model_name, backend, device), model_name, backend)
+
+    try:
+        embedder = _build(model_name, backend, device)
+        if not verify or _agrees_with_baseline(model_name, backend, embedder, device):
+            return _remember(embedder, model_name, backend)
+        logger.warning(f"⚠️ {backend} embeddings drift from fp32 for {model_name}; using torch")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load {backend} backend for {model_name} ({e}); using torch")
+    return _remember(_build(model_name, "torch", device), model_name, "torch")
+
+
+def _remember(embedder, model_name: str, backend: str):
+    _built[id(embedder)] = (embedder, model_name, backend)
+    return embedder
+
+
+def backend_of(embedder) -> str:
+    """The backend an embedder from get_embedder actually runs (after any fallback to torch)."""
+    inner = getattr(embedder, "embedder", None)  # CachedEmbeddings
+    if inner is not None:
+        return backend_of(inner)
+    if hasattr(embedder, "resolved_backend"):      # ParallelEmbeddings
+        return embedder.resolved_backend
+    built = _built.get(id(embedder))
+    return built[2] if built is not None else None
+
+
+def model_of(embedder) -> str:
+    """Model name behind an embedder (or wrapper), or None if it can't be told."""
+    if embedder is None:
+        return None
+    inner = getattr(embedder, "embedder", None)
+    if inner is not None:
+        return model_of(inner)
+    built = _built.get(id(embedder))
+    if built is not None:
+        return built[1]
+    return getattr(embedder, "model_name", None)
+
+
+def check_model(stored: str, embedder, where: str = "index"):
+    """Raise EmbedderMismatch if `embedder` isn't the model `stored` vectors were made with."""
+    current = model_of(embedder)
+    if stored and current and stored != current:
+        raise EmbedderMismatch(
+            f"{where} was embedded with '{stored}' but the current embedder is '{current}'. "
+            f"Set PHIRAG_EMBED_MODEL={stored} or re-embed it with "
+            f"`backend_ingestion.py --reembed --index <path>`."
+        )
+
+
+def embedder_id(model_name: str = DEFAULT_MODEL, backend: str = EMBED_BACKEND) -> str:
+    """Cache key for vectors produced by a model/backend pair."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
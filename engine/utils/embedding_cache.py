@@ -0,0 +1,222 @@
+import os
+import time
+import pickle
+import threading
+import logging
+from contextlib import contextmanager
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from utils.hashing import hash_content
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# 🔧 Paths & limits
+# ========================
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+CACHE_PATH = PROJECT_ROOT / "data" / "embeddings.pkl"
+MAX_ENTRIES = int(os.getenv("PHIRAG_EMBED_CACHE_SIZE", "100000"))
+SAVE_EVERY = int(os.getenv("PHIRAG_EMBED_CACHE_SAVE_EVERY", "2048"))  # new vectors between saves during long runs
+LOCK_TIMEOUT = 60.0   # seconds to wait for another process's save
+LOCK_STALE = 300.0    # a lock file this old was left by a crashed process
+
+
+@contextmanager
+def _file_lock(path: Path, timeout=LOCK_TIMEOUT):
+    """Cross-process lock via an O_EXCL lock file (works the same on Windows and POSIX)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(str(path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - path.stat().st_mtime > LOCK_STALE:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue  # released (or removed) meanwhile
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for {path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ========================
+# 💾 On-disk LRU cache
+# ========================
+class EmbeddingCache:
+    """
+    Content-addressed store of embeddings keyed by (model name, text hash).
+
+    Vectors are kept as packed float32 so 100k MiniLM/bge-small entries stay
+    around 150 MB. Entries are evicted least-recently-used first.
+
+    Several processes (the UI, background ingestion, sync jobs) share one
+    file: a save takes a lock, merges in whatever the others saved since
+    this process last read it, and writes through its own temp file.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, save_every=SAVE_EVERY):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._unsaved = 0
+        self._disk_stamp = None  # (mtime, size) of the file as this process last read or wrote it
+        self.hits = 0
+        self.misses = 0
+        self._entries = self._read() or OrderedDict()
+        if self._entries:
+            logger.info(f"💾 Loaded {len(self._entries)} cached embeddings from {self.path}")
+
+    def _stamp(self):
+        try:
+            stat = self.path.stat()
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _read(self):
+        stamp = self._stamp()
+        if stamp is None or stamp[1] == 0:
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            self._disk_stamp = stamp
+            return OrderedDict(data.get("entries", {}))
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable embedding cache {self.path}: {e}")
+            return None
+
+    def get(self, model: str, text_hash: str):
+        key = (model, text_hash)
+        with self._lock:
+            packed = self._entries.get(key)
+            if packed is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return array("f", packed).tolist()
+
+    def put(self, model: str, text_hash: str, vector: List[float]):
+        key = (model, text_hash)
+        with self._lock:
+            self._entries[key] = array("f", vector).tobytes()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+            self._unsaved += 1
+
+    def maybe_save(self):
+        """Save once `save_every` new vectors have piled up, so a crash mid-run loses at most that many."""
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty, self._unsaved = False, 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with _file_lock(self.path.with_name(self.path.name + ".lock")):
+                # Another process saved since we last looked: keep its entries too (ours are newer)
+                theirs = self._read() if self._stamp() != self._disk_stamp else None
+                with self._lock:
+                    if theirs:
+                        for key in self._entries:
+                            theirs.pop(key, None)
+                        theirs.update(self._entries)
+                        while len(theirs) > self.max_entries:
+                            theirs.popitem(last=False)
+                        self._entries = theirs
+                    entries = OrderedDict(self._entries)
+                tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp_path, "wb") as f:
+                    pickle.dump({"version": 1, "entries": entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+                self._disk_stamp = self._stamp()
+        except TimeoutError as e:
+            # Keep going; the entries stay dirty and go out with the next save
+            with self._lock:
+                self._dirty = True
+            logger.warning(f"⚠️ Embedding cache not saved: {e}")
+            return
+        except BaseException:
+            with self._lock:
+                self._dirty = True
+            raise
+        logger.info(f"💾 Saved {len(entries)} cached embeddings (hits={self.hits}, misses={self.misses})")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """One cache per process, shared by every ingestion entry point."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
+
+
+# ========================
+# 🧠 Embeddings wrapper
+# ========================
+class CachedEmbeddings(Embeddings):
+    """Wraps any LangChain embedder so documents already seen are never re-embedded."""
+
+    def __init__(self, embedder: Embeddings, cache: EmbeddingCache = None, model_name: str = None):
+        self.embedder = embedder
+        self.cache = cache if cache is not None else get_embedding_cache()
+        self.model_name = model_name or getattr(embedder, "model_name", type(embedder).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [hash_content(t) for t in texts]
+        vectors = [self.cache.get(self.model_name, h) for h in hashes]
+
+        # Embed each distinct missing text once
+        missing = {}
+        for text, h, vec in zip(texts, hashes, vectors):
+            if vec is None and h not in missing:
+                missing[h] = text
+
+        if missing:
+            new_vectors = self.embedder.embed_documents(list(missing.values()))
+            fresh = {}
+            for h, vec in zip(missing.keys(), new_vectors):
+                vec = array("f", vec).tolist()  # same precision as cache hits
+                self.cache.put(self.model_name, h, vec)
+                fresh[h] = vec
+            vectors = [vec if vec is not None else fresh[h] for vec, h in zip(vectors, hashes)]
+
+        logger.info(f"🧠 Embedded {len(missing)} new / {len(texts)} chunks ({len(texts) - len(missing)} from cache)")
+        self.cache.maybe_save()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedder.embed_query(text)
@@ -0,0 +1,83 @@
+import os
+import logging
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXACT_VECTORS_FILE = "vectors.f32"
+
+
+class ExactVectors:
+    """
+    Full-precision copy of the vectors behind a compressed (SQ/PQ) index,
+    row-aligned with the FAISS positions. On disk it is a raw float32 matrix
+    that query nodes memory-map, so only the rows being re-ranked are read.
+    """
+
+    def __init__(self, dim: int, base=None):
+        self.dim = dim
+        self.base = base if base is not None else np.zeros((0, dim), dtype="float32")
+        self.tail: List[np.ndarray] = []   # rows added since the last save
+        self._saved_rows = None            # rows already in the file, None = file must be rewritten
+
+    @classmethod
+    def open(cls, index_path, dim: int, rows: int) -> "ExactVectors":
+        path = Path(index_path) / EXACT_VECTORS_FILE
+        stored = path.stat().st_size // (4 * dim)
+        if stored < rows:
+            raise ValueError(f"{path} holds {stored} vectors but the index has {rows}")
+        # Extra rows are leftovers from a save that crashed before the index was written
+        base = np.memmap(path, dtype="float32", mode="r", shape=(rows, dim)) if rows else None
+        vectors = cls(dim, base)
+        vectors._saved_rows = rows if stored == rows else None
+        return vectors
+
+    def __len__(self):
+        return len(self.base) + sum(len(rows) for rows in self.tail)
+
+    def append(self, rows: np.ndarray):
+        self.tail.append(np.asarray(rows, dtype="float32").reshape(-1, self.dim))
+
+    def take(self, positions) -> np.ndarray:
+        positions = np.asarray(positions, dtype="int64")
+        if not self.tail:
+            return np.asarray(self.base[positions])
+        return self.all()[positions]
+
+    def all(self) -> np.ndarray:
+        if self.tail:
+            self.base = np.concatenate([np.asarray(self.base)] + self.tail)
+            self.tail = []
+        return np.asarray(self.base)
+
+    def compact(self, keep):
+        """Keep only the rows at `keep` (in that order); the file is rewritten on next save."""
+        self.base = np.ascontiguousarray(self.all()[np.asarray(keep, dtype="int64")])
+        self._saved_rows = None
+
+    def replace(self, rows: np.ndarray):
+        self.base = np.ascontiguousarray(rows, dtype="float32")
+        self.tail = []
+        self._saved_rows = None
+
+    def save(self, index_path):
+        path = Path(index_path) / EXACT_VECTORS_FILE
+        if self._saved_rows is not None and self._saved_rows == len(self.base) and path.exists():
+            # Append-only since the last save: extend the file in place
+            with open(path, "ab") as f:
+                for rows in self.tail:
+                    f.write(rows.tobytes())
+        else:
+            rows = np.array(self.all(), dtype="float32")
+            self.base = rows  # drop any map on the old file before replacing it
+            tmp_path = str(path) + ".tmp"
+            rows.tofile(tmp_path)
+            os.replace(tmp_path, path)
+        self._saved_rows = len(self)
+        self.tail = []
+        self.base = (np.memmap(path, dtype="float32", mode="r", shape=(self._saved_rows, self.dim))
+                     if self._saved_rows else np.zeros((0, self.dim), dtype="float32"))
+        logger.info(f"💾 Saved {self._saved_rows} full-precision vectors for re-ranking")
@@ -0,0 +1,13 @@
+import hashlib
+
+
+def hash_content(text: str) -> str:
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def hash_file(path) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,91 @@
+import os
+import threading
+import logging
+
+from utils.index_utils import load_index, index_signature
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# 🧠 Process-wide registry
+# ========================
+# Streamlit re-runs the page script on every interaction, but imported modules
+# stay resident, so these dicts are shared by every session in the process.
+_lock = threading.Lock()
+_embedders = {}
+_indexes = {}  # index_path -> (signature, vectorstore)
+
+
+def get_shared_embedder(factory, key="default"):
+    """Build the embedder once per process and reuse it afterwards."""
+    embedder = _embedders.get(key)
+    if embedder is not None:
+        return embedder
+    with _lock:
+        if key not in _embedders:
+            _embedders[key] = factory()
+            logger.info(f"🧠 Embedder '{key}' loaded")
+        return _embedders[key]
+
+
+def get_shared_index(index_path, embedder_factory, embedder_key="default"):
+    """
+    Return the resident FAISS index for `index_path`.
+
+    The index is only deserialized again when its on-disk version or mtime
+    changes. If a reload fails (e.g. a writer is mid-save) the previous
+    copy keeps serving.
+    """
+    index_path = os.path.abspath(str(index_path))
+    signature = index_signature(index_path)
+
+    cached = _indexes.get(index_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with _lock:
+        cached = _indexes.get(index_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        embedder = _embedders.get(embedder_key)
+        if embedder is None:
+            embedder = _embedders[embedder_key] = embedder_factory()
+
+        try:
+            db = load_index(embedder, index_path)
+        except Exception as e:
+            if cached is not None:
+                logger.warning(f"⚠️ Reload of '{index_path}' failed, keeping previous copy: {e}")
+                return cached[1]
+            raise
+
+        _indexes[index_path] = (signature, db)
+        logger.info(f"📦 Loaded FAISS index from '{index_path}' (version {signature[0]})")
+        return db
+
+
+def invalidate(index_path=None):
+    """Drop one (or every) resident index so the next access reloads it."""
+    with _lock:
+        if index_path is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(os.path.abspath(str(index_path)), None)
+
+
+_coordinators = {}  # nodes -> ShardCoordinator
+
+
+def get_shard_coordinator(nodes, embedder_factory, embedder_key="default"):
+    """Return the resident coordinator for a comma-separated list of shard nodes."""
+    coordinator = _coordinators.get(nodes)
+    if coordinator is not None:
+        return coordinator
+    from utils.shard_coordinator import ShardCoordinator
+    embedder = get_shared_embedder(embedder_factory, embedder_key)
+    with _lock:
+        if nodes not in _coordinators:
+            _coordinators[nodes] = ShardCoordinator.from_env(embedder, nodes)
+            logger.info(f"🧩 Coordinating shard nodes: {nodes}")
+        return _coordinators[nodes]
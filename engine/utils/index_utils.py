@@ -1,14 +1,570 @@
-from langchain.vectorstores import FAISS
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
 import os
+import re
+import json
+import time
+import shutil
+import logging
+import numpy as np
 
-def build_and_save_index(chunks, embedder, index_path="combined_faiss_index"):
-    index = FAISS.from_documents(chunks, embedder)
-    index.save_local(index_path)
+from utils.exact_vectors import ExactVectors, EXACT_VECTORS_FILE
+from utils.embedder import LEGACY_BACKEND_MODEL, LEGACY_FRONTEND_MODEL, check_model, model_of
+from utils.disk_store import DOCSTORE_FILE, SQLiteDocstore, read_ids, write_ids
+from utils.metadata_filter import METADATA_INDEX_FILE, MetadataIndex
+from utils.query_cache import get_query_cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_FILE = "index_version.json"
+PARAMS_FILE = "index_params.json"
+SHARDS_FILE = "shards.json"
+SHARDS_DIR = "shards"
+
+# ========================
+# 🔧 Index type & search defaults (override per deployment)
+# ========================
+INDEX_FACTORY = os.getenv("PHIRAG_INDEX_FACTORY", "Flat")   # e.g. "IVF4096,Flat", "HNSW32"
+NPROBE = int(os.getenv("PHIRAG_NPROBE", "16"))               # IVF lists probed per query
+EF_SEARCH = int(os.getenv("PHIRAG_EF_SEARCH", "64"))         # HNSW candidate list per query
+TRAIN_SAMPLE = int(os.getenv("PHIRAG_TRAIN_SAMPLE", "100000"))
+MIN_POINTS_PER_CENTROID = 39                                 # below this FAISS k-means is unreliable
+RERANK_OVERSAMPLE = int(os.getenv("PHIRAG_RERANK_OVERSAMPLE", "4"))        # candidates per result on SQ indexes
+PQ_RERANK_OVERSAMPLE = int(os.getenv("PHIRAG_PQ_RERANK_OVERSAMPLE", "16"))  # PQ codes are coarser, so look wider
+EXACT_FILTER_LIMIT = int(os.getenv("PHIRAG_EXACT_FILTER_LIMIT", "4096"))     # filters this selective are scored exactly
+RRF_K = int(os.getenv("PHIRAG_RRF_K", "60"))                                  # reciprocal rank fusion damping
+HYBRID_DEPTH = int(os.getenv("PHIRAG_HYBRID_DEPTH", "4"))                     # candidates per result from each side
+
+
+# ========================
+# 🏗️ Index construction
+# ========================
+def _faiss():
+    import faiss
+    return faiss
+
+def _min_train_points(factory: str) -> int:
+    needed = 0
+    ivf = re.search(r"IVF(\d+)", factory)
+    if ivf:
+        needed = int(ivf.group(1)) * MIN_POINTS_PER_CENTROID
+    if re.search(r"PQ\d+", factory):
+        needed = max(needed, 256 * MIN_POINTS_PER_CENTROID)  # 2^8 codes per sub-quantizer
+    return needed
+
+def is_compressed(factory: str) -> bool:
+    """SQ/PQ codes are lossy, so these indexes keep exact vectors on disk for re-ranking."""
+    return bool(re.search(r"(^|,)SQ|PQ\d", factory))
+
+def _effective_factory(factory: str, count: int) -> str:
+    """Untrainable-so-far factories fall back to Flat until the corpus is big enough."""
+    if count < _min_train_points(factory):
+        logger.info(f"⏳ {count} vectors is too few to train '{factory}'; using Flat for now")
+        return "Flat"
+    return factory
+
+def _new_faiss_index(vectors: np.ndarray, factory: str):
+    faiss = _faiss()
+    index = faiss.index_factory(vectors.shape[1], factory)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > TRAIN_SAMPLE:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), TRAIN_SAMPLE, replace=False)]
+        start = time.time()
+        index.train(sample)
+        logger.info(f"🎓 Trained '{factory}' on {len(sample)} vectors in {round(time.time() - start, 2)}s")
     return index
 
-def load_index(embedder, index_path="combined_faiss_index"):
-    return FAISS.load_local(
-        folder_path=index_path,
-        embeddings=embedder,
-        allow_dangerous_deserialization=True
+def _reconstruct_all(index) -> np.ndarray:
+    """Pull stored vectors back out in position order (IVF needs a direct map for this)."""
+    faiss = _faiss()
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except (RuntimeError, TypeError):
+        pass  # not an IVF index
+    return index.reconstruct_n(0, index.ntotal)
+
+def _default_params(factory: str, requested: str, trained_on: int) -> dict:
+    return {"factory": factory, "requested": requested, "trained_on": trained_on,
+            "nprobe": NPROBE, "ef_search": EF_SEARCH}
+
+def build_index(text_embeddings, embedder, metadatas=None, ids=None, factory=None) -> FAISS:
+    """
+    FAISS.from_embeddings, but on an index built from a FAISS factory string
+    and trained on (a sample of) the vectors being added.
+    """
+    text_embeddings = list(text_embeddings)
+    requested = factory or INDEX_FACTORY
+    vectors = np.asarray([v for _, v in text_embeddings], dtype="float32")
+    effective = _effective_factory(requested, len(vectors))
+    store = FAISS(
+        embedding_function=embedder,
+        index=_new_faiss_index(vectors, effective),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
     )
+    store.index_params = _default_params(effective, requested, len(vectors))
+    store.exact_vectors = ExactVectors(vectors.shape[1]) if is_compressed(requested) else None
+    set_search_params(store)
+    add_vectors(store, text_embeddings, metadatas=metadatas, ids=ids)
+    return store
+
+def add_vectors(store: FAISS, text_embeddings, metadatas=None, ids=None):
+    """store.add_embeddings that also appends to the full-precision copy, if the index keeps one."""
+    text_embeddings = list(text_embeddings)
+    exact = getattr(store, "exact_vectors", None)
+    if exact is not None and text_embeddings:
+        exact.append(np.asarray([v for _, v in text_embeddings], dtype="float32"))
+    store.metadata_index = store.index_version = None  # unsaved changes: no cached results until the next save
+    return store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+def update_metadata(store: FAISS, doc_id: str, metadata: dict) -> bool:
+    """Replace a stored chunk's metadata (e.g. its page after an edit); False if the id isn't in the docstore."""
+    doc = store.docstore._dict.get(doc_id)
+    if doc is None:
+        return False
+    doc.metadata = metadata
+    store.docstore._dict[doc_id] = doc  # write back; the SQLite docstore hands out copies
+    store.metadata_index = store.index_version = None  # filters would still see the old values
+    return True
+
+def _stored_vectors(store: FAISS) -> np.ndarray:
+    exact = getattr(store, "exact_vectors", None)
+    return exact.all() if exact is not None else _reconstruct_all(store.index)
+
+def rebuild_index(store: FAISS, factory: str) -> FAISS:
+    """Re-create the vectors of `store` under a new factory string, keeping docstore positions."""
+    vectors = _stored_vectors(store)
+    effective = _effective_factory(factory, len(vectors))
+    index = _new_faiss_index(vectors, effective)
+    if len(vectors):
+        index.add(vectors)
+    store.index = index
+    if is_compressed(factory) and getattr(store, "exact_vectors", None) is None:
+        store.exact_vectors = ExactVectors(vectors.shape[1])
+        store.exact_vectors.replace(vectors)
+    elif not is_compressed(factory):
+        store.exact_vectors = None
+    store.index_params = {**index_params_of(store), "factory": effective,
+                          "requested": factory, "trained_on": len(vectors)}
+    set_search_params(store)
+    logger.info(f"🔁 Rebuilt index as '{effective}' with {len(vectors)} vectors")
+    return store
+
+def delete_vectors(store: FAISS, ids) -> int:
+    """
+    Remove docstore ids and their vectors. Flat indexes delete in place; IVF
+    keeps stale labels after remove_ids and HNSW can't remove at all, so
+    those are compacted by re-adding the surviving vectors (taken from the
+    full-precision copy when there is one).
+    """
+    ids = set(ids)
+    if not ids:
+        return 0
+    store.metadata_index = store.index_version = None
+    keep = [pos for pos, doc_id in sorted(store.index_to_docstore_id.items()) if doc_id not in ids]
+    exact = getattr(store, "exact_vectors", None)
+    if isinstance(_faiss().downcast_index(store.index), _faiss().IndexFlat):
+        store.delete(list(ids))
+        if exact is not None:
+            exact.compact(keep)
+        return len(ids)
+
+    vectors = _stored_vectors(store)[keep]
+    if exact is not None:
+        exact.replace(vectors)
+    index = _faiss().clone_index(store.index)
+    index.reset()
+    if len(vectors):
+        index.add(vectors)
+    store.index = index
+    store.docstore.delete([doc_id for doc_id in ids if doc_id in store.docstore._dict])
+    store.index_to_docstore_id = {i: store.index_to_docstore_id[pos] for i, pos in enumerate(keep)}
+    set_search_params(store)
+    return len(ids)
+
+def build_and_save_index(chunks, embedder, index_path="combined_faiss_index", factory=None):
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = embedder.embed_documents(texts)
+    index = build_index(zip(texts, vectors), embedder, metadatas=[c.metadata for c in chunks], factory=factory)
+    save_index(index, index_path)
+    return index
+
+
+# ========================
+# 🎚️ Search parameters
+# ========================
+def index_params_of(store: FAISS) -> dict:
+    params = getattr(store, "index_params", None)
+    return params if params else _default_params("Flat", "Flat", 0)
+
+def set_search_params(store: FAISS, nprobe=None, ef_search=None):
+    """Set the default recall/latency trade-off used by every search on `store`."""
+    params = index_params_of(store)
+    if nprobe is not None:
+        params["nprobe"] = nprobe
+    if ef_search is not None:
+        params["ef_search"] = ef_search
+    store.index_params = params
+    space = _faiss().ParameterSpace()
+    for name, value in (("nprobe", params["nprobe"]), ("efSearch", params["ef_search"])):
+        try:
+            space.set_index_parameter(store.index, name, value)
+        except RuntimeError:
+            pass  # parameter doesn't apply to this index type
+
+def _search_parameters(index, nprobe, ef_search, selector=None):
+    faiss = _faiss()
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        inner = _search_parameters(index.index, nprobe, ef_search, selector)
+        return faiss.SearchParametersPreTransform(index_params=inner) if inner else None
+    if isinstance(index, faiss.IndexIVF) and (nprobe or selector):
+        params = faiss.SearchParametersIVF(nprobe=nprobe or index.nprobe)
+    elif isinstance(index, faiss.IndexHNSW) and (ef_search or selector):
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or index.hnsw.efSearch)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+def metadata_index_of(store: FAISS) -> MetadataIndex:
+    """The store's metadata → position index, rebuilt from the docstore if stale or missing."""
+    metadata_index = getattr(store, "metadata_index", None)
+    if metadata_index is None or metadata_index.ntotal != store.index.ntotal:
+        docstore = store.docstore
+        if isinstance(docstore, SQLiteDocstore):
+            metadata = docstore.metadata_by_id()
+        else:
+            metadata = {doc_id: doc.metadata for doc_id, doc in docstore._dict.items()}
+        rows = ((pos, metadata.get(doc_id, {})) for pos, doc_id in store.index_to_docstore_id.items())
+        metadata_index = store.metadata_index = MetadataIndex.build(rows, store.index.ntotal)
+    return metadata_index
+
+def search_index(store, query: str, k=5, nprobe=None, ef_search=None, where: dict = None, vectors: dict = None):
+    """
+    Similarity search returning (Document, distance) pairs. `nprobe` /
+    `ef_search` override the index defaults for this query only. On SQ/PQ
+    indexes an oversampled shortlist is re-ranked exactly. `where` restricts
+    the search to chunks with those metadata values, e.g.
+    {"source": "report.pdf"} or {"source_type": "web"}. `store` may also
+    be a sharded index (anything with its own `search_by_vector`). Pass a
+    dict as `vectors` to get the stored vector of each hit by docstore id.
+    """
+    vector = get_query_cache().embed(store.embedding_function, query)
+    if not isinstance(store, FAISS):
+        return store.search_by_vector(vector, k, nprobe=nprobe, ef_search=ef_search, where=where, vectors=vectors)
+    return search_by_vector(store, vector, k, nprobe=nprobe, ef_search=ef_search, where=where, vectors=vectors)
+
+def _exact_vectors_at(store: FAISS, positions: np.ndarray):
+    """Full vectors for `positions`, or None if the index can't hand them out."""
+    exact = getattr(store, "exact_vectors", None)
+    if exact is not None:
+        return exact.take(positions)
+    try:
+        return store.index.reconstruct_batch(positions)
+    except RuntimeError:
+        pass
+    try:
+        # IVF needs a position → list map to reconstruct; 8 bytes per vector, built once
+        _faiss().extract_index_ivf(store.index).make_direct_map()
+        return store.index.reconstruct_batch(positions)
+    except RuntimeError:
+        return None
+
+def search_by_vector(store: FAISS, vector, k=5, nprobe=None, ef_search=None, where: dict = None, vectors: dict = None):
+    """search_index for an already-embedded query."""
+    vector = np.asarray(vector, dtype="float32").reshape(1, -1)
+    exact = getattr(store, "exact_vectors", None)
+    factory = index_params_of(store)["factory"]
+    rerank = exact is not None and is_compressed(factory)
+    fetch = k
+    if rerank:
+        fetch = k * (PQ_RERANK_OVERSAMPLE if re.search(r"PQ\d", factory) else RERANK_OVERSAMPLE)
+
+    selector, hits = None, None
+    if where:
+        allowed = metadata_index_of(store).positions(where)
+        if not len(allowed):
+            return []
+        candidates = _exact_vectors_at(store, allowed) if len(allowed) <= EXACT_FILTER_LIMIT else None
+        if candidates is not None:
+            # Few enough matches to score them all: exact, and no recall loss from probing
+            distances = ((candidates - vector) ** 2).sum(axis=1)
+            top = np.argsort(distances)[:k]
+            hits = [(float(distances[i]), int(allowed[i])) for i in top]
+            rerank = False
+        else:
+            selector = _faiss().IDSelectorBatch(allowed)
+    if hits is None:
+        params = _search_parameters(store.index, nprobe, ef_search, selector)
+        if params is None:
+            scores, positions = store.index.search(vector, fetch)
+        else:
+            scores, positions = store.index.search(vector, fetch, params=params)
+        hits = [(float(score), int(pos)) for score, pos in zip(scores[0], positions[0]) if pos != -1]
+
+    if rerank and hits:
+        # Re-score the shortlist against full-precision vectors (only these rows are read from disk)
+        candidates = [pos for _, pos in hits]
+        distances = ((exact.take(candidates) - vector) ** 2).sum(axis=1)
+        hits = sorted(zip(distances.tolist(), candidates))[:k]
+
+    doc_ids = [store.index_to_docstore_id[pos] for _, pos in hits]
+    if vectors is not None and hits:
+        stored = _exact_vectors_at(store, np.array([pos for _, pos in hits], dtype="int64"))
+        if stored is not None:
+            vectors.update(zip(doc_ids, stored))
+    found = _documents_by_id(store, doc_ids)
+    # A reader still on the previous index version may hit ids deleted since
+    return [(found[doc_id], score) for doc_id, (score, _) in zip(doc_ids, hits) if isinstance(found.get(doc_id), Document)]
+
+def _documents_by_id(store, doc_ids) -> dict:
+    if isinstance(store.docstore, SQLiteDocstore):
+        return store.docstore.get_many(doc_ids)
+    return {doc_id: store.docstore.search(doc_id) for doc_id in doc_ids}
+
+def lexical_search(store, query: str, k=5, where: dict = None):
+    """BM25 top-k as (Document, score) pairs, higher is better. Empty for docstores without a lexical index."""
+    if not isinstance(store, FAISS):
+        return store.lexical_search(query, k, where=where)
+    if isinstance(store.docstore, SQLiteDocstore):
+        return store.docstore.lexical_search(query, k, where=where)
+    return []
+
+def hybrid_search(store, query: str, k=5, nprobe=None, ef_search=None, where: dict = None, signals: dict = None):
+    """
+    Dense + BM25 retrieval fused by reciprocal rank: each list contributes
+    1 / (RRF_K + rank) per document. Returns (Document, fused score) pairs,
+    higher is better. Exact identifiers that embeddings blur still surface
+    through the lexical side. Repeats of a query against the same index
+    version are answered from the query cache without embedding or searching.
+
+    Pass a dict as `signals` to get, per returned document (by id), the
+    evidence behind its rank: {"dense": L2 distance, "bm25": score,
+    "vector": stored embedding}, each None where that side didn't find it.
+    """
+    cache = get_query_cache()
+    cache_key = cache.result_key(store, query, k, where, mode="hybrid", nprobe=nprobe, ef_search=ef_search)
+    ranked = cache.results(cache_key)
+    if ranked is not None:
+        found = _documents_by_id(store, [doc_id for doc_id, _, _ in ranked])
+        if all(isinstance(found.get(doc_id), Document) for doc_id, _, _ in ranked):
+            if signals is not None:
+                signals.update((doc_id, evidence) for doc_id, _, evidence in ranked)
+            return [(found[doc_id], score) for doc_id, score, _ in ranked]
+
+    fetch = k * HYBRID_DEPTH
+    vectors = {}
+    dense = search_index(store, query, k=fetch, nprobe=nprobe, ef_search=ef_search, where=where, vectors=vectors)
+    lexical = lexical_search(store, query, k=fetch, where=where)
+    fused, docs, evidence = {}, {}, {}
+    for side, hits in (("dense", dense), ("bm25", lexical)):
+        for rank, (doc, score) in enumerate(hits):
+            key = doc.id or doc.page_content  # documents from old pickled indexes may lack ids
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            docs.setdefault(key, doc)
+            evidence.setdefault(key, {"dense": None, "bm25": None, "vector": vectors.get(doc.id)})[side] = score
+    ranked = [(doc_id, score, evidence[doc_id])
+              for doc_id, score in sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]]
+    if all(docs[doc_id].id for doc_id, _, _ in ranked):
+        cache.put_results(cache_key, ranked)
+    if signals is not None:
+        signals.update((doc_id, signal) for doc_id, _, signal in ranked)
+    return [(docs[doc_id], score) for doc_id, score, _ in ranked]
+
+
+# ========================
+# 💾 Persistence
+# ========================
+def index_params(index_path="combined_faiss_index") -> dict:
+    path = os.path.join(index_path, PARAMS_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _read_faiss(path: str, mmap: bool):
+    faiss = _faiss()
+    if not mmap:
+        return faiss.read_index(path)
+    # Zero-copy mapping where this FAISS build has it; IVF lists reject it combined with IO_FLAG_MMAP
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    if ifc:
+        try:
+            return faiss.read_index(path, ifc | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+def _write_faiss(index, path: str):
+    tmp_path = path + ".tmp"
+    _faiss().write_index(index, tmp_path)
+    os.replace(tmp_path, path)  # readers keep their mapping of the old file
+
+def load_index(embedder, index_path="combined_faiss_index", mmap=True):
+    """
+    Open an index saved by save_index: the FAISS index and the position → id
+    table are memory-mapped and documents are read from SQLite on demand, so
+    load time doesn't grow with the corpus and processes share page cache.
+    Pass mmap=False to get a writable copy (ingestion). Indexes in the old
+    pickled layout still load and are converted on their next save.
+    """
+    if os.path.exists(os.path.join(index_path, SHARDS_FILE)):
+        from utils.sharding import load_sharded_index
+        return load_sharded_index(embedder, index_path, mmap=mmap)
+    version = index_version(index_path)  # read first: files newer than their version only cost cache misses
+    saved = index_params(index_path)
+    docstore_path = os.path.join(index_path, DOCSTORE_FILE)
+    if saved.get("id_width") and os.path.exists(docstore_path):
+        index = _read_faiss(os.path.join(index_path, "index.faiss"), mmap)
+        store = FAISS(
+            embedding_function=embedder,
+            index=index,
+            docstore=SQLiteDocstore(docstore_path),
+            index_to_docstore_id=read_ids(index_path, saved["id_width"], index.ntotal, mmap=mmap),
+        )
+    else:
+        store = FAISS.load_local(
+            folder_path=index_path,
+            embeddings=embedder,
+            allow_dangerous_deserialization=True
+        )
+    check_model(saved.get("embed_model") or _legacy_model(store, saved), embedder, where=f"Index '{index_path}'")
+    if saved:
+        store.index_params = {**index_params_of(store), **saved}
+    store.metadata_index = None
+    if os.path.exists(os.path.join(index_path, METADATA_INDEX_FILE)):
+        try:
+            store.metadata_index = MetadataIndex.open(index_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Unusable {METADATA_INDEX_FILE} in {index_path} ({e}); rebuilding it on first filter")
+    store.exact_vectors = None
+    if saved.get("exact_vectors"):
+        try:
+            store.exact_vectors = ExactVectors.open(index_path, store.index.d, store.index.ntotal)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ No usable {EXACT_VECTORS_FILE} in {index_path} ({e}); searching without re-ranking")
+    set_search_params(store)
+    store.index_path, store.index_version = os.path.abspath(index_path), version
+    return store
+
+def _legacy_model(store: FAISS, saved: dict):
+    """Model of a pickled index from before the model was recorded: backend ingestion used bge, the frontend MiniLM."""
+    if saved.get("id_width"):
+        return None
+    doc = next(iter(store.docstore._dict.values()), None)
+    if doc is None:
+        return None
+    return LEGACY_BACKEND_MODEL if doc.metadata.get("ingested_by") == "backend" else LEGACY_FRONTEND_MODEL
+
+def save_index(index, index_path="combined_faiss_index", factory=None):
+    """
+    Save the index and bump its version so resident readers hot-reload.
+    An index still on its Flat fallback is retrained once it has grown
+    enough for the requested factory.
+    """
+    params = index_params_of(index)
+    requested = factory or params.get("requested") or INDEX_FACTORY
+    if requested != params["factory"] and index.index.ntotal >= _min_train_points(requested):
+        rebuild_index(index, requested)
+        params = index.index_params
+    exact = getattr(index, "exact_vectors", None)
+    os.makedirs(index_path, exist_ok=True)
+    # Vectors, documents and ids go first so the index is never ahead of them
+    if exact is not None:
+        exact.save(index_path)
+    _save_docstore(index, index_path)
+    id_width = write_ids(index_path, index.index_to_docstore_id)
+    metadata_index_of(index).save(index_path)
+    _write_faiss(index.index, os.path.join(index_path, "index.faiss"))
+    tmp_path = os.path.join(index_path, PARAMS_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({**params, "requested": requested, "ntotal": index.index.ntotal,
+                   "embed_model": model_of(index.embedding_function) or params.get("embed_model"),
+                   "exact_vectors": exact is not None, "id_width": id_width}, f)
+    os.replace(tmp_path, os.path.join(index_path, PARAMS_FILE))
+    for stale in ("index.pkl", SHARDS_FILE):
+        if os.path.exists(os.path.join(index_path, stale)):
+            os.remove(os.path.join(index_path, stale))
+    shutil.rmtree(os.path.join(index_path, SHARDS_DIR), ignore_errors=True)
+    index.index_path, index.index_version = os.path.abspath(index_path), bump_index_version(index_path)
+
+def reembed_index(embedder, index_path="combined_faiss_index", batch_size=256):
+    """
+    Re-embed every stored chunk with `embedder` and save in place, e.g. after
+    changing PHIRAG_EMBED_MODEL. Documents, ids and the index type are kept.
+    """
+    if os.path.exists(os.path.join(index_path, SHARDS_FILE)):
+        from utils.sharding import shard_count, shard_path
+        for i in range(shard_count(index_path)):
+            if os.path.exists(os.path.join(shard_path(index_path, i), PARAMS_FILE)):
+                reembed_index(embedder, shard_path(index_path, i), batch_size)
+        return bump_index_version(index_path)
+    old = load_index(None, index_path, mmap=False)
+    items = list(old.docstore._dict.items())
+    texts = [doc.page_content for _, doc in items]
+    vectors = [v for i in range(0, len(texts), batch_size) for v in embedder.embed_documents(texts[i:i + batch_size])]
+    store = build_index(zip(texts, vectors), embedder, [doc.metadata for _, doc in items], [doc_id for doc_id, _ in items],
+                        factory=index_params_of(old).get("requested"))
+    if isinstance(old.docstore, SQLiteDocstore):
+        store.docstore = old.docstore  # same documents; keep the file and its shared source texts
+    save_index(store, index_path)
+    logger.info(f"🔁 Re-embedded {len(texts)} chunks in '{index_path}' with {model_of(embedder)}")
+    return store.index_version
+
+def add_source_texts(store: FAISS, texts: dict):
+    """Queue source texts (content hash -> text) that chunk spans point into; stored once on save."""
+    pending = getattr(store, "source_texts", None)
+    if pending is None:
+        pending = store.source_texts = {}
+    pending.update(texts)
+
+def _save_docstore(store: FAISS, index_path):
+    target = os.path.join(index_path, DOCSTORE_FILE)
+    docstore = store.docstore
+    source_texts = getattr(store, "source_texts", None) or {}
+    if isinstance(docstore, SQLiteDocstore) and os.path.abspath(docstore.path) == os.path.abspath(target):
+        docstore.add_source_texts(source_texts)
+        docstore.compact()
+        docstore.commit()
+    else:
+        # In-memory (fresh build or pickled layout) or another index's docstore: write a new file
+        store.docstore = SQLiteDocstore.create(target, dict(docstore._dict.items()), source_texts)
+        logger.info(f"🗄️ Wrote {len(store.docstore)} documents to {target}")
+    store.source_texts = {}
+
+def index_version(index_path="combined_faiss_index") -> int:
+    path = os.path.join(index_path, VERSION_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("version", 0))
+    except (OSError, ValueError):
+        return 0
+
+def bump_index_version(index_path="combined_faiss_index") -> int:
+    version = index_version(index_path) + 1
+    path = os.path.join(index_path, VERSION_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "updated": time.time()}, f)
+    os.replace(tmp_path, path)
+    return version
+
+def index_signature(index_path="combined_faiss_index"):
+    """Cheap fingerprint of the on-disk index: version plus file mtimes."""
+    mtimes = []
+    for name in ("index.faiss", "index.pkl"):
+        try:
+            mtimes.append(os.stat(os.path.join(index_path, name)).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return (index_version(index_path), *mtimes)
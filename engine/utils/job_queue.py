@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import uuid
+import threading
+import logging
+from pathlib import Path
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_FINISHED_JOBS = 200  # finished jobs kept around for status lookups
+
+
+class JobQueue:
+    """
+    Persistent FIFO of background jobs served by one worker thread.
+
+    Jobs are stored as JSON so pending work survives a restart; a job that was
+    running when the process died is retried. Submitting a job whose key
+    matches a job that is still pending merges the two via `merge` instead of
+    queueing the same work twice.
+    """
+
+    def __init__(self, store_path, handler: Callable[[dict], None],
+                 merge: Optional[Callable[[dict, dict], dict]] = None, name="jobs"):
+        self.store_path = Path(store_path)
+        self.handler = handler
+        self.merge = merge or (lambda old, new: new)
+        self.name = name
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._load()
+        self._worker = threading.Thread(target=self._run, name=f"{name}-worker", daemon=True)
+        self._worker.start()
+
+    # ---- persistence ----
+    def _load(self):
+        if not self.store_path.exists():
+            return
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                self._jobs = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Could not read job store {self.store_path}: {e}")
+            return
+        for job in self._jobs.values():
+            if job["status"] == "running":
+                job["status"] = "pending"
+        pending = sum(job["status"] == "pending" for job in self._jobs.values())
+        if pending:
+            logger.info(f"🔁 Resuming {pending} pending {self.name} job(s)")
+
+    def _save(self):
+        finished = sorted((j for j in self._jobs.values() if j["status"] in ("done", "failed")),
+                          key=lambda j: j["updated"])
+        for job in finished[:-MAX_FINISHED_JOBS]:
+            del self._jobs[job["id"]]
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.store_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._jobs, f, default=str)
+        os.replace(tmp_path, self.store_path)
+
+    # ---- public API ----
+    def submit(self, payload: dict, key: str = None) -> str:
+        with self._cond:
+            if key is not None:
+                for job in self._jobs.values():
+                    if job["key"] == key and job["status"] == "pending":
+                        job["payload"] = self.merge(job["payload"], payload)
+                        job["updated"] = time.time()
+                        job["coalesced"] = job.get("coalesced", 0) + 1
+                        self._save()
+                        return job["id"]
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._jobs[job_id] = {
+                "id": job_id, "key": key, "status": "pending", "payload": payload,
+                "created": now, "updated": now, "error": None,
+            }
+            self._save()
+            self._cond.notify()
+            return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if k != "payload"}
+
+    def pending(self) -> List[dict]:
+        with self._cond:
+            return [{k: v for k, v in j.items() if k != "payload"}
+                    for j in self._jobs.values() if j["status"] in ("pending", "running")]
+
+    # ---- worker ----
+    def _next_job(self):
+        with self._cond:
+            while True:
+                pending = [j for j in self._jobs.values() if j["status"] == "pending"]
+                if pending:
+                    job = min(pending, key=lambda j: j["created"])
+                    job["status"] = "running"
+                    job["updated"] = time.time()
+                    self._save()
+                    return job
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            start = time.time()
+            try:
+                self.handler(job["payload"])
+                status, error = "done", None
+                logger.info(f"✅ {self.name} job {job['id'][:8]} finished in {round(time.time() - start, 2)}s")
+            except Exception as e:
+                status, error = "failed", str(e)
+                logger.exception(f"❌ {self.name} job {job['id'][:8]} failed")
+            with self._cond:
+                job["status"] = status
+                job["error"] = error
+                job["updated"] = time.time()
+                self._save()
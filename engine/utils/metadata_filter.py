@@ -0,0 +1,94 @@
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METADATA_INDEX_FILE = "metadata_index.json"
+METADATA_POSTINGS_FILE = "metadata_index.bin"
+FILTER_FIELDS = ("source", "ingested_by", "page", "source_type")
+
+
+def _key(field: str, value) -> str:
+    return f"{field}={value}"
+
+
+class MetadataIndex:
+    """
+    Inverted index from metadata values to FAISS positions, e.g.
+    "source=report.pdf" -> [12, 13, 14]. A search filter becomes the set of
+    positions FAISS may return, so selective filters don't need over-fetching.
+    On disk: a JSON table of key -> (offset, count) and one int64 array that
+    query processes memory-map.
+    """
+
+    def __init__(self, table: Dict[str, Tuple[int, int]], postings: np.ndarray, ntotal: int):
+        self.table = table
+        self.postings = postings
+        self.ntotal = ntotal
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, dict]], ntotal: int) -> "MetadataIndex":
+        """`rows` are (FAISS position, metadata) pairs."""
+        lists = {}
+        for pos, metadata in rows:
+            for field in FILTER_FIELDS:
+                value = metadata.get(field)
+                if value is not None:
+                    lists.setdefault(_key(field, value), []).append(pos)
+        table, chunks, offset = {}, [], 0
+        for key, positions in lists.items():
+            table[key] = (offset, len(positions))
+            chunks.append(np.sort(np.asarray(positions, dtype="int64")))
+            offset += len(positions)
+        postings = np.concatenate(chunks) if chunks else np.zeros(0, dtype="int64")
+        return cls(table, postings, ntotal)
+
+    @classmethod
+    def open(cls, index_path) -> "MetadataIndex":
+        with open(Path(index_path) / METADATA_INDEX_FILE, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        count = header["postings"]
+        path = Path(index_path) / METADATA_POSTINGS_FILE
+        if path.stat().st_size != 8 * count:
+            raise ValueError(f"{path} does not hold {count} postings")
+        postings = np.memmap(path, dtype="int64", mode="r", shape=(count,)) if count else np.zeros(0, dtype="int64")
+        return cls({key: tuple(span) for key, span in header["table"].items()}, postings, header["ntotal"])
+
+    def save(self, index_path):
+        path = Path(index_path) / METADATA_POSTINGS_FILE
+        tmp_path = str(path) + ".tmp"
+        np.asarray(self.postings, dtype="int64").tofile(tmp_path)
+        os.replace(tmp_path, path)
+        path = Path(index_path) / METADATA_INDEX_FILE
+        tmp_path = str(path) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ntotal": self.ntotal, "postings": len(self.postings), "table": self.table}, f)
+        os.replace(tmp_path, path)
+
+    def values(self, field: str) -> Dict[str, int]:
+        """Indexed values of a field and how many chunks carry each."""
+        prefix = field + "="
+        return {key[len(prefix):]: count for key, (_, count) in self.table.items() if key.startswith(prefix)}
+
+    def positions(self, where: dict) -> np.ndarray:
+        """
+        Sorted positions matching `where`, e.g. {"source": ["a.pdf", "b.pdf"],
+        "ingested_by": "backend"}: values of one field are OR-ed, fields AND-ed.
+        """
+        result = None
+        for field, wanted in where.items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Can't filter on '{field}'; indexed fields are {', '.join(FILTER_FIELDS)}")
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            spans = [self.table.get(_key(field, value)) for value in values]
+            matched = [np.asarray(self.postings[offset:offset + count]) for offset, count in filter(None, spans)]
+            field_positions = np.unique(np.concatenate(matched)) if matched else np.zeros(0, dtype="int64")
+            result = field_positions if result is None else np.intersect1d(result, field_positions, assume_unique=True)
+            if not len(result):
+                break
+        return result if result is not None else np.arange(self.ntotal, dtype="int64")
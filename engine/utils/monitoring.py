@@ -106,7 +106,7 @@ def trigger_ingestion():
 # ===============================
 def log_change(file_path, change_type):
     """Log file changes and trigger ingestion."""
-    file_hash_val = file_hash(file_path)
+    file_hash_val = file_hash(file_path) if os.path.exists(file_path) else ""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     with open(LOG_FILE, "a", newline="", encoding="utf-8") as f:
@@ -114,7 +114,8 @@ def log_change(file_path, change_type):
 
     print(f"[{timestamp}] {change_type}: {file_path}")
 
-    if change_type in ("Created", "Modified"):
+    # Ingestion diffs the folder against its source manifest, so deletions purge vectors too
+    if change_type in ("Created", "Modified", "Deleted"):
         trigger_ingestion()
 
 class ChangeHandler(FileSystemEventHandler):
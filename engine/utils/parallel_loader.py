@@ -0,0 +1,116 @@
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# 🔧 Defaults (override per deployment)
+# ========================
+LOAD_WORKERS = int(os.getenv("PHIRAG_LOAD_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+FILE_TIMEOUT = float(os.getenv("PHIRAG_LOAD_TIMEOUT", "300"))
+MAX_CRASH_RETRIES = 1
+
+
+def _kill_pool(executor: ProcessPoolExecutor):
+    # A hung parser never returns, so its worker has to be terminated outright
+    for process in list(getattr(executor, "_processes", {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_load_files(paths: Iterable, load_fn: Callable, workers: int = LOAD_WORKERS,
+                    timeout: float = FILE_TIMEOUT) -> Iterator[Tuple[object, List, Exception]]:
+    """
+    Parse files in a process pool and yield (path, docs, error) as each one
+    finishes, so callers can chunk early results while the rest still parse.
+
+    - `load_fn` must be a picklable top-level function taking one path.
+    - A file taking longer than `timeout` seconds is reported as failed and
+      its worker is killed; other in-flight files are re-queued.
+    - If a parser crashes its worker process, the files that were in flight
+      are retried one at a time; one that still crashes alone is retried
+      MAX_CRASH_RETRIES more times before it is failed.
+    """
+    paths = list(paths)
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            try:
+                yield path, load_fn(path), None
+            except Exception as e:
+                yield path, None, e
+        return
+
+    queue = deque(paths)
+    suspects = deque()  # files that were in flight when a worker crashed
+    crashes = {}        # path -> crashes while running alone
+    inflight = {}       # future -> (path, started)
+    isolated = False    # True while a single suspect runs alone
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while queue or suspects or inflight:
+            if suspects:
+                if not inflight:
+                    path = suspects.popleft()
+                    inflight[executor.submit(load_fn, path)] = (path, time.monotonic())
+                    isolated = True
+            else:
+                # At most `workers` in flight, so submit time is (roughly) start time
+                while queue and len(inflight) < workers:
+                    path = queue.popleft()
+                    inflight[executor.submit(load_fn, path)] = (path, time.monotonic())
+                    isolated = False
+
+            oldest = min(started for _, started in inflight.values())
+            wait_for = max(0.05, timeout - (time.monotonic() - oldest))
+            done, _ = wait(list(inflight), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            # Settle timeouts before yielding anything: the time the caller spends
+            # on a result must not count against files still parsing, and a file
+            # that finished in the meantime is a result, not a timeout
+            now = time.monotonic()
+            finished = [f for f in inflight if f in done or f.done()]
+            expired = [f for f, (_, started) in inflight.items()
+                       if f not in finished and now - started > timeout]
+
+            results, broken = [], False
+            for future in finished:
+                path, _ = inflight.pop(future)
+                try:
+                    results.append((path, future.result(), None))
+                except BrokenProcessPool:
+                    broken = True
+                    if not isolated:
+                        suspects.append(path)
+                    elif crashes.get(path, 0) < MAX_CRASH_RETRIES:
+                        crashes[path] = crashes.get(path, 0) + 1
+                        suspects.appendleft(path)
+                    else:
+                        results.append((path, None, RuntimeError("parser crashed its worker process")))
+                except Exception as e:
+                    results.append((path, None, e))
+            for future in expired:
+                path, _ = inflight.pop(future)
+                results.append((path, None, TimeoutError(f"parsing took longer than {timeout}s")))
+
+            if broken or expired:
+                # Restart the pool; unfinished files are retried
+                retry = [path for path, _ in inflight.values()]
+                if broken:
+                    suspects.extend(retry)
+                else:
+                    queue.extendleft(retry)
+                inflight.clear()
+                _kill_pool(executor)
+                executor = ProcessPoolExecutor(max_workers=workers)
+
+            yield from results
+    finally:
+        if inflight:
+            _kill_pool(executor)
+        else:
+            executor.shutdown(wait=True)
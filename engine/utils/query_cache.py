@@ -0,0 +1,125 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# 🔧 Limits
+# ========================
+MAX_QUERY_EMBEDDINGS = int(os.getenv("PHIRAG_QUERY_EMBED_CACHE_SIZE", "4096"))
+MAX_RESULT_SETS = int(os.getenv("PHIRAG_RESULT_CACHE_SIZE", "2048"))
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace don't change what the (uncased) embedder or BM25 see."""
+    return " ".join(query.casefold().split())
+
+
+def _embedder_key(embedder):
+    return getattr(embedder, "model_name", None) or id(embedder)
+
+
+def _frozen(where: Optional[dict]):
+    if not where:
+        return None
+    return tuple(sorted((field, tuple(sorted(map(str, value))) if isinstance(value, (list, tuple, set)) else str(value))
+                        for field, value in where.items()))
+
+
+# ========================
+# ⚡ Hot-query cache
+# ========================
+class QueryCache:
+    """
+    In-memory LRUs in front of retrieval: normalized query → embedding, and
+    (index, version, query, k, filters, mode) → ranked (doc id, score, ...) list.
+    Result sets are only cached for stores that know their index version,
+    and since every save bumps the version, stale entries are never served;
+    they just age out.
+    """
+
+    def __init__(self, max_embeddings=MAX_QUERY_EMBEDDINGS, max_results=MAX_RESULT_SETS):
+        self.max_embeddings = max_embeddings
+        self.max_results = max_results
+        self._embeddings = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"embed_hits": 0, "embed_misses": 0, "result_hits": 0, "result_misses": 0}
+
+    @staticmethod
+    def _touch(entries: OrderedDict, key, limit: int, value=None):
+        if value is not None:
+            entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+
+    def embed(self, embedder, query: str) -> List[float]:
+        """embedder.embed_query(query), computed once per normalized query (from its first wording)."""
+        key = (_embedder_key(embedder), normalize_query(query))
+        with self._lock:
+            vector = self._embeddings.get(key)
+            if vector is not None:
+                self._touch(self._embeddings, key, self.max_embeddings)
+                self.stats["embed_hits"] += 1
+                return vector
+            self.stats["embed_misses"] += 1
+        vector = embedder.embed_query(query)
+        with self._lock:
+            self._touch(self._embeddings, key, self.max_embeddings, vector)
+        return vector
+
+    @staticmethod
+    def result_key(store, query: str, k: int, where=None, mode="hybrid", **params) -> Optional[Tuple]:
+        """Cache key for a search on `store`, or None if the store's version is unknown."""
+        version = getattr(store, "index_version", None)
+        if version is None:
+            return None
+        return (getattr(store, "index_path", None) or id(store), version, mode, normalize_query(query), k,
+                _frozen(where), tuple(sorted(params.items())))
+
+    def results(self, key) -> Optional[List[Tuple]]:
+        if key is None:
+            return None
+        with self._lock:
+            ranked = self._results.get(key)
+            if ranked is None:
+                self.stats["result_misses"] += 1
+                return None
+            self._touch(self._results, key, self.max_results)
+            self.stats["result_hits"] += 1
+            return ranked
+
+    def put_results(self, key, ranked: List[Tuple]):
+        if key is None:
+            return
+        with self._lock:
+            self._touch(self._results, key, self.max_results, list(ranked))
+
+    def clear(self):
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def report(self) -> dict:
+        rate = lambda hits, misses: round(hits / (hits + misses), 3) if hits + misses else None
+        s = self.stats
+        return {**s, "embeddings": len(self._embeddings), "result_sets": len(self._results),
+                "embed_hit_rate": rate(s["embed_hits"], s["embed_misses"]),
+                "result_hit_rate": rate(s["result_hits"], s["result_misses"])}
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    """One query cache per process, shared by every session."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = QueryCache()
+        return _shared_cache
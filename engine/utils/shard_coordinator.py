@@ -0,0 +1,189 @@
+import os
+import json
+import heapq
+import time
+import socket
+import logging
+import threading
+import itertools
+from concurrent.futures import Future, wait
+from typing import List
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# ⚙️ Settings
+# ========================
+SHARD_NODES = os.getenv("PHIRAG_SHARD_NODES", "")                      # "host:port,host:port"
+SHARD_TIMEOUT = float(os.getenv("PHIRAG_SHARD_TIMEOUT", "2.0"))        # seconds per fan-out
+CONNECT_TIMEOUT = float(os.getenv("PHIRAG_SHARD_CONNECT_TIMEOUT", "1.0"))
+RETRY_AFTER = float(os.getenv("PHIRAG_SHARD_RETRY_AFTER", "5.0"))       # back-off after a failed connect
+
+
+class ShardUnavailable(RuntimeError):
+    pass
+
+
+# ========================
+# 🔌 One shard node
+# ========================
+class RemoteShard:
+    """
+    Client for one shard_server. Requests are pipelined over a single
+    connection and matched to replies by id; a dropped connection fails
+    everything in flight and is re-opened on the next request.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, int(port)
+        self.name = f"{host}:{port}"
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = {}  # request id -> Future
+        self._sock = None
+        self._wfile = None
+        self._retry_at = 0.0
+
+    def _connect(self):
+        if time.monotonic() < self._retry_at:
+            raise ConnectionRefusedError("node marked down, retrying later")
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        except OSError:
+            self._retry_at = time.monotonic() + RETRY_AFTER
+            raise
+        sock.settimeout(None)
+        self._sock, self._wfile = sock, sock.makefile("wb")
+        threading.Thread(target=self._read_loop, args=(sock,), daemon=True, name=f"shard-{self.name}").start()
+
+    def _read_loop(self, sock):
+        try:
+            for raw in sock.makefile("rb"):
+                try:
+                    reply = json.loads(raw)
+                except ValueError:
+                    continue
+                with self._lock:
+                    future = self._pending.pop(reply.get("id"), None)
+                if future is None:
+                    continue  # answer to a request we already gave up on
+                if "error" in reply:
+                    future.set_exception(ShardUnavailable(f"{self.name}: {reply['error']}"))
+                else:
+                    future.set_result(reply)
+        except OSError:
+            pass
+        self._drop(sock, f"{self.name}: connection closed")
+
+    def _drop(self, sock, reason):
+        with self._lock:
+            if self._sock is not sock:
+                return
+            self._sock = self._wfile = None
+            pending, self._pending = self._pending, {}
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ShardUnavailable(reason))
+
+    def request(self, payload: dict) -> Future:
+        future = Future()
+        req_id = f"{self.name}#{next(self._ids)}"
+        try:
+            with self._lock:
+                if self._sock is None:
+                    self._connect()
+                self._pending[req_id] = future
+                self._wfile.write((json.dumps({"id": req_id, **payload}) + "\n").encode("utf-8"))
+                self._wfile.flush()
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(req_id, None)
+                sock = self._sock
+            if sock is not None:
+                self._drop(sock, f"{self.name}: {e}")
+            future.set_exception(ShardUnavailable(f"{self.name}: {e}"))
+        future.req_id = req_id
+        return future
+
+    def forget(self, future: Future):
+        with self._lock:
+            self._pending.pop(getattr(future, "req_id", None), None)
+
+    def close(self):
+        if self._sock is not None:
+            self._drop(self._sock, f"{self.name}: closed")
+
+
+# ========================
+# 🔀 Scatter-gather
+# ========================
+class ShardCoordinator:
+    """
+    Fans an embedded query out to every shard node, waits up to `timeout`
+    and merges whatever came back by distance. Slow or dead nodes only cost
+    their share of the results; `last_search` reports which ones answered.
+    Plugs into search_index like a local index.
+    """
+
+    def __init__(self, nodes: List[str], embedder, timeout: float = SHARD_TIMEOUT):
+        self.shards = [RemoteShard(*node.rsplit(":", 1)) for node in nodes]
+        self.embedding_function = embedder
+        self.timeout = timeout
+        self.last_search = {}
+
+    @classmethod
+    def from_env(cls, embedder, nodes: str = SHARD_NODES, timeout: float = SHARD_TIMEOUT):
+        return cls([node.strip() for node in nodes.split(",") if node.strip()], embedder, timeout)
+
+    def search_by_vector(self, vector, k=5, nprobe=None, ef_search=None, where=None, timeout=None, vectors=None):
+        return self._gather({"op": "search", "vector": [float(x) for x in vector], "k": k, "nprobe": nprobe,
+                             "ef_search": ef_search, "where": where, "vectors": vectors is not None}, k, timeout, vectors)
+
+    def lexical_search(self, query: str, k=5, where=None, timeout=None):
+        """BM25 hits from every node; per-shard scores are close enough to merge for rank fusion."""
+        hits = self._gather({"op": "lexical", "query": query, "k": k, "where": where}, None, timeout)
+        return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+
+    def _gather(self, request: dict, k, timeout, vectors=None):
+        futures = {shard.request(request): shard for shard in self.shards}
+        done, late = wait(futures, timeout=self.timeout if timeout is None else timeout)
+
+        hits, failed = [], {}
+        for future in done:
+            try:
+                for hit in future.result()["hits"]:
+                    hits.append((Document(id=hit["id"], page_content=hit["text"], metadata=hit["metadata"]), hit["score"]))
+                    if vectors is not None and hit.get("vector") is not None:
+                        vectors[hit["id"]] = hit["vector"]
+            except Exception as e:
+                failed[futures[future].name] = str(e)
+        for future in late:
+            futures[future].forget(future)
+            failed[futures[future].name] = "timeout"
+
+        self.last_search = {"shards": len(self.shards), "answered": len(self.shards) - len(failed), "failed": failed}
+        if failed:
+            logger.warning(f"⚠️ Partial results from {len(self.shards) - len(failed)}/{len(self.shards)} shards: {failed}")
+        return hits if k is None else heapq.nsmallest(k, hits, key=lambda hit: hit[1])
+
+    def ping(self, timeout=None) -> dict:
+        futures = {shard.request({"op": "ping"}): shard for shard in self.shards}
+        wait(futures, timeout=self.timeout if timeout is None else timeout)
+        status = {}
+        for future, shard in futures.items():
+            if future.done() and future.exception() is None:
+                status[shard.name] = future.result()
+            else:
+                shard.forget(future)
+                status[shard.name] = None
+        return status
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
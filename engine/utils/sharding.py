@@ -0,0 +1,142 @@
+import os
+import json
+import heapq
+import logging
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+from utils.hashing import hash_content
+from utils.index_utils import SHARDS_DIR, SHARDS_FILE, index_version, lexical_search, load_index, search_by_vector
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# ⚙️ Settings
+# ========================
+NUM_SHARDS = int(os.getenv("PHIRAG_SHARDS", "1"))                        # shards for a new index
+SEARCH_THREADS = int(os.getenv("PHIRAG_SHARD_SEARCH_THREADS", "0")) or None  # 0 = one per shard
+
+
+# ========================
+# 🧭 Layout
+# ========================
+def shard_of(source, num_shards: int) -> int:
+    """Stable shard for a source: all of a source's chunks live in one shard."""
+    if num_shards <= 1:
+        return 0
+    return int(hash_content(str(source or ""))[:8], 16) % num_shards
+
+def shard_path(index_path, shard: int) -> str:
+    return os.path.join(str(index_path), SHARDS_DIR, f"shard_{shard:03d}")
+
+def shard_count(index_path) -> int:
+    """Number of shards of a sharded index, 0 for a single index or none at all."""
+    try:
+        with open(os.path.join(str(index_path), SHARDS_FILE), "r", encoding="utf-8") as f:
+            return int(json.load(f).get("num_shards", 0))
+    except (OSError, ValueError):
+        return 0
+
+def write_shard_layout(index_path, num_shards: int):
+    path = os.path.join(str(index_path), SHARDS_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"num_shards": num_shards, "router": "md5(source)"}, f)
+    os.replace(tmp_path, path)
+    # A single index previously saved here is superseded by the shards
+    for stale in ("index.faiss", "index.pkl"):
+        if os.path.exists(os.path.join(str(index_path), stale)):
+            os.remove(os.path.join(str(index_path), stale))
+
+
+# ========================
+# 🔀 Scatter-gather search
+# ========================
+class ShardedDocstore(Mapping):
+    """Read-only view over every shard's docstore (ids are unique across shards)."""
+
+    def __init__(self, shards):
+        self._shards = shards
+
+    @property
+    def _dict(self):
+        return self
+
+    def search(self, doc_id):
+        doc = self.get(doc_id)
+        return doc if doc is not None else f"ID {doc_id} not found."
+
+    def __getitem__(self, doc_id):
+        for shard in self._shards:
+            doc = shard.docstore._dict.get(doc_id)
+            if doc is not None:
+                return doc
+        raise KeyError(doc_id)
+
+    def __contains__(self, doc_id):
+        return any(doc_id in shard.docstore._dict for shard in self._shards)
+
+    def __len__(self):
+        return sum(len(shard.docstore._dict) for shard in self._shards)
+
+    def __iter__(self):
+        for shard in self._shards:
+            yield from shard.docstore._dict
+
+    def items(self):
+        return [item for shard in self._shards for item in shard.docstore._dict.items()]
+
+
+class ShardedIndex:
+    """
+    A set of FAISS shards searched as one index. A query is embedded once,
+    sent to every shard in parallel (FAISS releases the GIL while searching)
+    and the per-shard top-k lists are merged by distance.
+    """
+
+    def __init__(self, shards: List, embedder, index_path=None):
+        self.shards = shards
+        self.embedding_function = embedder
+        self.index_path = index_path
+        self.index_version = None  # on-disk version this set of shards was loaded at
+        self.docstore = ShardedDocstore(shards)
+        self._pool = ThreadPoolExecutor(max_workers=SEARCH_THREADS or max(1, len(shards)),
+                                        thread_name_prefix="shard-search")
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.index.ntotal for shard in self.shards)
+
+    def search_by_vector(self, vector, k=5, nprobe=None, ef_search=None, where=None, vectors=None):
+        futures = [self._pool.submit(search_by_vector, shard, vector, k, nprobe, ef_search, where, vectors)
+                   for shard in self.shards]
+        hits = [hit for future in futures for hit in future.result()]
+        return heapq.nsmallest(k, hits, key=lambda hit: hit[1])
+
+    def lexical_search(self, query: str, k=5, where=None):
+        futures = [self._pool.submit(lexical_search, shard, query, k, where) for shard in self.shards]
+        hits = [hit for future in futures for hit in future.result()]
+        return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+
+    def similarity_search_with_score(self, query: str, k=4, **kwargs):
+        return self.search_by_vector(self.embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query: str, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+
+def load_sharded_index(embedder, index_path, mmap=True) -> ShardedIndex:
+    num_shards = shard_count(index_path)
+    paths = [shard_path(index_path, i) for i in range(num_shards)]
+    present = [path for path in paths if Path(path, "index_params.json").exists() or Path(path, "index.pkl").exists()]
+    if not present:
+        raise FileNotFoundError(f"No shards found under {index_path}")
+    version = index_version(str(index_path))
+    with ThreadPoolExecutor(max_workers=len(present)) as pool:
+        shards = list(pool.map(lambda path: load_index(embedder, path, mmap=mmap), present))
+    logger.info(f"🧩 Loaded {len(shards)}/{num_shards} shards from {index_path} (version {version})")
+    sharded = ShardedIndex(shards, embedder, index_path)
+    sharded.index_version = version
+    return sharded
@@ -0,0 +1,65 @@
+import os
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_FILE = "source_manifest.json"
+
+
+class SourceManifest:
+    """
+    Persistent map of every ingested source to its content hash and, per
+    chunk fingerprint, the FAISS docstore id holding that chunk. Lives inside
+    the index folder so it always describes the index saved next to it.
+    """
+
+    def __init__(self, index_path, sources: Optional[Dict[str, dict]] = None):
+        self.path = Path(index_path) / MANIFEST_FILE
+        self.sources = sources or {}
+
+    @classmethod
+    def load(cls, index_path) -> "SourceManifest":
+        path = Path(index_path) / MANIFEST_FILE
+        if not path.exists():
+            return cls(index_path)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(index_path, json.load(f).get("sources", {}))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def hash_of(self, source: str) -> Optional[str]:
+        entry = self.sources.get(source)
+        return entry["hash"] if entry else None
+
+    def chunks_of(self, source: str) -> Dict[str, str]:
+        """Chunk fingerprint -> docstore id for one source ({} for legacy entries)."""
+        entry = self.sources.get(source)
+        return dict(entry.get("chunks", {})) if entry else {}
+
+    def ids_of(self, source: str) -> List[str]:
+        entry = self.sources.get(source)
+        if not entry:
+            return []
+        if "chunks" in entry:
+            return list(entry["chunks"].values())
+        return list(entry.get("ids", []))
+
+    def file_sources(self) -> List[str]:
+        return [s for s, e in self.sources.items() if e.get("kind") == "file"]
+
+    def record(self, source: str, content_hash: str, chunks: Dict[str, str], kind: str = "file"):
+        self.sources[source] = {"hash": content_hash, "chunks": dict(chunks), "kind": kind, "updated": time.time()}
+
+    def add_chunk(self, source: str, fingerprint: str, doc_id: str):
+        self.sources[source].setdefault("chunks", {})[fingerprint] = doc_id
+
+    def forget(self, source: str) -> List[str]:
+        ids = self.ids_of(source)
+        self.sources.pop(source, None)
+        return ids
@@ -0,0 +1,45 @@
+import os
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from utils.hashing import hash_content
+
+TEXT_HASH_FILE = "text_hashes.json"
+
+
+class TextHashIndex:
+    """
+    Persistent text hash -> docstore id map for one FAISS index, so "is this
+    text already indexed?" is a set lookup instead of a vector search.
+    """
+
+    def __init__(self, index_path, entries: Dict[str, str] = None):
+        self.path = Path(index_path) / TEXT_HASH_FILE
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, index_path, vectorstore=None) -> "TextHashIndex":
+        path = Path(index_path) / TEXT_HASH_FILE
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(index_path, json.load(f))
+        index = cls(index_path)
+        if vectorstore is not None:
+            # One-off migration for indexes written before this file existed
+            for doc_id, doc in vectorstore.docstore._dict.items():
+                index.entries[hash_content(doc.page_content)] = doc_id
+        return index
+
+    def __contains__(self, text_hash: str) -> bool:
+        return text_hash in self.entries
+
+    def update(self, pairs: Iterable[Tuple[str, str]]):
+        self.entries.update(pairs)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
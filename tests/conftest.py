@@ -0,0 +1,74 @@
+import os
+import sys
+import hashlib
+
+import pytest
+
+ENGINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "engine")
+sys.path.insert(0, ENGINE)
+sys.path.insert(0, os.path.join(ENGINE, "app"))  # app modules import each other flat
+
+# Manual scripts that run against a real index / machine paths at import time
+collect_ignore = ["test_backend_ingestion.py", "test_rag_chain.py", "web_test.py",
+                  "faiss_test.py", "fiass_chunk_report.py", "rebuild_fiass.py"]
+
+
+class HashEmbeddings:
+    """Deterministic stand-in for the sentence-transformer: equal texts, equal vectors."""
+
+    model_name = "test/hash-embeddings"
+
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.calls = 0
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255.0 for b in digest[:self.dim]]
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def hash_embeddings():
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def ingestion(tmp_path, monkeypatch, hash_embeddings):
+    """utils.backend_ingestion with its dedup stores, embedding cache and loaders pointed at tmp_path."""
+    bi = pytest.importorskip("utils.backend_ingestion", exc_type=ImportError)
+    from langchain_community.document_loaders import TextLoader
+    from utils.dedup import NearDuplicateIndex, ShadowedChunks
+    from utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    monkeypatch.setattr(bi, "HASH_STORE_PATH", tmp_path / "indexed_hashes.pkl")
+    monkeypatch.setattr(bi, "MINHASH_STORE_PATH", tmp_path / "minhash.pkl")
+    monkeypatch.setattr(bi, "SHADOW_STORE_PATH", tmp_path / "shadowed.pkl")
+    monkeypatch.setattr(bi, "indexed_hashes", set())
+    monkeypatch.setattr(bi, "near_duplicates", NearDuplicateIndex())
+    monkeypatch.setattr(bi, "shadowed", ShadowedChunks())
+    monkeypatch.setattr(bi, "UnstructuredFileLoader", TextLoader)
+    cache = EmbeddingCache(tmp_path / "embeddings.pkl")
+    monkeypatch.setattr(bi, "get_ingest_embedder",
+                        lambda *args, **kwargs: CachedEmbeddings(hash_embeddings, cache=cache, model_name="hash"))
+    return bi
+
+
+def paragraphs(seed, count):
+    """Deterministic prose-like text: `count` lines of 12 random words."""
+    import random
+    rnd = random.Random(seed)
+    return "".join(" ".join(f"term{rnd.randrange(5000)}" for _ in range(12)) + "\n" for _ in range(count))
+
+
+def indexed(bi, index_path):
+    """docstore id -> Document of the saved index."""
+    from utils.index_utils import load_index
+    db = load_index(bi.get_ingest_embedder(), str(index_path), mmap=False)
+    return dict(db.docstore._dict.items()), db
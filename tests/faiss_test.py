@@ -1,7 +1,10 @@
 import os
+import sys
 from collections import defaultdict
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "engine"))
+from utils.embedder import get_embedder
+from utils.index_utils import load_index
 
 # ===============================
 # 🔧 Dynamic path setup
@@ -20,9 +23,9 @@ if not os.path.exists(INDEX_PATH):
     print("❌ FAISS index folder not found. Run backend_ingestion.py first.")
     exit(1)
 
-embedder = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en")
+embedder = get_embedder()
 try:
-    index = FAISS.load_local(INDEX_PATH, embedder, allow_dangerous_deserialization=True)
+    index = load_index(embedder, INDEX_PATH)
 except Exception as e:
     print(f"❌ Failed to load FAISS index: {e}")
     exit(1)
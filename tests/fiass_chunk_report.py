@@ -1,16 +1,19 @@
 from pathlib import Path
 from collections import defaultdict
 import os
+import sys
 
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "engine"))
+from utils.embedder import get_embedder
+from utils.index_utils import load_index
 
 # Path to your FAISS index
 INDEX_PATH = Path("combined_faiss_index")
 
 # Load embedder and FAISS index
-embedder = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en")
-vectorstore = FAISS.load_local(INDEX_PATH, embedder, allow_dangerous_deserialization=True)
+embedder = get_embedder()
+vectorstore = load_index(embedder, INDEX_PATH)
 
 # Data structures to hold stats
 chunk_count_by_source = defaultdict(int)
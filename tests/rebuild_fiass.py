@@ -1,12 +1,14 @@
 import os
 import sys
 from pathlib import Path
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.document_loaders import PyMuPDFLoader, UnstructuredFileLoader
 from pptx import Presentation
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "engine"))
+from utils.embed_executor import get_ingest_embedder
+from utils.index_utils import build_index, save_index
+
 # ==============================
 # ⚙️ Path Configuration
 # ==============================
@@ -66,15 +68,16 @@ def rebuild_faiss():
         print("⚠️ No documents found to index.")
         return
 
-    embedder = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en")
+    embedder = get_ingest_embedder()
 
     if os.path.exists(INDEX_PATH):
         import shutil
         shutil.rmtree(INDEX_PATH)
 
     os.makedirs(INDEX_PATH, exist_ok=True)
-    index = FAISS.from_texts(docs, embedder)
-    index.save_local(INDEX_PATH)
+    index = build_index(zip(docs, embedder.embed_documents(docs)), embedder)
+    save_index(index, INDEX_PATH)
+    embedder.cache.save()
     print(f"✅ FAISS index rebuilt successfully with {len(docs)} chunks.")
     print(f"📁 Index saved to: {INDEX_PATH}")
 
@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils.answer_cache import AnswerCache, context_fingerprint
+from utils.query_cache import QueryCache
+
+
+def _vector(*values):
+    return np.asarray(values, dtype="float32")
+
+
+# ========================
+# 💬 Answer cache
+# ========================
+def test_paraphrase_with_same_context_hits(tmp_path):
+    cache = AnswerCache(tmp_path / "answers.pkl", save_delay=60)
+    fingerprint = context_fingerprint(["c1", "c2"], 150, "phi3")
+    cache.put(_vector(1, 0, 0), fingerprint, "answer", cost=3.0, index_version=1)
+
+    hit = cache.get(_vector(0.99, 0.05, 0), fingerprint, index_version=1)
+    assert hit["answer"] == "answer"
+    assert cache.get(_vector(0, 1, 0), fingerprint, index_version=1) is None
+    assert cache.get(_vector(1, 0, 0), context_fingerprint(["c1", "c3"], 150, "phi3"), index_version=1) is None
+    assert cache.report()["saved_seconds"] == 3.0
+
+
+def test_new_index_version_drops_answers(tmp_path):
+    cache = AnswerCache(tmp_path / "answers.pkl", save_delay=60)
+    cache.put(_vector(1, 0), "fp", "answer", index_version=1)
+    assert cache.get(_vector(1, 0), "fp", index_version=2) is None
+    assert len(cache) == 0
+
+
+def test_expired_and_evicted_entries_miss(tmp_path):
+    cache = AnswerCache(tmp_path / "answers.pkl", max_entries=2, ttl=0, save_delay=60)
+    cache.put(_vector(1, 0), "fp", "old")
+    assert cache.get(_vector(1, 0), "fp") is None
+
+    cache = AnswerCache(tmp_path / "other.pkl", max_entries=2, save_delay=60)
+    for i, fp in enumerate(["a", "b", "c"]):
+        cache.put(_vector(1, i), fp, fp)
+    assert cache.get(_vector(1, 0), "a") is None
+    assert cache.get(_vector(1, 2), "c")["answer"] == "c"
+
+
+def test_puts_are_saved_in_one_deferred_write(tmp_path):
+    path = tmp_path / "answers.pkl"
+    cache = AnswerCache(path, save_delay=60)
+    cache.put(_vector(1, 0), "a", "first", index_version=1)
+    cache.put(_vector(0, 1), "b", "second", index_version=1)
+    assert not path.exists()  # nothing written per put
+
+    cache.save()
+    reloaded = AnswerCache(path)
+    assert reloaded.get(_vector(0, 1), "b", index_version=1)["answer"] == "second"
+    assert len(reloaded) == 2
+
+
+# ========================
+# ⚡ Query cache
+# ========================
+class _CountingEmbedder:
+    model_name = "counting"
+
+    def __init__(self):
+        self.seen = []
+
+    def embed_query(self, text):
+        self.seen.append(text)
+        return [float(len(text))]
+
+
+def test_query_embedding_reused_across_case_and_spacing():
+    cache, embedder = QueryCache(), _CountingEmbedder()
+    first = cache.embed(embedder, "What is  FAISS?")
+    assert cache.embed(embedder, "what is faiss?") == first
+    assert embedder.seen == ["What is  FAISS?"]  # embedded once, in its original wording
+    assert cache.report()["embed_hits"] == 1
+
+
+def test_result_sets_are_keyed_by_index_version():
+    cache = QueryCache()
+    store = SimpleNamespace(index_path="/idx", index_version=1)
+    key = cache.result_key(store, "query", 5, where={"file_type": ["pdf"]})
+    cache.put_results(key, [("doc-1", 0.9)])
+    assert cache.results(cache.result_key(store, "QUERY ", 5, where={"file_type": ["pdf"]})) == [("doc-1", 0.9)]
+    assert cache.results(cache.result_key(store, "query", 4, where={"file_type": ["pdf"]})) is None
+
+    store.index_version = 2  # a save bumps the version: old results are never served
+    assert cache.results(cache.result_key(store, "query", 5, where={"file_type": ["pdf"]})) is None
+
+
+def test_unversioned_stores_are_not_cached():
+    cache = QueryCache()
+    store = SimpleNamespace(index_version=None)
+    key = cache.result_key(store, "query", 5)
+    cache.put_results(key, [("doc-1", 0.9)])
+    assert key is None and cache.results(key) is None
+
+
+# ========================
+# 💾 Embedding cache
+# ========================
+def test_embedding_cache_saves_merge_instead_of_overwriting(tmp_path):
+    from utils.embedding_cache import EmbeddingCache
+    path = tmp_path / "embeddings.pkl"
+    ui, worker = EmbeddingCache(path), EmbeddingCache(path)  # two processes sharing the file
+    ui.put("m", "h1", [1.0, 2.0])
+    worker.put("m", "h2", [3.0, 4.0])
+    ui.save()
+    worker.save()
+
+    merged = EmbeddingCache(path)
+    assert merged.get("m", "h1") == [1.0, 2.0] and merged.get("m", "h2") == [3.0, 4.0]
+    assert not list(tmp_path.glob("*.tmp")) and not list(tmp_path.glob("*.lock"))
+
+
+def test_cached_embeddings_save_as_they_go(tmp_path, hash_embeddings):
+    from utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+    path = tmp_path / "embeddings.pkl"
+    embedder = CachedEmbeddings(hash_embeddings, cache=EmbeddingCache(path, save_every=3), model_name="hash")
+
+    embedder.embed_documents(["a", "b"])
+    assert not path.exists()
+    embedder.embed_documents(["c", "d"])  # no explicit save: a crash now would keep these
+    assert len(EmbeddingCache(path)) == 4
@@ -0,0 +1,100 @@
+import random
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from utils.context_packer import count_tokens, drop_redundant, merge_passages, pack_context, select_hits
+
+
+def _doc(doc_id, text="text", **metadata):
+    return Document(id=doc_id, page_content=text, metadata=metadata)
+
+
+# ========================
+# 🎯 Adaptive k
+# ========================
+def test_cut_uses_retriever_scores_not_fused_ranks():
+    hits = [(_doc(name), 1.0 / (60 + rank)) for rank, name in enumerate("abcde")]
+    signals = {
+        "a": {"dense": 0.20, "bm25": 9.0}, "b": {"dense": 0.25, "bm25": None},
+        "c": {"dense": None, "bm25": 6.0},   # lexical-only, close to the best BM25
+        "d": {"dense": 0.90, "bm25": 1.0},   # far on both sides
+        "e": {"dense": None, "bm25": None},
+    }
+    assert [doc.id for doc, _ in select_hits(hits, signals, ratio=0.6, min_k=1)] == ["a", "b", "c"]
+
+
+def test_without_signals_every_hit_is_kept():
+    hits = [(_doc(name), 1.0 / (60 + rank)) for rank, name in enumerate("abcdef")]
+    assert select_hits(hits) == hits
+
+
+# ========================
+# 🧩 Merging & dedup
+# ========================
+def test_overlapping_chunks_merge_into_one_span():
+    text = "".join(f"sentence {i}. " for i in range(100))
+    first = _doc("1", text[0:120], text_id="t", char_start=0, char_len=120)
+    second = _doc("2", text[100:220], text_id="t", char_start=100, char_len=120)
+    far = _doc("3", text[600:700], text_id="t", char_start=600, char_len=100)
+    passages = merge_passages([(second, 0.9), (far, 0.5), (first, 0.8)])
+    assert [p["text"] for p in passages] == [text[0:220], text[600:700]]
+    assert [len(p["docs"]) for p in passages] == [2, 1]
+
+
+def test_redundant_passages_dropped_by_stored_vector_and_by_text():
+    near = {"a": {"vector": [1.0, 0.0, 0.0]}, "b": {"vector": [0.99, 0.05, 0.0]}, "c": {"vector": [0.0, 1.0, 0.0]}}
+    passages = [{"text": t, "docs": [_doc(i, t)]} for i, t in [("a", "alpha beta"), ("b", "other words"),
+                                                                ("c", "gamma"), ("d", "beta")]]
+    kept, dropped = drop_redundant(passages, near, threshold=0.95)
+    assert [p["docs"][0].id for p in kept] == ["a", "c"] and dropped == 2  # b by vector, d inside a
+
+
+# ========================
+# 📦 Packing against a real index
+# ========================
+def _words(seed, count):
+    rnd = random.Random(seed)
+    return "".join(" ".join(f"w{rnd.randrange(4000)}" for _ in range(10)) + ".\n" for _ in range(count))
+
+
+@pytest.fixture
+def index(ingestion, tmp_path):
+    docs, index_path = tmp_path / "docs", tmp_path / "index"
+    docs.mkdir()
+    (docs / "a.txt").write_text(_words(1, 200))
+    (docs / "b.txt").write_text(_words(2, 200))
+    ingestion.run_background_ingestion(docs, [], index_path, workers=1)
+    from utils.index_utils import load_index
+    return load_index(ingestion.get_ingest_embedder(), str(index_path), mmap=False)
+
+
+def test_signals_carry_stored_vectors_through_the_query_cache(index):
+    from utils.index_utils import hybrid_search
+    target = next(iter(index.docstore._dict.values()))
+    signals = {}
+    hits = hybrid_search(index, target.page_content, k=6, signals=signals)
+    assert hits[0][0].id == target.id
+    assert signals[target.id]["dense"] == pytest.approx(0.0, abs=1e-4) and signals[target.id]["bm25"] > 0
+    np.testing.assert_allclose(signals[target.id]["vector"], index.embedding_function.embed_query(target.page_content),
+                               atol=1e-5)
+
+    cached = {}
+    assert [d.id for d, _ in hybrid_search(index, target.page_content, k=6, signals=cached)] == [d.id for d, _ in hits]
+    assert cached.keys() == signals.keys()
+
+
+def test_pack_context_fits_budget_without_embedding(index, hash_embeddings):
+    from utils.index_utils import hybrid_search
+    target = next(iter(index.docstore._dict.values()))
+    signals = {}
+    hits = hybrid_search(index, target.page_content, k=8, signals=signals)
+    hits.insert(1, (_doc("copy", target.page_content), hits[0][1]))  # same chunk from another upload
+
+    calls = hash_embeddings.calls
+    context, docs, report = pack_context(hits, signals, budget=300)
+    assert hash_embeddings.calls == calls
+    assert "copy" not in {doc.id for doc in docs}
+    assert count_tokens(context) <= 300 == report["budget"]
+    assert context.startswith(target.page_content[:50])
@@ -0,0 +1,108 @@
+import random
+
+from utils.dedup import NearDuplicateIndex, ShadowedChunks, drop_duplicates
+
+
+def _paragraphs(seed, count):
+    rnd = random.Random(seed)
+    words = [f"term{i}" for i in range(5000)]
+    return "".join(" ".join(rnd.choice(words) for _ in range(12)) + "\n" for _ in range(count))
+
+
+def _indexed_texts(bi, index_path):
+    from utils.index_utils import load_index
+    db = load_index(bi.get_ingest_embedder(), str(index_path), mmap=False)
+    return {doc.page_content for doc in db.docstore._dict.values()}
+
+
+def _chunk_texts(bi, path):
+    return {chunk.page_content for chunk in bi.chunk_documents(bi.load_file(path))}
+
+
+def test_drop_duplicates_reports_what_each_dropped_text_duplicates():
+    seen, near_index, dropped = set(), NearDuplicateIndex(), []
+    text = _paragraphs(1, 3)
+    kept, exact, near = drop_duplicates([text, text, text + " x"], ["a", "a", "b"], seen, near_index, dropped)
+    assert kept == [0] and exact == 1 and near == 1
+    assert dropped == [(1, "a"), (2, "a")]
+
+
+def test_shadowed_chunks_release_and_drop_source():
+    shadows = ShadowedChunks()
+    shadows.add("k1", "b.txt", "fp1", "text", {"source": "b.txt"})
+    shadows.add("k1", "c.txt", "fp9", "text", {"source": "c.txt"})
+    shadows.add("k2", "b.txt", "fp2", "other", {"source": "b.txt"})
+    shadows.drop_source("c.txt")
+    assert shadows.release(["k1"]) == [("b.txt", "fp1", "text", {"source": "b.txt"})]
+    assert len(shadows) == 1
+
+
+def test_shared_chunks_survive_deleting_their_owner(ingestion, tmp_path):
+    docs, index = tmp_path / "docs", tmp_path / "index"
+    docs.mkdir()
+    shared = _paragraphs(7, 120)
+    (docs / "a.txt").write_text(shared + _paragraphs(8, 40))
+    (docs / "b.txt").write_text(shared + _paragraphs(9, 40))
+
+    ingestion.run_background_ingestion(docs, [], index, workers=1)
+    assert len(ingestion.shadowed) > 0  # b's copies of the shared chunks were dropped
+
+    (docs / "a.txt").unlink()
+    ingestion.run_background_ingestion(docs, [], index, workers=1)
+    assert _chunk_texts(ingestion, docs / "b.txt") <= _indexed_texts(ingestion, index)
+
+
+def test_shared_chunks_survive_editing_their_owner(ingestion, tmp_path):
+    docs, index = tmp_path / "docs", tmp_path / "index"
+    docs.mkdir()
+    shared = _paragraphs(7, 120)
+    (docs / "a.txt").write_text(shared + _paragraphs(8, 40))
+    (docs / "b.txt").write_text(shared + _paragraphs(9, 40))
+    ingestion.run_background_ingestion(docs, [], index, workers=1)
+
+    (docs / "a.txt").write_text(_paragraphs(10, 60))
+    ingestion.run_background_ingestion(docs, [], index, workers=1)
+    indexed = _indexed_texts(ingestion, index)
+    assert _chunk_texts(ingestion, docs / "b.txt") <= indexed
+    assert _chunk_texts(ingestion, docs / "a.txt") <= indexed
+
+
+def test_shared_chunks_survive_when_their_other_copy_is_not_reloaded(ingestion, tmp_path, monkeypatch):
+    from langchain_core.documents import Document
+    docs, index = tmp_path / "docs", tmp_path / "index"
+    docs.mkdir()
+    url, shared = "https://example.com/page", _paragraphs(7, 120)
+    page = shared + _paragraphs(11, 40)
+
+    def fake_web(urls, url_cache):
+        # Same contract as load_web: an unchanged page yields nothing
+        if url_cache.get(url) == ingestion.hash_content(page):
+            return []
+        url_cache[url] = ingestion.hash_content(page)
+        return [Document(page_content=page, metadata={"source": url, "ingested_by": "backend", "source_type": "web"})]
+
+    monkeypatch.setattr(ingestion, "load_web", fake_web)
+    (docs / "a.txt").write_text(shared + _paragraphs(8, 40))
+    ingestion.run_background_ingestion(docs, [url], index, workers=1)
+    (docs / "b.txt").write_text(shared + _paragraphs(9, 40))
+    ingestion.run_background_ingestion(docs, [url], index, workers=1)
+    assert len(ingestion.shadowed) > 0  # the page's and b's copies wait behind a's
+    old_b = _chunk_texts(ingestion, docs / "b.txt")
+
+    # a.txt goes away while the page is unchanged and the edited b.txt fails to parse
+    load_file = ingestion.load_file
+
+    def failing_load(path):
+        if path.name == "b.txt":
+            raise ValueError("corrupt file")
+        return load_file(path)
+
+    monkeypatch.setattr(ingestion, "load_file", failing_load)
+    (docs / "a.txt").unlink()
+    (docs / "b.txt").write_text(_paragraphs(13, 40))
+    ingestion.run_background_ingestion(docs, [url], index, workers=1)
+
+    indexed = _indexed_texts(ingestion, index)
+    web_chunks = {chunk.page_content for chunk in ingestion.chunk_documents(fake_web([url], {}))}
+    assert web_chunks <= indexed
+    assert old_b <= indexed
@@ -0,0 +1,76 @@
+from conftest import indexed, paragraphs
+from utils.source_manifest import SourceManifest
+
+
+def _setup(bi, tmp_path, text):
+    docs, index = tmp_path / "docs", tmp_path / "index"
+    docs.mkdir()
+    (docs / "a.txt").write_text(text)
+    bi.run_background_ingestion(docs, [], index, workers=1)
+    return docs, index
+
+
+def _expected(bi, path):
+    return sorted(chunk.page_content for chunk in bi.chunk_documents(bi.load_file(path)))
+
+
+def test_editing_one_line_re_embeds_only_nearby_chunks(ingestion, tmp_path, hash_embeddings):
+    lines = paragraphs(1, 400).splitlines(keepends=True)
+    docs, index = _setup(ingestion, tmp_path, "".join(lines))
+    before = SourceManifest.load(index).chunks_of("a.txt")
+    calls = hash_embeddings.calls
+
+    lines[200] = "an edited line in the middle of the document\n"
+    (docs / "a.txt").write_text("".join(lines))
+    ingestion.run_background_ingestion(docs, [], index, workers=1)
+    after = SourceManifest.load(index).chunks_of("a.txt")
+
+    re_embedded = hash_embeddings.calls - calls
+    assert 0 < re_embedded <= 4 < len(before)
+    assert len(set(before.items()) & set(after.items())) >= len(after) - re_embedded  # the rest kept their ids
+    stored, _ = indexed(ingestion, index)
+    assert sorted(doc.page_content for doc in stored.values()) == _expected(ingestion, docs / "a.txt")
+
+
+def test_inserting_at_the_top_does_not_shift_every_chunk(ingestion, tmp_path, hash_embeddings):
+    text = paragraphs(2, 400)
+    docs, index = _setup(ingestion, tmp_path, text)
+    calls = hash_embeddings.calls
+
+    (docs / "a.txt").write_text(paragraphs(3, 5) + text)
+    ingestion.run_background_ingestion(docs, [], index, workers=1)
+
+    assert hash_embeddings.calls - calls <= 4
+    stored, _ = indexed(ingestion, index)
+    assert sorted(doc.page_content for doc in stored.values()) == _expected(ingestion, docs / "a.txt")
+    # Kept chunks now point at their new offsets in the new page text
+    for doc in stored.values():
+        assert doc.metadata["char_start"] == (paragraphs(3, 5) + text).find(doc.page_content)
+
+
+class _PagedLoader:
+    """Text files with form feeds between pages, loaded one Document per page."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        from langchain_core.documents import Document
+        with open(self.path, encoding="utf-8") as f:
+            return [Document(page_content=page) for page in f.read().split("\f")]
+
+
+def test_filters_follow_pages_that_moved(ingestion, tmp_path, monkeypatch):
+    from utils.index_utils import search_index
+    monkeypatch.setattr(ingestion, "UnstructuredFileLoader", _PagedLoader)
+    first, second = paragraphs(4, 40), paragraphs(5, 40)
+    docs, index = _setup(ingestion, tmp_path, first + "\f" + second)
+
+    (docs / "a.txt").write_text("a new cover page\n" + "\f" + first + "\f" + second)
+    ingestion.run_background_ingestion(docs, [], index, workers=1)
+    stored, db = indexed(ingestion, index)
+
+    for page, text in ((2, first), (3, second)):
+        hits = search_index(db, text[:200], k=50, where={"page": page})
+        assert hits and all(doc.page_content in text for doc, _ in hits), page
+        assert {doc.id for doc, _ in hits} == {i for i, doc in stored.items() if doc.metadata["page"] == page}
@@ -0,0 +1,83 @@
+from langchain_core.documents import Document
+
+from utils.disk_store import SQLiteDocstore
+
+
+def _ids(hits):
+    return [doc.id for doc, _ in hits]
+
+
+def test_create_over_an_open_docstore_rewrites_it_in_place(tmp_path):
+    path = tmp_path / "docstore.sqlite"
+    SQLiteDocstore.create(path, {"a": Document(page_content="alpha ERR-1"), "b": Document(page_content="beta")})
+    reader = SQLiteDocstore(path)
+    assert _ids(reader.lexical_search("alpha", 5)) == ["a"]
+
+    SQLiteDocstore.create(path, {"c": Document(page_content="gamma alpha"), "d": Document(page_content="delta")})
+    assert sorted(reader) == ["c", "d"]  # the open connection sees the new contents
+    assert _ids(reader.lexical_search("alpha", 5)) == ["c"]
+    assert reader.lexical_search("beta", 5) == []
+
+    del reader["c"]  # the FTS delete trigger is back in place
+    reader.commit()
+    assert reader.lexical_search("alpha", 5) == []
+
+
+def _span_doc(text, start, length, text_id="t1"):
+    return Document(page_content=text[start:start + length],
+                    metadata={"text_id": text_id, "char_start": start, "char_len": length})
+
+
+def test_compact_only_touches_changed_source_texts(tmp_path):
+    source = "".join(f"line {i} of the source. " for i in range(50))
+    store = SQLiteDocstore(tmp_path / "docstore.sqlite")
+    store.add({"a": _span_doc(source, 0, 100), "b": _span_doc(source, 90, 100)})
+    store.add_source_texts({"t1": source, "t2": "never referenced"})
+    store.compact()
+    store.commit()
+    rows = dict(store._conn.execute("SELECT id, text FROM docs").fetchall())
+    assert rows == {"a": "", "b": ""}  # stored as spans
+    assert [r[0] for r in store._conn.execute("SELECT id FROM texts")] == ["t1"]
+    assert store["b"].page_content == source[90:190]
+
+    plan = " ".join(row[-1] for row in store._conn.execute(
+        "EXPLAIN QUERY PLAN UPDATE docs SET text = '' WHERE text_id IN (SELECT id FROM dirty_texts)"))
+    assert "docs_text_id" in plan
+
+    del store["a"]
+    store.compact()
+    assert store._conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0] == 1  # b still points into t1
+    del store["b"]
+    store.compact()
+    store.commit()
+    assert store._conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0] == 0
+    assert store._conn.execute("SELECT COUNT(*) FROM dirty_texts").fetchone()[0] == 0
+
+
+def test_lexical_filter_coerces_values_like_the_metadata_index(tmp_path):
+    from utils.metadata_filter import MetadataIndex
+    docs = {
+        "p3": Document(page_content="invoice ERR-4012", metadata={"page": 3, "source": "a.pdf", "scanned": True}),
+        "p4": Document(page_content="invoice ERR-4012", metadata={"page": "4", "source": "a.pdf", "scanned": False}),
+        "web": Document(page_content="invoice ERR-4012", metadata={"page": 3.5, "source": "https://x"}),
+    }
+    store = SQLiteDocstore.create(tmp_path / "docstore.sqlite", docs)
+    index = MetadataIndex.build(enumerate(doc.metadata for doc in docs.values()), len(docs))
+    positions = {doc_id: pos for pos, doc_id in enumerate(docs)}
+
+    for where in ({"page": 3}, {"page": "3"}, {"page": [4, "3"]}, {"page": 3.5}, {"source": "a.pdf"}):
+        lexical = sorted(_ids(store.lexical_search("invoice", 5, where=where)))
+        dense = sorted(doc_id for doc_id, pos in positions.items() if pos in set(index.positions(where).tolist()))
+        assert lexical == dense, where
+    assert _ids(store.lexical_search("invoice", 5, where={"scanned": True})) == ["p3"]
+
+
+def test_inflected_common_words_are_pruned_by_their_stem(tmp_path):
+    docs = {f"d{i}": Document(page_content=f"the service keeps running and indexing documents, batch {i}")
+            for i in range(20)}
+    docs["hit"] = Document(page_content="running the ERR-4012 recovery documents")
+    store = SQLiteDocstore.create(tmp_path / "docstore.sqlite", docs)
+
+    assert store._selective_terms(["running", "documents", "err-4012"]) == ["err-4012"]
+    assert store._term_docs["running"] == 21  # counted under its stem, "run"
+    assert _ids(store.lexical_search("running documents ERR-4012", 5)) == ["hit"]
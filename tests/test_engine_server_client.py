@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import socketserver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "GUI"))
+from engine_client import EngineClient
+
+
+class _StubEngine(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            req = json.loads(raw)
+            reply = {"id": req["id"], "ok": True, "answer": f"echo {req.get('query')}"}
+            self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class _Running:
+    def poll(self):
+        return None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_cold_start_does_not_hold_the_request_lock():
+    port = _free_port()
+    client = EngineClient(port=port)
+    servers, starts = [], []
+
+    def slow_start():
+        # The engine takes a while to import its models before it listens
+        starts.append(time.time())
+        client._process = _Running()
+
+        def listen():
+            time.sleep(1.0)
+            server = _StubEngine(("127.0.0.1", port), _Handler)
+            servers.append(server)
+            server.serve_forever()
+        threading.Thread(target=listen, daemon=True).start()
+
+    client._start_engine = slow_start
+    replies = {}
+    threads = [threading.Thread(target=lambda q=q: replies.update({q: client.query(q, timeout=10)})) for q in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+
+    assert client._lock.acquire(timeout=0.1)  # free while the engine starts
+    client._lock.release()
+    for thread in threads:
+        thread.join(10)
+
+    assert replies == {"a": {"ok": True, "answer": "echo a"}, "b": {"ok": True, "answer": "echo b"}}
+    assert len(starts) == 1
+    client.close()
+    servers[0].shutdown()
+    servers[0].server_close()
@@ -0,0 +1,169 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("httpx")
+import ollama_client
+from ollama_client import AsyncOllamaClient, LLMBusy, LLMTimeout
+
+
+# ========================
+# 🦙 Stub Ollama server
+# ========================
+class StubOllama(ThreadingHTTPServer):
+    """Streams /api/chat replies like Ollama does; the user message picks the behaviour."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _ChatHandler)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.arrivals = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _event(self, event: dict):
+        line = (json.dumps(event) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+        server = self.server
+        with server.lock:
+            server.arrivals.append(prompt)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            if prompt.startswith("hang"):
+                time.sleep(3)
+            for i, word in enumerate(["Hello", " from", " phi"]):
+                if prompt.startswith("fail") and i == 2:
+                    self._event({"error": "model crashed"})
+                    break
+                if prompt.startswith("slow"):
+                    time.sleep(0.1)
+                self._event({"message": {"role": "assistant", "content": word}, "done": False})
+            else:
+                self._event({"message": {"role": "assistant", "content": ""}, "done": True, "eval_count": 3,
+                             "eval_duration": 60_000_000, "prompt_eval_count": 11, "prompt_eval_duration": 20_000_000})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except OSError:
+            pass  # client went away (deadline / cancellation)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+@pytest.fixture
+def stub():
+    server = StubOllama()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _messages(prompt):
+    return [{"role": "user", "content": prompt}]
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+# ========================
+# 🧪 Client behaviour
+# ========================
+def test_streams_tokens_and_fills_stats(stub):
+    async def main():
+        client = AsyncOllamaClient(stub.url, model="phi3", concurrency=2)
+        stats, pieces = {}, []
+        async for text in client.stream_chat(_messages("hi"), stats=stats):
+            pieces.append(text)
+        await client.aclose()
+        return client, stats, pieces
+
+    client, stats, pieces = _run(main())
+    assert "".join(pieces) == "Hello from phi"
+    assert stats["tokens"] == 3 and stats["tokens_per_sec"] == 50.0
+    assert stats["prompt_tokens"] == 11 and stats["prompt_eval_time"] == 0.02
+    assert stats["ttft"] is not None and stats["error"] is None
+    assert client.metrics["completed"] == 1
+
+
+def test_concurrency_is_bounded_and_queue_is_fifo(stub):
+    async def main():
+        client = AsyncOllamaClient(stub.url, concurrency=2)
+        tasks = []
+        for i in range(6):
+            tasks.append(asyncio.create_task(client.chat(_messages(f"slow {i}"))))
+            await asyncio.sleep(0.01)  # fix the submission order
+        replies = await asyncio.gather(*tasks)
+        await client.aclose()
+        return client, replies
+
+    client, replies = _run(main())
+    assert replies == ["Hello from phi"] * 6
+    assert stub.max_active == 2
+    assert stub.arrivals == [f"slow {i}" for i in range(6)]
+    assert client.snapshot()["queue_wait_p95"] > 0
+
+
+def test_full_queue_is_refused(stub):
+    async def main():
+        client = AsyncOllamaClient(stub.url, concurrency=1, max_queue=1)
+        results = await asyncio.gather(*(client.chat(_messages("slow")) for _ in range(3)), return_exceptions=True)
+        await client.aclose()
+        return client, results
+
+    client, results = _run(main())
+    assert sum(isinstance(r, LLMBusy) for r in results) == 1
+    assert client.metrics["rejected"] == 1 and client.metrics["completed"] == 2
+
+
+def test_deadline_frees_the_slot(stub):
+    async def main():
+        client = AsyncOllamaClient(stub.url, concurrency=1)
+        with pytest.raises(LLMTimeout):
+            await client.chat(_messages("hang"), deadline=0.5)
+        reply = await client.chat(_messages("hi"), deadline=5)
+        await client.aclose()
+        return client, reply
+
+    client, reply = _run(main())
+    assert reply == "Hello from phi"
+    assert client.metrics["timeouts"] == 1 and client.limiter.active == 0
+
+
+def test_mid_stream_error_is_flagged_in_stats(stub, monkeypatch):
+    import llm_wrapper
+    client = ollama_client.get_client()
+    monkeypatch.setattr(client, "base_url", stub.url)
+    monkeypatch.setattr(client, "_http", None)
+
+    stats = {}
+    answer = "".join(llm_wrapper.stream_llm_response("fail please", stats=stats))
+    assert answer.startswith("Hello from")  # partial text reached the user first
+    assert "model crashed" in stats["error"]
@@ -0,0 +1,42 @@
+import os
+import time
+
+from utils import parallel_loader
+from utils.parallel_loader import iter_load_files
+
+
+# Loaders run in worker processes, so they live at module level
+def _load(path):
+    name, _, seconds = path.partition(":")
+    if name == "crash":
+        os._exit(1)
+    time.sleep(float(seconds or 0))
+    return [name]
+
+
+def _outcomes(paths, **kwargs):
+    return {path: (docs, type(error).__name__ if error else None)
+            for path, docs, error in iter_load_files(paths, _load, **kwargs)}
+
+
+def test_hung_file_times_out_and_the_rest_load():
+    outcomes = _outcomes(["slow:30", "a:0", "b:0.2", "c:0"], workers=2, timeout=1.5)
+    assert outcomes["slow:30"] == (None, "TimeoutError")
+    assert {path: docs for path, (docs, _) in outcomes.items() if path != "slow:30"} == {
+        "a:0": ["a"], "b:0.2": ["b"], "c:0": ["c"]}
+
+
+def test_time_spent_by_the_caller_is_not_a_timeout():
+    outcomes = {}
+    for path, docs, error in iter_load_files(["a:0", "b:0.5", "c:0.5"], _load, workers=3, timeout=1.0):
+        time.sleep(1.5)  # chunking/embedding the result outlasts the other files' timeout
+        outcomes[path] = (docs, error)
+    assert all(error is None for _, error in outcomes.values())
+    assert len(outcomes) == 3
+
+
+def test_crashing_parser_is_isolated_and_retried(monkeypatch):
+    monkeypatch.setattr(parallel_loader, "MAX_CRASH_RETRIES", 1)
+    outcomes = _outcomes(["crash", "a:0.3", "b:0.3"], workers=2, timeout=10)
+    assert outcomes["crash"] == (None, "RuntimeError")
+    assert outcomes["a:0.3"] == (["a"], None) and outcomes["b:0.3"] == (["b"], None)
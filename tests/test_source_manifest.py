@@ -0,0 +1,51 @@
+from conftest import indexed, paragraphs
+from utils.index_utils import index_version
+from utils.source_manifest import SourceManifest
+
+
+def _ingest(bi, docs, index):
+    bi.run_background_ingestion(docs, [], index, workers=1)
+    return SourceManifest.load(index)
+
+
+def test_manifest_tracks_every_indexed_chunk(ingestion, tmp_path):
+    docs, index = tmp_path / "docs", tmp_path / "index"
+    docs.mkdir()
+    (docs / "a.txt").write_text(paragraphs(1, 60))
+    (docs / "b.txt").write_text(paragraphs(2, 30))
+
+    manifest = _ingest(ingestion, docs, index)
+    stored, db = indexed(ingestion, index)
+    assert sorted(manifest.file_sources()) == ["a.txt", "b.txt"]
+    assert sorted(manifest.ids_of("a.txt") + manifest.ids_of("b.txt")) == sorted(stored)
+    assert db.index.ntotal == len(stored)
+    assert {stored[i].metadata["source"] for i in manifest.ids_of("b.txt")} == {"b.txt"}
+
+
+def test_unchanged_folder_is_a_no_op(ingestion, tmp_path, hash_embeddings):
+    docs, index = tmp_path / "docs", tmp_path / "index"
+    docs.mkdir()
+    (docs / "a.txt").write_text(paragraphs(1, 60))
+    _ingest(ingestion, docs, index)
+    calls, version = hash_embeddings.calls, index_version(index)
+
+    _ingest(ingestion, docs, index)
+    assert hash_embeddings.calls == calls and index_version(index) == version
+
+
+def test_deleted_and_rewritten_files_replace_their_vectors(ingestion, tmp_path):
+    docs, index = tmp_path / "docs", tmp_path / "index"
+    docs.mkdir()
+    (docs / "a.txt").write_text(paragraphs(1, 60))
+    (docs / "b.txt").write_text(paragraphs(2, 30))
+    before = _ingest(ingestion, docs, index)
+    old_a, old_b = set(before.ids_of("a.txt")), set(before.ids_of("b.txt"))
+
+    (docs / "b.txt").unlink()
+    (docs / "a.txt").write_text(paragraphs(3, 40))
+    after = _ingest(ingestion, docs, index)
+    stored, db = indexed(ingestion, index)
+
+    assert after.file_sources() == ["a.txt"]
+    assert not (old_a | old_b) & set(stored)
+    assert set(after.ids_of("a.txt")) == set(stored) and db.index.ntotal == len(stored)
@@ -1,16 +1,20 @@
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+import os
+import sys
 from collections import Counter
 from pathlib import Path
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "engine"))
+from utils.embedder import get_embedder
+from utils.index_utils import load_index
+
 # Path to your FAISS index folder
 INDEX_PATH = r"C:\Users\Tharun B\OneDrive\Desktop\Chatbot\Raggers\combined_faiss_index"
 
 # Load embeddings
-embedder = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en")
+embedder = get_embedder()
 
 # Load FAISS index
-db = FAISS.load_local(INDEX_PATH, embedder, allow_dangerous_deserialization=True)
+db = load_index(embedder, INDEX_PATH)
 
 # Get all documents stored
 all_docs = db.similarity_search("", k=1000)  # blank query fetches max docs